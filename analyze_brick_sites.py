@@ -5,26 +5,56 @@ import os
 import json
 from datetime import datetime
 from enhanced_site_analyzer import EnhancedSiteAnalyzer
-from typing import List, Dict
+from browser_pool import BrowserPool
+from host_prewarm import HostPrewarmer, host_resolver_rules
+from incremental import IncrementalCrawler, IncrementalState
+from result_sink import NDJSONSink, ResultSink, BULKY_FIELDS, sink_path
+from stage_metrics import StageMetrics
+from typing import List, Dict, Callable, Optional
 import aiohttp
 import sys
+import time
 
-async def analyze_brick_sites(urls: List[str], output_dir: str = "brick_data", verbose: bool = True):
-    """Анализ списка сайтов о кирпиче"""
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Настройка логирования
+def setup_logging(output_dir: str, verbose: bool = True, log_name: str = 'analysis.log'):
+    """Настройка логирования в файл и консоль"""
     log_level = logging.DEBUG if verbose else logging.INFO
     logging.basicConfig(
         level=log_level,
         format='%(asctime)s - %(levelname)s - %(message)s',
         handlers=[
-            logging.FileHandler(os.path.join(output_dir, 'analysis.log')),
+            logging.FileHandler(os.path.join(output_dir, log_name)),
             logging.StreamHandler()
         ]
     )
-    
-    # Статистика анализа
+
+def read_urls(path: str) -> List[str]:
+    """Чтение списка URL из файла (один URL на строку)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+async def run_batch(urls: List[str], output_dir: str, verbose: bool = True, concurrency: int = 4,
+                    on_result: Optional[Callable[[Dict], None]] = None, incremental: bool = False,
+                    changes_name: Optional[str] = None, results_name: Optional[str] = None,
+                    compression: Optional[str] = None, prewarm: bool = True) -> Dict:
+    """Анализ списка сайтов в общем пуле браузеров
+
+    Args:
+        urls: Список URL для анализа
+        output_dir: Директория для сохранения результатов
+        verbose: Подробный вывод логов
+        concurrency: Число сайтов, анализируемых одновременно в общем браузере
+        on_result: Вызывается с краткой сводкой по каждому обработанному сайту
+        incremental: Вместо полных снимков писать только изменения относительно прошлого прогона
+        changes_name: Имя NDJSON файла изменений в инкрементальном режиме
+        results_name: Имя NDJSON файла с результатами анализа сайтов
+        compression: Сжатие файлов результатов: None, 'gzip' или 'zstd'
+        prewarm: Перед анализом проверить все хосты, отбросить недоступные и
+            начать с самых быстрых
+
+    Returns:
+        Статистика анализа в формате analysis_stats.json; в поле stages -
+        гистограммы длительности этапов анализа (StageMetrics.to_dict)
+    """
     stats = {
         'total_sites': len(urls),
         'successful': 0,
@@ -33,58 +63,169 @@ async def analyze_brick_sites(urls: List[str], output_dir: str = "brick_data", v
         'categories_found': 0,
         'start_time': datetime.now().isoformat()
     }
-    
-    async with EnhancedSiteAnalyzer(verbose=verbose) as analyzer:
-        for url in urls:
-            try:
-                logging.info(f"Analyzing {url}")
-                results = await analyzer.analyze_site(url)
-                
-                # Сохранение результатов
-                domain = url.split('//')[1].split('/')[0]
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{domain}_{timestamp}.json"
-                filepath = os.path.join(output_dir, filename)
-                
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(results, f, ensure_ascii=False, indent=2)
-                
-                # Обновление статистики
-                stats['successful'] += 1
-                stats['products_found'] += len(results.get('products', []))
-                stats['categories_found'] += len(results.get('categories', []))
-                
-                logging.info(f"Analysis completed for {url}")
-                logging.info(f"Found {len(results['categories'])} categories")
-                logging.info(f"Found {len(results['products'])} products")
-                logging.info(f"Results saved to {filepath}")
-                
-            except Exception as e:
-                stats['failed'] += 1
-                logging.error(f"Error analyzing {url}: {str(e)}")
-                continue
-    
-    # Сохранение общей статистики
+    metrics = StageMetrics()
+
+    def write_timed(sink: ResultSink, record: Dict):
+        started = time.perf_counter()
+        sink.write(record)
+        metrics.observe('serialization', time.perf_counter() - started)
+
+    async def update_url(crawler: IncrementalCrawler, changes: ResultSink, url: str):
+        try:
+            logging.info(f"Checking {url} for changes")
+            change = await crawler.process(url)
+            metrics.add(change.get('spans'))
+            write_timed(changes, change)
+
+            stats['successful'] += 1
+            if change['status'] == 'unchanged':
+                stats['unchanged'] += 1
+            stats['products_found'] += change['products_total']
+            stats['categories_found'] += change['categories_total']
+            logging.info(f"{url}: {change['status']}")
+
+            if on_result:
+                on_result({
+                    'url': url,
+                    'success': True,
+                    'status': change['status'],
+                    'products': change['products_total'],
+                    'categories': change['categories_total']
+                })
+
+        except Exception as e:
+            stats['failed'] += 1
+            logging.error(f"Error analyzing {url}: {str(e)}")
+            if on_result:
+                on_result({'url': url, 'success': False, 'error': str(e)})
+
+    async def analyze_url(analyzer: EnhancedSiteAnalyzer, sink: ResultSink, url: str):
+        try:
+            logging.info(f"Analyzing {url}")
+            results = await analyzer.analyze_site(url)
+            metrics.add(results.get('spans'))
+
+            # Результат пишется в поток сразу, в памяти не накапливается
+            write_timed(sink, results)
+
+            # Обновление статистики
+            stats['successful'] += 1
+            stats['products_found'] += len(results.get('products', []))
+            stats['categories_found'] += len(results.get('categories', []))
+
+            logging.info(f"Analysis completed for {url}")
+            logging.info(f"Found {len(results['categories'])} categories")
+            logging.info(f"Found {len(results['products'])} products")
+            logging.info(f"Results saved to {sink.path}")
+
+            if on_result:
+                on_result({
+                    'url': url,
+                    'success': True,
+                    'file': sink.path,
+                    'products': len(results.get('products', [])),
+                    'categories': len(results.get('categories', []))
+                })
+
+        except Exception as e:
+            stats['failed'] += 1
+            logging.error(f"Error analyzing {url}: {str(e)}")
+            if on_result:
+                on_result({'url': url, 'success': False, 'error': str(e)})
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    resolver_rules = None
+    if prewarm and urls:
+        # Мертвые хосты отсеиваются за секунды, а не по таймауту навигации
+        urls, dropped, checks = await HostPrewarmer().plan(urls)
+        resolver_rules = host_resolver_rules(checks)
+        stats['unreachable'] = len(dropped)
+        for item in dropped:
+            stats['failed'] += 1
+            if on_result:
+                on_result({'url': item['url'], 'success': False, 'error': f"unreachable: {item['error']}"})
+
+    # Один браузер на весь список, одновременно открыто не более concurrency страниц
+    async with BrowserPool(max_pages=concurrency, host_resolver_rules=resolver_rules) as pool:
+        async with EnhancedSiteAnalyzer(verbose=verbose, pool=pool) as analyzer:
+            if incremental:
+                # Отпечатки и прошлые результаты хранятся рядом с результатами
+                stats['unchanged'] = 0
+                state = IncrementalState(os.path.join(output_dir, 'incremental_state.sqlite'))
+                crawler = IncrementalCrawler(analyzer, state)
+                changes_path = sink_path(output_dir, changes_name or f"changes_{timestamp}.ndjson", compression)
+                try:
+                    with NDJSONSink(changes_path, compression) as changes:
+                        await asyncio.gather(*(update_url(crawler, changes, url) for url in urls))
+                finally:
+                    state.close()
+            else:
+                results_path = sink_path(output_dir, results_name or f"analysis_{timestamp}.ndjson", compression)
+                with NDJSONSink(results_path, compression, exclude_fields=BULKY_FIELDS) as sink:
+                    await asyncio.gather(*(analyze_url(analyzer, sink, url) for url in urls))
+
+    stats['stages'] = metrics.to_dict()
     stats['end_time'] = datetime.now().isoformat()
+    return stats
+
+def save_stats(stats: Dict, output_dir: str) -> str:
+    """Сохранение общей статистики и вывод итогов
+
+    Гистограммы этапов дополнительно выгружаются в формате Prometheus
+    в stage_metrics.prom.
+    """
     stats_file = os.path.join(output_dir, 'analysis_stats.json')
     with open(stats_file, 'w', encoding='utf-8') as f:
         json.dump(stats, f, ensure_ascii=False, indent=2)
-    
+    if stats.get('stages'):
+        StageMetrics.from_dict(stats['stages']).save(os.path.join(output_dir, 'stage_metrics.prom'))
+
     # Вывод итоговой статистики
     logging.info("\nAnalysis completed!")
     logging.info(f"Total sites processed: {stats['total_sites']}")
     logging.info(f"Successful: {stats['successful']}")
     logging.info(f"Failed: {stats['failed']}")
+    if 'unreachable' in stats:
+        logging.info(f"Unreachable hosts: {stats['unreachable']}")
+    if 'unchanged' in stats:
+        logging.info(f"Unchanged since last run: {stats['unchanged']}")
     logging.info(f"Total products found: {stats['products_found']}")
     logging.info(f"Total categories found: {stats['categories_found']}")
+    for stage, summary in list(stats.get('stages', {}).get('stages', {}).items())[:5]:
+        logging.info(f"Stage {stage}: {summary['sum_s']}s total, mean {summary['mean_s']}s, p90 {summary['p90_s']}s")
+    return stats_file
+
+async def analyze_brick_sites(urls: List[str], output_dir: str = "brick_data", verbose: bool = True,
+                              concurrency: int = 4, incremental: bool = False, compression: Optional[str] = None,
+                              prewarm: bool = True):
+    """Анализ списка сайтов о кирпиче
+
+    Args:
+        urls: Список URL для анализа
+        output_dir: Директория для сохранения результатов
+        verbose: Подробный вывод логов
+        concurrency: Число сайтов, анализируемых одновременно в общем браузере
+        incremental: Обрабатывать только изменившиеся сайты и писать изменения вместо снимков
+        compression: Сжатие файлов результатов: None, 'gzip' или 'zstd'
+        prewarm: Предварительная проверка хостов перед проходом браузером
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    setup_logging(output_dir, verbose)
+
+    stats = await run_batch(urls, output_dir, verbose, concurrency, incremental=incremental, compression=compression,
+                            prewarm=prewarm)
+    save_stats(stats, output_dir)
 
 def main():
     # Чтение списка URL из файла
-    with open('brick_sites.txt', 'r', encoding='utf-8') as f:
-        urls = [line.strip() for line in f if line.strip()]
-    
-    # Запуск анализа
-    asyncio.run(analyze_brick_sites(urls, verbose=True))
+    urls = read_urls('brick_sites.txt')
+
+    # Запуск анализа (--incremental: только изменения с прошлого прогона, --gzip: сжатие результатов,
+    # --no-prewarm: без предварительной проверки хостов)
+    asyncio.run(analyze_brick_sites(urls, verbose=True, incremental='--incremental' in sys.argv,
+                                    compression='gzip' if '--gzip' in sys.argv else None,
+                                    prewarm='--no-prewarm' not in sys.argv))
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
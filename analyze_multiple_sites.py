@@ -1,19 +1,27 @@
 import asyncio
 from site_analyzer import DeepSiteAnalyzer
-import json
+from browser_pool import BrowserPool
+from result_sink import NDJSONSink, BULKY_FIELDS
+from stage_metrics import StageMetrics
 from datetime import datetime
 import os
 import logging
+import time
 from tqdm import tqdm
-from typing import List, Dict, Any
-import aiofiles
+from typing import List, Dict, Any, Optional
 from concurrent.futures import ThreadPoolExecutor
 
 class ParallelSiteAnalyzer:
     def __init__(self, max_concurrent_browsers: int = 3):
         self.max_concurrent_browsers = max_concurrent_browsers
         self.semaphore = asyncio.Semaphore(max_concurrent_browsers)
+        # Один процесс браузера на все сайты, у каждого сайта свой контекст
+        self.pool = BrowserPool(max_pages=max_concurrent_browsers, headless=False)
         self.results: Dict[str, Any] = {}
+        # Общий поток результатов, открывается на время analyze_multiple_sites
+        self.sink: Optional[NDJSONSink] = None
+        # Гистограммы длительности этапов анализа по всем сайтам
+        self.metrics = StageMetrics()
         
     async def analyze_site(self, url: str, output_dir: str, verbose: bool) -> dict:
         """
@@ -25,19 +33,19 @@ class ParallelSiteAnalyzer:
             print(f"{'='*50}\n")
             
             try:
-                async with DeepSiteAnalyzer() as analyzer:
+                async with DeepSiteAnalyzer(pool=self.pool) as analyzer:
                     result = await analyzer.analyze_site(url)
+                    self.metrics.add(result.get("spans"))
                     
                     if "error" in result:
                         print(f"\nОшибка при анализе {url}: {result['error']}")
                         return {"url": url, "error": result["error"]}
                     
-                    # Сохраняем результаты асинхронно
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    filename = os.path.join(output_dir, f"{url.replace('https://', '').replace('http://', '')}_{timestamp}.json")
-                    
-                    async with aiofiles.open(filename, 'w', encoding='utf-8') as f:
-                        await f.write(json.dumps(result, ensure_ascii=False, indent=2))
+                    # Дописываем результат в общий поток сразу после анализа
+                    started = time.perf_counter()
+                    self.sink.write(result)
+                    self.metrics.observe("serialization", time.perf_counter() - started)
+                    filename = self.sink.path
                     
                     print(f'\nАнализ {url} завершен. Результаты сохранены в {filename}')
                     
@@ -95,6 +103,9 @@ class ParallelSiteAnalyzer:
         # Создаем прогресс-бар
         pbar = tqdm(total=len(urls), desc="Анализ сайтов")
         
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.sink = NDJSONSink(os.path.join(output_dir, f"analysis_{timestamp}.ndjson"), exclude_fields=BULKY_FIELDS)
+        
         # Запускаем анализ всех сайтов параллельно с контролем ресурсов
         tasks = []
         for url in urls:
@@ -102,11 +113,20 @@ class ParallelSiteAnalyzer:
             task.add_done_callback(lambda p: pbar.update(1))
             tasks.append(task)
         
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            await self.pool.close()
+            self.sink.close()
         
         # Закрываем прогресс-бар
         pbar.close()
         
+        # Длительность этапов: JSON сводка и формат Prometheus
+        metrics_path = os.path.join(output_dir, f"stage_metrics_{timestamp}")
+        self.metrics.save(metrics_path + ".json")
+        self.metrics.save(metrics_path + ".prom")
+        
         # Обрабатываем результаты
         for result in results:
             if isinstance(result, Exception):
@@ -141,6 +161,7 @@ class ParallelSiteAnalyzer:
         print(f"Всего проанализировано сайтов: {len(self.results)}")
         print(f"Всего найдено товаров: {total_products}")
         print(f"Всего найдено категорий: {total_categories}")
+        print(f"Длительность этапов: {metrics_path}.json, {metrics_path}.prom")
         print("="*50)
 
 def main():
@@ -0,0 +1,256 @@
+import asyncio
+import json
+import logging
+import math
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse, parse_qsl, urlencode, urlunparse
+import aiohttp
+import backoff
+from page_extractor import PageExtractor
+from site_rules import SiteRules
+from static_analyzer import DEFAULT_HEADERS
+
+# Ключи, под которыми API обычно отдают список записей
+RECORD_KEYS = ['items', 'products', 'goods', 'data', 'results', 'result', 'list', 'rows', 'elements', 'catalog']
+
+# Поля записи API, соответствующие полям товара DOM-экстракторов
+FIELD_KEYS = {
+    'name': ['name', 'title', 'product_name', 'productName', 'NAME', 'caption'],
+    'price': ['price', 'cost', 'price_value', 'priceValue', 'PRICE', 'current_price', 'min_price'],
+    # slug не адрес: относительно эндпоинта API он дает ложный URL вида /api/catalog/<slug>
+    'href': ['url', 'link', 'href', 'detail_url', 'detailUrl', 'DETAIL_PAGE_URL'],
+    'description': ['description', 'desc', 'preview_text', 'PREVIEW_TEXT', 'short_description']
+}
+
+# Признаки общего числа записей и страниц в ответе; "count" не входит:
+# во многих API это число записей на текущей странице
+TOTAL_KEYS = ['total', 'total_count', 'totalCount', 'totalItems', 'total_items']
+PAGES_KEYS = ['pages', 'total_pages', 'totalPages', 'last_page', 'lastPage', 'page_count', 'pageCount']
+NEXT_KEYS = ['next', 'next_page_url', 'nextPageUrl', 'next_url']
+
+class RetryableStatus(Exception):
+    """Ответ 429/5xx, после которого запрос стоит повторить"""
+
+def find_records(payload: Any, depth: int = 0) -> Optional[List[Dict]]:
+    """Поиск списка записей в JSON ответе (корень или известные ключи, до 3 уровней)"""
+    if isinstance(payload, list):
+        return payload if payload and all(isinstance(item, dict) for item in payload) else None
+    if not isinstance(payload, dict) or depth >= 3:
+        return None
+    for key in RECORD_KEYS:
+        if key in payload:
+            records = find_records(payload[key], depth + 1)
+            if records is not None:
+                return records
+    return None
+
+def as_count(value: Any) -> Optional[int]:
+    """Неотрицательное число из поля ответа (bool - не число)"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)) and math.isfinite(value) and value >= 0:
+        return int(value)
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+def find_value(payload: Any, keys: List[str], depth: int = 0) -> Any:
+    """Первое значение по одному из ключей (в корне, meta/pagination/links и т.п.)"""
+    if not isinstance(payload, dict) or depth >= 3:
+        return None
+    for key in keys:
+        if payload.get(key) not in (None, ''):
+            return payload[key]
+    for nested in ('meta', 'pagination', 'pager', 'links', 'nav', 'data'):
+        value = find_value(payload.get(nested), keys, depth + 1)
+        if value not in (None, ''):
+            return value
+    return None
+
+def field_value(record: Dict, keys: List[str]) -> Any:
+    for key in keys:
+        value = record.get(key)
+        if isinstance(value, dict):
+            # Цена вида {"value": 100, "currency": "RUB"}
+            value = value.get('value') or value.get('amount') or value.get('price')
+        if value not in (None, ''):
+            return value
+    return None
+
+def map_record(record: Dict) -> Dict[str, Optional[str]]:
+    """Запись API в сырой формат товара DOM-экстракторов (name, price, href, description)"""
+    raw = {}
+    for field, keys in FIELD_KEYS.items():
+        value = field_value(record, keys)
+        raw[field] = str(value).strip() if value is not None else None
+    return raw
+
+class ApiHarvester:
+    """Постраничная выгрузка каталога через JSON эндпоинты из SiteRules.api_endpoints"""
+
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None, concurrency: int = 4,
+                 page_param: str = 'page', size_param: str = 'limit', page_size: int = 100,
+                 max_pages: int = 200, timeout: int = 20):
+        """
+        Args:
+            session: Общая HTTP-сессия (если не задана, создается при первом запросе)
+            concurrency: Максимальное число одновременных запросов к API
+            page_param: Параметр номера страницы
+            size_param: Параметр размера страницы
+            page_size: Запрашиваемый размер страницы
+            max_pages: Ограничение на число страниц одного эндпоинта
+            timeout: Общий таймаут запроса в секундах
+        """
+        self.session = session
+        self._own_session = session is None
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.concurrency = concurrency
+        self.page_param = page_param
+        self.size_param = size_param
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.extractor = PageExtractor()
+        self.logger = logging.getLogger(__name__)
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        if not self.session or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers=DEFAULT_HEADERS
+            )
+            self._own_session = True
+        return self.session
+
+    async def close(self):
+        """Закрытие собственной HTTP-сессии"""
+        if self._own_session and self.session and not self.session.closed:
+            await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def page_url(self, endpoint: str, page: int) -> str:
+        """URL страницы эндпоинта с параметрами пагинации"""
+        parsed = urlparse(endpoint)
+        query = dict(parse_qsl(parsed.query, keep_blank_values=True))
+        query[self.page_param] = str(page)
+        query[self.size_param] = str(self.page_size)
+        return urlunparse(parsed._replace(query=urlencode(query)))
+
+    @backoff.on_exception(backoff.expo, (aiohttp.ClientError, asyncio.TimeoutError, RetryableStatus),
+                          max_tries=4, max_time=60)
+    async def fetch_json(self, url: str, headers: Dict[str, str]) -> Optional[Any]:
+        """Запрос JSON; None, если ответ не JSON или не 200"""
+        session = await self.get_session()
+        async with self.semaphore:
+            async with session.get(url, headers=headers, ssl=False) as response:
+                if response.status == 429 or response.status >= 500:
+                    raise RetryableStatus(f"{url} returned {response.status}")
+                if response.status != 200:
+                    return None
+                body = await response.read()
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+    async def discover(self, base_url: str, rules: SiteRules) -> Optional[Tuple[str, Any]]:
+        """Первый эндпоинт из правил сайта, отвечающий списком записей: (URL, первая страница)"""
+        headers = {**rules.custom_headers, 'Accept': 'application/json, text/javascript, */*; q=0.01'}
+        for endpoint in rules.api_endpoints:
+            endpoint_url = urljoin(base_url, endpoint)
+            try:
+                payload = await self.fetch_json(self.page_url(endpoint_url, 1), headers)
+            except Exception as e:
+                self.logger.debug(f"API endpoint {endpoint_url} failed: {str(e)}")
+                continue
+            if payload is not None and find_records(payload):
+                self.logger.info(f"Found JSON catalog endpoint {endpoint_url}")
+                return endpoint_url, payload
+        return None
+
+    async def harvest(self, base_url: str, rules: SiteRules) -> Optional[Dict]:
+        """Выгрузка всех страниц каталога; None, если ни один эндпоинт не подошел
+
+        Если в ответе есть число страниц или записей, оставшиеся страницы
+        запрашиваются параллельно. Если есть ссылка на следующую страницу - по ней
+        последовательно. Иначе страницы запрашиваются пачками по concurrency до
+        первой пустой или повторившейся страницы.
+        """
+        discovered = await self.discover(base_url, rules)
+        if not discovered:
+            return None
+        endpoint, first = discovered
+        headers = {**rules.custom_headers, 'Accept': 'application/json, text/javascript, */*; q=0.01'}
+
+        pages = [first]
+        total_pages = self.total_pages(first)
+        next_url = find_value(first, NEXT_KEYS)
+
+        if total_pages:
+            numbers = range(2, min(total_pages, self.max_pages) + 1)
+            fetched = await asyncio.gather(*(self.fetch_page(endpoint, n, headers) for n in numbers))
+            # Неудачные запросы (None) не считаются выгруженными страницами
+            pages += [payload for payload in fetched if payload is not None]
+        elif isinstance(next_url, str):
+            seen = {endpoint}
+            while isinstance(next_url, str) and len(pages) < self.max_pages:
+                next_url = urljoin(endpoint, next_url)
+                if next_url in seen:
+                    break
+                seen.add(next_url)
+                payload = await self.fetch_json(next_url, headers)
+                if payload is None or not find_records(payload):
+                    break
+                pages.append(payload)
+                next_url = find_value(payload, NEXT_KEYS)
+        else:
+            first_records = find_records(first)
+            number = 2
+            while number <= self.max_pages:
+                batch = range(number, min(number + self.concurrency, self.max_pages + 1))
+                results = await asyncio.gather(*(self.fetch_page(endpoint, n, headers) for n in batch))
+                stop = False
+                for payload in results:
+                    records = find_records(payload) if payload is not None else None
+                    # Пустая страница или сервер игнорирует параметр и отдает первую
+                    if not records or records == first_records:
+                        stop = True
+                        break
+                    pages.append(payload)
+                if stop:
+                    break
+                number += len(batch)
+
+        raw = [map_record(record) for payload in pages for record in (find_records(payload) or [])]
+        products = self.extractor.build_products(raw, endpoint)
+        self.logger.info(f"Harvested {len(products)} products from {len(pages)} pages of {endpoint}")
+        return {
+            'endpoint': endpoint,
+            'pages': len(pages),
+            'records': len(raw),
+            'products': products
+        }
+
+    async def fetch_page(self, endpoint: str, number: int, headers: Dict[str, str]) -> Optional[Any]:
+        try:
+            return await self.fetch_json(self.page_url(endpoint, number), headers)
+        except Exception as e:
+            self.logger.warning(f"Failed to fetch page {number} of {endpoint}: {str(e)}")
+            return None
+
+    def total_pages(self, payload: Any) -> Optional[int]:
+        """Число страниц по полям пагинации первого ответа"""
+        pages = as_count(find_value(payload, PAGES_KEYS))
+        if pages is not None:
+            return pages
+        total = as_count(find_value(payload, TOTAL_KEYS))
+        records = find_records(payload) or []
+        if total is not None and records:
+            # Сервер может отдавать меньше записей, чем запрошено
+            return math.ceil(total / len(records))
+        return None
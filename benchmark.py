@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+from aiohttp import web
+from bs4 import BeautifulSoup
+from browser_pool import BrowserPool
+from enhanced_site_analyzer import EnhancedSiteAnalyzer
+from inn_scanner import InnScanner
+from site_analyzer import DeepSiteAnalyzer
+from static_analyzer import StaticExtractor, StaticSiteAnalyzer, html_text
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    from playwright._impl._connection import Channel
+except ImportError:
+    Channel = None
+
+STAGES = ['static-extract', 'inn-scan', 'http', 'enhanced', 'enhanced-browser', 'deep']
+BROWSER_STAGES = ('enhanced-browser', 'deep')
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Перцентиль по ближайшему рангу"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return round(ordered[index], 2)
+
+def snapshot_html(record: Dict) -> str:
+    """HTML снимка: сохраненный html или страница, восстановленная из текста и ссылок"""
+    if record.get('html'):
+        return record['html']
+    links = ''.join(f'<li><a href="{link}">{link}</a></li>' for link in record.get('links', [])
+                    if isinstance(link, str))
+    paragraphs = ''.join(f'<p>{line}</p>' for line in (record.get('text') or '').splitlines() if line.strip())
+    return (f"<html><head><title>{record.get('title', '')}</title></head>"
+            f"<body><main>{paragraphs}</main><nav class=\"menu\"><ul>{links}</ul></nav></body></html>")
+
+def load_snapshots(paths: List[str]) -> List[str]:
+    """Снимки страниц: JSON результаты анализа (поле html или text/links) и файлы .html"""
+    pages = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith(('.html', '.htm')):
+                pages.append(f.read())
+                continue
+            data = json.load(f)
+        for record in data if isinstance(data, list) else [data]:
+            pages.append(snapshot_html(record))
+    return pages
+
+class FixtureServer:
+    """Локальный сервер со снимками страниц и синтетическим каталогом заданного размера"""
+
+    def __init__(self, snapshots: List[str], products_per_page: int = 50, catalog_pages: int = 10,
+                 categories: int = 20, latency_ms: int = 0, seed: int = 1):
+        """
+        Args:
+            snapshots: HTML сохраненных страниц, отдаются по /snapshot/{n}/
+            products_per_page: Число товаров на странице каталога
+            catalog_pages: Число страниц пагинации каталога
+            categories: Число ссылок на категории в меню
+            latency_ms: Искусственная задержка ответа
+            seed: Начальное значение генератора цен и описаний
+        """
+        self.snapshots = snapshots
+        self.products_per_page = products_per_page
+        self.catalog_pages = catalog_pages
+        self.categories = categories
+        self.latency_ms = latency_ms
+        self.seed = seed
+        self.runner: Optional[web.AppRunner] = None
+        self.base_url = ''
+
+    def catalog_html(self, page: int) -> str:
+        rng = random.Random(self.seed * 100003 + page)
+        start = (page - 1) * self.products_per_page
+        # Нечетные страницы - карточки .product-item, четные - .item, которые находит
+        # только общий селектор [class*='item'], менее точный, чем у обертки div.products
+        card = 'product-item' if page % 2 else 'item'
+        products = ''.join(
+            f'<div class="{card}"><a href="/catalog/item/{i}/"><span class="product-name">'
+            f'Кирпич облицовочный М{rng.choice([100, 125, 150, 175])} №{i}</span></a>'
+            f'<span class="price">{rng.randint(15, 90)},{rng.randint(0, 99):02d} ₽</span>'
+            f'<div class="description">Размер 250x120x65, цвет {rng.choice(["красный", "бежевый", "коричневый"])}'
+            f'</div></div>'
+            for i in range(start, start + self.products_per_page)
+        )
+        menu = ''.join(f'<li><a href="/catalog/section-{n}/">Раздел {n}</a></li>' for n in range(self.categories))
+        pages = ''.join(f'<a href="/catalog/?page={n}">{n}</a>' for n in range(1, self.catalog_pages + 1))
+        return (f'<html><head><title>Каталог, страница {page}</title></head><body>'
+                f'<ul class="catalog-menu">{menu}</ul>'
+                f'<div class="products">{products}</div>'
+                f'<div class="pagination">{pages}</div>'
+                f'<footer><a href="/about/details/">Реквизиты</a> ООО "Кирпичный двор", '
+                f'ИНН 7707083893, КПП 770701001, тел. 4951234567</footer></body></html>')
+
+    async def delay(self):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+    async def handle_catalog(self, request: web.Request) -> web.Response:
+        await self.delay()
+        page = int(request.query.get('page', '1'))
+        if not 1 <= page <= self.catalog_pages:
+            raise web.HTTPNotFound()
+        return web.Response(text=self.catalog_html(page), content_type='text/html')
+
+    async def handle_snapshot(self, request: web.Request) -> web.Response:
+        await self.delay()
+        index = int(request.match_info['index'])
+        if not 0 <= index < len(self.snapshots):
+            raise web.HTTPNotFound()
+        return web.Response(text=self.snapshots[index], content_type='text/html')
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/catalog/', self.handle_catalog)
+        app.router.add_get('/snapshot/{index}/', self.handle_snapshot)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+    def urls(self) -> List[str]:
+        catalog = [f"{self.base_url}/catalog/?page={n}" for n in range(1, self.catalog_pages + 1)]
+        snapshots = [f"{self.base_url}/snapshot/{n}/" for n in range(len(self.snapshots))]
+        return catalog + snapshots
+
+    def pages(self) -> List[str]:
+        """HTML тех же страниц для стадий без сети"""
+        return [self.catalog_html(n) for n in range(1, self.catalog_pages + 1)] + list(self.snapshots)
+
+class ProtocolCounter:
+    """Счетчик обращений к драйверу playwright (каждое - round trip до браузера)"""
+
+    def __init__(self):
+        self.calls = 0
+        self.methods: Dict[str, int] = {}
+        self._original = None
+
+    def install(self) -> bool:
+        if Channel is None or not hasattr(Channel, '_inner_send'):
+            return False
+        original = self._original = Channel._inner_send
+        counter = self
+
+        async def counted(channel, method, *args, **kwargs):
+            counter.calls += 1
+            counter.methods[method] = counter.methods.get(method, 0) + 1
+            return await original(channel, method, *args, **kwargs)
+
+        Channel._inner_send = counted
+        return True
+
+    def uninstall(self):
+        if self._original:
+            Channel._inner_send = self._original
+            self._original = None
+
+    def reset(self):
+        self.calls = 0
+        self.methods = {}
+
+class RssSampler:
+    """Пиковая память процесса и дочерних процессов (браузера) за время стадии"""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak = 0
+        self.task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def current() -> int:
+        if psutil is None:
+            # Без psutil доступен только пик собственного процесса за все время работы
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                continue
+        return total
+
+    async def run(self):
+        while True:
+            self.peak = max(self.peak, self.current())
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.peak = self.current()
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> float:
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        self.peak = max(self.peak, self.current())
+        return round(self.peak / 1024 / 1024, 1)
+
+async def measure(name: str, items: List, run_one: Callable[[object], Awaitable], counter: ProtocolCounter,
+                  concurrency: int = 1) -> Dict:
+    """Прогон стадии по всем элементам с замером задержек, round trips и памяти"""
+    latencies: List[float] = []
+    errors: List[str] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    sampler = RssSampler()
+
+    async def timed(item):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await run_one(item)
+                if isinstance(result, dict) and result.get('error'):
+                    # Анализаторы возвращают ошибку в результате, а не исключением
+                    raise RuntimeError(result['error'])
+            except Exception as e:
+                # Стадии без сети получают HTML страницы, а не URL
+                label = item if isinstance(item, str) and not item.lstrip().startswith('<') else '<page>'
+                errors.append(f"{label}: {(str(e) or type(e).__name__).splitlines()[0]}")
+                return
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    counter.reset()
+    sampler.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(timed(item) for item in items))
+    elapsed = time.perf_counter() - started
+    peak_rss_mb = await sampler.stop()
+
+    report = {
+        'pages': len(latencies),
+        'errors': len(errors),
+        'elapsed_s': round(elapsed, 3),
+        'pages_per_sec': round(len(latencies) / elapsed, 2) if elapsed and latencies else 0.0,
+        'latency_ms': {
+            'p50': percentile(latencies, 50),
+            'p90': percentile(latencies, 90),
+            'p99': percentile(latencies, 99),
+            'max': round(max(latencies), 2) if latencies else None
+        },
+        'round_trips': counter.calls,
+        'round_trips_per_page': round(counter.calls / len(latencies), 1) if latencies else None,
+        'top_methods': dict(sorted(counter.methods.items(), key=lambda item: -item[1])[:10]),
+        'peak_rss_mb': peak_rss_mb
+    }
+    if errors:
+        report['error_samples'] = errors[:5]
+    logging.info(f"{name}: {report['pages']} pages, {report['pages_per_sec']} pages/s, "
+                 f"p50 {report['latency_ms']['p50']} ms, {report['round_trips']} round trips")
+    return report
+
+async def run_benchmark(stages: List[str], snapshots: List[str], products_per_page: int = 50,
+                        catalog_pages: int = 10, latency_ms: int = 0, concurrency: int = 1,
+                        repeat: int = 1) -> Dict:
+    """Прогон выбранных стадий на локальном сервере
+
+    Returns:
+        Отчет: конфигурация и метрики каждой стадии
+    """
+    server = FixtureServer(snapshots, products_per_page, catalog_pages, latency_ms=latency_ms)
+    await server.start()
+    urls = server.urls() * repeat
+    pages = server.pages() * repeat
+    counter = ProtocolCounter()
+    counting = counter.install()
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'config': {
+            'stages': stages,
+            'snapshots': len(snapshots),
+            'products_per_page': products_per_page,
+            'catalog_pages': catalog_pages,
+            'latency_ms': latency_ms,
+            'concurrency': concurrency,
+            'repeat': repeat,
+            'round_trips_counted': counting,
+            'rss_includes_children': psutil is not None
+        },
+        'stages': {}
+    }
+
+    pool = None
+    try:
+        if 'static-extract' in stages:
+            extractor = StaticExtractor()
+            catalog = set(server.pages()[:catalog_pages])
+
+            async def static_extract(html: str):
+                result = extractor.extract(BeautifulSoup(html, 'html.parser'), server.base_url)
+                # Карточки каталога лежат в обертке div.products, которая сама совпадает
+                # с [class*='product']: каждая страница (и с .product-item, и с .item)
+                # должна дать все товары
+                if html in catalog and len(result['products']) != products_per_page:
+                    return {'error': f"{len(result['products'])} of {products_per_page} products extracted"}
+
+            report['stages']['static-extract'] = await measure('static-extract', pages, static_extract, counter)
+
+        if 'inn-scan' in stages:
+            scanner = InnScanner()
+
+            async def inn_scan(html: str):
+                scanner.scan_documents(html_text(html), html)
+
+            report['stages']['inn-scan'] = await measure('inn-scan', pages, inn_scan, counter)
+
+        if 'http' in stages:
+            async with StaticSiteAnalyzer() as static_analyzer:
+                report['stages']['http'] = await measure(
+                    'http', urls, static_analyzer.analyze_site, counter, concurrency)
+
+        browser_stages = [stage for stage in stages if stage in ('enhanced',) + BROWSER_STAGES]
+        if browser_stages:
+            pool = BrowserPool(max_pages=concurrency)
+            async with EnhancedSiteAnalyzer(pool=pool, use_cache=False) as analyzer:
+                if 'enhanced' in stages:
+                    report['stages']['enhanced'] = await measure(
+                        'enhanced', urls, lambda url: analyzer.analyze_site(url, refresh=True), counter, concurrency)
+                if 'enhanced-browser' in stages:
+                    report['stages']['enhanced-browser'] = await measure(
+                        'enhanced-browser', urls, analyzer.analyze_site_browser, counter, concurrency)
+
+            if 'deep' in stages:
+                async def deep(url: str):
+                    # DeepSiteAnalyzer хранит страницу в экземпляре: один экземпляр на URL
+                    async with DeepSiteAnalyzer(pool=pool) as deep_analyzer:
+                        return await deep_analyzer.analyze_site(url)
+
+                report['stages']['deep'] = await measure('deep', urls, deep, counter, concurrency)
+            report['browser_pool'] = dict(pool.stats)
+    finally:
+        if pool:
+            await pool.close()
+        counter.uninstall()
+        await server.stop()
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер производительности анализаторов на локальных страницах')
+    parser.add_argument('snapshots', nargs='*', help='Снимки страниц: JSON результаты анализа или файлы .html')
+    parser.add_argument('-s', '--stages', default=','.join(STAGES),
+                        help=f"Стадии через запятую: {', '.join(STAGES)}")
+    parser.add_argument('-n', '--products', type=int, default=50, help='Товаров на странице синтетического каталога')
+    parser.add_argument('-p', '--pages', type=int, default=10, help='Страниц синтетического каталога')
+    parser.add_argument('-c', '--concurrency', type=int, default=1, help='Одновременно обрабатываемых страниц')
+    parser.add_argument('-r', '--repeat', type=int, default=1, help='Сколько раз пройти по всем страницам')
+    parser.add_argument('--latency', type=int, default=0, help='Искусственная задержка ответа сервера, мс')
+    parser.add_argument('-o', '--output', default='benchmark.json', help='Файл отчета (JSON)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Подробный вывод')
+
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    report = asyncio.run(run_benchmark(stages, load_snapshots(args.snapshots), args.products, args.pages,
+                                       args.latency, args.concurrency, args.repeat))
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for name, stage in report['stages'].items():
+        print(f"{name:18} {stage['pages_per_sec']:>8} стр/с  p50 {stage['latency_ms']['p50']} мс  "
+              f"p99 {stage['latency_ms']['p99']} мс  round trips {stage['round_trips']}  "
+              f"RSS {stage['peak_rss_mb']} МБ")
+    print(f"Отчет сохранен в {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from playwright.async_api import async_playwright, Browser, BrowserContext, Playwright
+
+@dataclass
+class BrowserSlot:
+    """Процесс браузера в пуле"""
+    browser: Browser
+    uses: int = 0  # Сколько контекстов было выдано из этого браузера
+    active: int = 0  # Сколько контекстов открыто сейчас
+
+@dataclass
+class BrowserLease:
+    """Изолированный контекст, выданный пулом"""
+    context: BrowserContext
+    slot: BrowserSlot
+
+class BrowserPool:
+    """Пул браузеров с ограничением числа одновременно открытых контекстов"""
+
+    def __init__(self, max_pages: int = 4, browsers: int = 1, max_uses: int = 100,
+                 headless: bool = True, launch_args: Optional[List[str]] = None,
+                 host_resolver_rules: Optional[str] = None):
+        """
+        Args:
+            max_pages: Максимальное число одновременно выданных контекстов
+            browsers: Число процессов браузера
+            max_uses: Через сколько выданных контекстов браузер перезапускается
+            headless: Запуск браузера без окна
+            launch_args: Аргументы запуска Chromium
+            host_resolver_rules: Заранее разрешенные адреса хостов ("MAP host ip, ...")
+        """
+        self.max_pages = max_pages
+        self.browsers = browsers
+        self.max_uses = max_uses
+        self.headless = headless
+        self.launch_args = launch_args or [
+            '--no-sandbox',
+            '--disable-setuid-sandbox',
+            '--disable-dev-shm-usage'
+        ]
+        if host_resolver_rules:
+            self.launch_args = self.launch_args + [f"--host-resolver-rules={host_resolver_rules}"]
+        self.playwright: Optional[Playwright] = None
+        self.slots: List[BrowserSlot] = []
+        self.semaphore = asyncio.Semaphore(max_pages)
+        self._lock = asyncio.Lock()
+        self.stats: Dict[str, int] = {
+            'launched': 0,
+            'recycled': 0,
+            'crashed': 0,
+            'leases': 0
+        }
+        self.logger = logging.getLogger(__name__)
+
+    async def start(self):
+        """Запуск playwright и процессов браузера"""
+        async with self._lock:
+            await self._ensure_started()
+
+    async def _ensure_started(self):
+        if not self.playwright:
+            self.logger.debug("Starting playwright for browser pool")
+            self.playwright = await async_playwright().start()
+        while len(self.slots) < self.browsers:
+            self.slots.append(await self._launch())
+
+    async def _launch(self) -> BrowserSlot:
+        """Запуск нового процесса браузера"""
+        browser = await self.playwright.chromium.launch(
+            headless=self.headless,
+            args=self.launch_args
+        )
+        self.stats['launched'] += 1
+        self.logger.debug(f"Browser launched ({self.stats['launched']} total)")
+        return BrowserSlot(browser=browser)
+
+    async def _close_slot(self, slot: BrowserSlot):
+        try:
+            await slot.browser.close()
+        except Exception as e:
+            self.logger.debug(f"Error closing browser: {str(e)}")
+
+    async def _pick_slot(self) -> BrowserSlot:
+        """Выбор браузера с заменой упавших и перезапуском отработавших"""
+        async with self._lock:
+            await self._ensure_started()
+            for i, slot in enumerate(self.slots):
+                if not slot.browser.is_connected():
+                    self.logger.warning("Browser process disconnected, relaunching")
+                    self.stats['crashed'] += 1
+                    self.slots[i] = await self._launch()
+                elif slot.uses >= self.max_uses and slot.active == 0:
+                    self.logger.debug(f"Recycling browser after {slot.uses} uses")
+                    self.stats['recycled'] += 1
+                    await self._close_slot(slot)
+                    self.slots[i] = await self._launch()
+
+            # Браузеры, исчерпавшие лимит, выбираются последними, чтобы они освободились
+            return min(self.slots, key=lambda s: (s.uses >= self.max_uses, s.active, s.uses))
+
+    async def acquire(self, **context_options) -> BrowserLease:
+        """Получение изолированного контекста браузера"""
+        await self.semaphore.acquire()
+        try:
+            slot = await self._pick_slot()
+            context = await slot.browser.new_context(**context_options)
+        except Exception:
+            self.semaphore.release()
+            raise
+
+        slot.uses += 1
+        slot.active += 1
+        self.stats['leases'] += 1
+        return BrowserLease(context=context, slot=slot)
+
+    async def release(self, lease: BrowserLease):
+        """Возврат контекста в пул"""
+        try:
+            await lease.context.close()
+        except Exception as e:
+            self.logger.debug(f"Error closing context: {str(e)}")
+        finally:
+            lease.slot.active -= 1
+            self.semaphore.release()
+
+    @asynccontextmanager
+    async def context(self, **context_options):
+        """Контекстный менеджер для получения контекста из пула"""
+        lease = await self.acquire(**context_options)
+        try:
+            yield lease.context
+        finally:
+            await self.release(lease)
+
+    async def close(self):
+        """Закрытие всех браузеров пула"""
+        async with self._lock:
+            for slot in self.slots:
+                await self._close_slot(slot)
+            self.slots = []
+            if self.playwright:
+                try:
+                    await self.playwright.stop()
+                except Exception:
+                    pass
+                self.playwright = None
+
+    async def __aenter__(self):
+        # Браузеры запускаются лениво при первом acquire: если все сайты
+        # обработаны без браузера, Chromium не запускается вовсе
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+from enhanced_site_analyzer import EnhancedSiteAnalyzer
+from browser_pool import BrowserPool, BrowserLease
+from incremental import product_key
+from network_recorder import site_host
+from page_cache import normalize_url
+from result_sink import NDJSONSink
+
+# Параметры, не влияющие на содержимое страницы
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|yclid|gclid|fbclid|_openstat|from|ref|sessid|PHPSESSID)$', re.IGNORECASE)
+
+# Ссылки на файлы, которые не нужно открывать как страницы каталога
+SKIP_EXTENSIONS = ('.pdf', '.doc', '.docx', '.xls', '.xlsx', '.zip', '.rar', '.jpg', '.jpeg', '.png',
+                   '.gif', '.webp', '.svg', '.mp4', '.avi', '.exe', '.xml', '.txt')
+
+# Ссылки пагинации, не попавшие под селекторы пагинации сайта
+PAGINATION_PATTERN = re.compile(r'[?&](page|PAGEN_\d+|p|start|offset)=\d+|/page[-/]?\d+/?$', re.IGNORECASE)
+
+def canonical_url(url: str) -> str:
+    """Канонический URL для дедупликации: нормализация, без фрагмента и трекинговых параметров"""
+    parsed = urlparse(normalize_url(url))
+    query = [(key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+             if not TRACKING_PARAMS.match(key)]
+    return urlunparse(parsed._replace(query=urlencode(query)))
+
+class CatalogCrawler:
+    """Обход каталога сайта по категориям и страницам пагинации
+
+    Страницы сайта открываются параллельно в одном контексте браузера,
+    запросы к одному хосту разносятся во времени не менее чем на delay секунд.
+    """
+
+    def __init__(self, analyzer: EnhancedSiteAnalyzer, max_depth: int = 2, max_pages: int = 50,
+                 concurrency: int = 4, delay: float = 1.0, on_page: Optional[Callable[[Dict], None]] = None):
+        """
+        Args:
+            analyzer: Анализатор, которым разбирается каждая страница
+            max_depth: Максимальная глубина переходов по категориям (пагинация глубину не увеличивает)
+            max_pages: Максимальное число страниц сайта за один обход
+            concurrency: Число одновременно открытых страниц
+            delay: Минимальный интервал между запросами к одному хосту в секундах
+            on_page: Вызывается с результатом каждой страницы по мере обхода
+        """
+        self.analyzer = analyzer
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.delay = delay
+        self.on_page = on_page
+        self.next_request: Dict[str, float] = {}
+        self.politeness_lock = asyncio.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def in_scope(self, url: str, site: str) -> bool:
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https'):
+            return False
+        if parsed.path.lower().endswith(SKIP_EXTENSIONS):
+            return False
+        host = site_host(url)
+        return host == site or host.endswith('.' + site)
+
+    async def wait_turn(self, url: str):
+        """Пауза перед запросом, чтобы не нагружать хост"""
+        host = urlparse(url).hostname or ''
+        async with self.politeness_lock:
+            now = time.monotonic()
+            start = max(now, self.next_request.get(host, now))
+            self.next_request[host] = start + self.delay
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    @staticmethod
+    def pagination_links(url: str, results: Dict) -> List[str]:
+        """Ссылки пагинации: по селекторам сайта и по виду URL среди ссылок того же раздела"""
+        path = urlparse(url).path.rstrip('/')
+        links = list(results.get('pagination', []))
+        for link in results.get('links', []):
+            if PAGINATION_PATTERN.search(link) and urlparse(link).path.rstrip('/').startswith(path):
+                links.append(link)
+        return links
+
+    async def crawl(self, start_url: str) -> Dict:
+        """Обход каталога начиная со start_url
+
+        Returns:
+            Объединенные товары и категории всех страниц и статистика обхода
+        """
+        rules = self.analyzer.rules_registry.get_rules(start_url)
+        site = site_host(start_url)
+        started = time.monotonic()
+
+        # Сайтам, которым нужен браузер, выдается один контекст на весь обход;
+        # остальные разбираются по HTTP и уходят в браузер только при необходимости
+        lease: Optional[BrowserLease] = None
+        if self.analyzer.pool and (rules.requires_js or not self.analyzer.http_first):
+            lease = await self.analyzer.pool.acquire(**self.analyzer.context_options)
+        context = lease.context if lease else None
+
+        queue: asyncio.Queue = asyncio.Queue()
+        seen: Set[str] = set()
+        products: Dict[str, Dict] = {}
+        categories: Dict[str, Dict] = {}
+        stats = {'visited': 0, 'failed': 0, 'over_budget': 0, 'max_depth_reached': 0}
+
+        def enqueue(url: str, depth: int, kind: str):
+            key = canonical_url(url)
+            if key in seen or not self.in_scope(url, site):
+                return
+            seen.add(key)
+            queue.put_nowait((url, depth, kind))
+
+        async def worker():
+            while True:
+                url, depth, kind = await queue.get()
+                try:
+                    if stats['visited'] >= self.max_pages:
+                        stats['over_budget'] += 1
+                        continue
+                    stats['visited'] += 1
+                    await self.wait_turn(url)
+
+                    try:
+                        results = await self.analyzer.analyze_page(url, rules, context)
+                    except Exception as e:
+                        stats['failed'] += 1
+                        self.logger.warning(f"Failed to crawl {url}: {str(e)}")
+                        if self.on_page:
+                            self.on_page({'url': url, 'depth': depth, 'kind': kind, 'error': str(e)})
+                        continue
+
+                    for product in results.get('products', []):
+                        products.setdefault(product_key(product), product)
+                    for category in results.get('categories', []):
+                        categories.setdefault(canonical_url(category['url']), category)
+                    self.logger.info(f"Crawled {url} ({kind}, depth {depth}): "
+                                     f"{len(results.get('products', []))} products")
+
+                    if self.on_page:
+                        self.on_page({
+                            'url': url,
+                            'depth': depth,
+                            'kind': kind,
+                            'title': results.get('title'),
+                            'engine': results.get('engine'),
+                            'products': results.get('products', []),
+                            'categories': len(results.get('categories', []))
+                        })
+
+                    for link in self.pagination_links(url, results):
+                        enqueue(link, depth, 'pagination')
+                    if depth < self.max_depth:
+                        for category in results.get('categories', []):
+                            enqueue(category['url'], depth + 1, 'category')
+                    elif results.get('categories'):
+                        stats['max_depth_reached'] += 1
+                finally:
+                    queue.task_done()
+
+        enqueue(start_url, 0, 'start')
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if lease:
+                await self.analyzer.pool.release(lease)
+
+        stats['discovered'] = len(seen)
+        stats['elapsed_s'] = round(time.monotonic() - started, 1)
+        self.logger.info(f"Crawl of {start_url} finished: {stats['visited']} pages, {len(products)} products")
+        return {
+            'url': start_url,
+            'products': list(products.values()),
+            'categories': list(categories.values()),
+            'stats': stats,
+            'timestamp': datetime.now().isoformat()
+        }
+
+async def crawl_catalog(url: str, output_dir: str = "data", max_depth: int = 2, max_pages: int = 50,
+                        concurrency: int = 4, delay: float = 1.0, verbose: bool = False) -> Dict:
+    """Полный обход каталога одного сайта с сохранением страниц и сводного прайс-листа"""
+    os.makedirs(output_dir, exist_ok=True)
+    domain = urlparse(url).netloc
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    # Страницы, которые уходят в браузер без общего контекста обхода, берут
+    # контекст из пула: пул рассчитан на все одновременные страницы обхода
+    async with BrowserPool(max_pages=concurrency) as pool:
+        async with EnhancedSiteAnalyzer(verbose=verbose, pool=pool) as analyzer:
+            with NDJSONSink(os.path.join(output_dir, f"crawl_{domain}_{timestamp}.ndjson")) as pages:
+                crawler = CatalogCrawler(analyzer, max_depth, max_pages, concurrency, delay, on_page=pages.write)
+                catalog = await crawler.crawl(url)
+
+    # Сводный список товаров: один товар на строку
+    with NDJSONSink(os.path.join(output_dir, f"catalog_{domain}_{timestamp}.ndjson")) as sink:
+        for product in catalog['products']:
+            sink.write(product)
+        logging.info(f"Saved {sink.records} products to {sink.path}")
+    return catalog
+
+def main():
+    parser = argparse.ArgumentParser(description='Обход каталога сайта по категориям и пагинации')
+    parser.add_argument('url', help='Начальный URL каталога')
+    parser.add_argument('-o', '--output', default='data', help='Директория для сохранения результатов')
+    parser.add_argument('-d', '--depth', type=int, default=2, help='Глубина переходов по категориям')
+    parser.add_argument('-p', '--pages', type=int, default=50, help='Максимальное число страниц')
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help='Число одновременных страниц')
+    parser.add_argument('--delay', type=float, default=1.0, help='Интервал между запросами к хосту, с')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Подробный вывод')
+
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    catalog = asyncio.run(crawl_catalog(args.url, args.output, args.depth, args.pages, args.concurrency,
+                                        args.delay, args.verbose))
+    print(f"Страниц обработано: {catalog['stats']['visited']}")
+    print(f"Найдено товаров: {len(catalog['products'])}")
+    print(f"Найдено категорий: {len(catalog['categories'])}")
+
+if __name__ == '__main__':
+    main()
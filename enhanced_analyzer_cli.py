@@ -3,44 +3,49 @@ import asyncio
 import argparse
 import logging
 import os
-import json
 from datetime import datetime
+from typing import Optional
 from enhanced_site_analyzer import EnhancedSiteAnalyzer
+from browser_pool import BrowserPool
+from result_sink import NDJSONSink, BULKY_FIELDS, sink_path
 
-async def analyze_sites(urls: list, output_dir: str = "data", verbose: bool = True):
+async def analyze_sites(urls: list, output_dir: str = "data", verbose: bool = True, concurrency: int = 4,
+                        compression: Optional[str] = None):
     """Анализ списка сайтов"""
     os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
-    async with EnhancedSiteAnalyzer(verbose=verbose) as analyzer:
-        for url in urls:
-            try:
-                results = await analyzer.analyze_site(url)
-                
-                # Сохранение результатов
-                domain = url.split('//')[1].split('/')[0]
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{domain}_{timestamp}.json"
-                filepath = os.path.join(output_dir, filename)
-                
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(results, f, ensure_ascii=False, indent=2)
-                
-                logging.info(f"Analysis completed for {url}")
-                logging.info(f"Found {len(results['categories'])} categories")
-                logging.info(f"Found {len(results['products'])} products")
-                logging.info(f"Results saved to {filepath}")
-                
-            except Exception as e:
-                logging.error(f"Error analyzing {url}: {str(e)}")
+    async def analyze_url(analyzer: EnhancedSiteAnalyzer, sink: NDJSONSink, url: str):
+        try:
+            results = await analyzer.analyze_site(url)
+            
+            # Сохранение результатов по мере готовности
+            sink.write(results)
+            
+            logging.info(f"Analysis completed for {url}")
+            logging.info(f"Found {len(results['categories'])} categories")
+            logging.info(f"Found {len(results['products'])} products")
+            logging.info(f"Results saved to {sink.path}")
+            
+        except Exception as e:
+            logging.error(f"Error analyzing {url}: {str(e)}")
+    
+    results_path = sink_path(output_dir, f"analysis_{timestamp}.ndjson", compression)
+    async with BrowserPool(max_pages=concurrency) as pool:
+        async with EnhancedSiteAnalyzer(verbose=verbose, pool=pool) as analyzer:
+            with NDJSONSink(results_path, compression, exclude_fields=BULKY_FIELDS) as sink:
+                await asyncio.gather(*(analyze_url(analyzer, sink, url) for url in urls))
 
 def main():
     parser = argparse.ArgumentParser(description='Enhanced Site Analyzer CLI')
     parser.add_argument('urls', nargs='+', help='URLs to analyze')
     parser.add_argument('-o', '--output', default='data', help='Output directory')
     parser.add_argument('-v', '--verbose', action='store_true', help='Enable verbose output')
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help='Number of sites analyzed concurrently')
+    parser.add_argument('--compress', choices=['gzip', 'zstd'], default=None, help='Compress the results stream')
     
     args = parser.parse_args()
-    asyncio.run(analyze_sites(args.urls, args.output, args.verbose))
+    asyncio.run(analyze_sites(args.urls, args.output, args.verbose, args.concurrency, args.compress))
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
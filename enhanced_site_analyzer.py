@@ -8,21 +8,35 @@ import random
 from urllib.parse import urljoin, urlparse
 import re
 from dataclasses import dataclass
-from enum import Enum
 import aiohttp
 import hashlib
 import os
 from datetime import datetime
+from page_extractor import PageExtractor
+from page_readiness import ReadinessDetector
+from site_rules import SiteRules, SiteRulesRegistry
+from browser_pool import BrowserPool, BrowserLease
+from static_analyzer import StaticSiteAnalyzer, html_text
+from page_cache import PageCache
+from resource_blocking import ResourceBlocker
+from har_archive import HarArchive
+from stage_metrics import StageTimer
+from protection_classifier import ProtectionClassifier, ProtectionType
+from network_recorder import NetworkRecorder
+from api_harvester import ApiHarvester
+from xhr_capture import ResponseCapture, JsonExtractor
+from scroll_harvester import ScrollHarvester
+from incremental import product_key
 
-class ProtectionType(Enum):
-    CLOUDFLARE = "cloudflare"
-    RECAPTCHA = "recaptcha"
-    HCAPTCHA = "hcaptcha"
-    JAVASCRIPT = "javascript"
-    COOKIE = "cookie"
-    IP_BASED = "ip_based"
-    USER_AGENT = "user_agent"
-    UNKNOWN = "unknown"
+class PageStatusError(Exception):
+    """Страница ответила кодом ошибки (код сохраняется для решения о повторе)"""
+
+    def __init__(self, status: int):
+        super().__init__(f"Page returned status code {status}")
+        self.status = status
+
+class ProtectionBypassError(Exception):
+    """Защита от ботов не пройдена (проверка может пройти при следующей попытке)"""
 
 @dataclass
 class SiteConfig:
@@ -47,71 +61,40 @@ class EnhancedAntiBotBypass:
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:123.0) Gecko/20100101 Firefox/123.0'
         ]
         self.proxy_list = []  # Список прокси будет загружаться динамически
+        self.classifier = ProtectionClassifier()
         
     async def detect_protection(self, page: Page) -> List[ProtectionType]:
         """Определение типа защиты на сайте"""
-        protections = []
-        
-        # Проверка Cloudflare
-        if await page.query_selector("iframe[title*='challenge']"):
-            protections.append(ProtectionType.CLOUDFLARE)
-            
-        # Проверка reCAPTCHA
-        if await page.query_selector("iframe[src*='recaptcha']"):
-            protections.append(ProtectionType.RECAPTCHA)
-            
-        # Проверка hCaptcha
-        if await page.query_selector("iframe[src*='hcaptcha']"):
-            protections.append(ProtectionType.HCAPTCHA)
-            
-        # Проверка JavaScript защиты
-        js_checks = await page.evaluate("""() => {
-            return {
-                hasBotDetection: !!window._botDetection,
-                hasAntiBot: !!window._antiBot,
-                hasProtection: !!window._protection
-            }
-        }""")
-        if any(js_checks.values()):
-            protections.append(ProtectionType.JAVASCRIPT)
-            
-        # Проверка cookie защиты
-        cookies = await page.context.cookies()
-        if any('cf_' in cookie.get('name', '') for cookie in cookies):
-            protections.append(ProtectionType.COOKIE)
-            
-        return protections or [ProtectionType.UNKNOWN]
+        report = await self.classifier.classify(page)
+        return report.types or [ProtectionType.UNKNOWN]
         
-    async def bypass_cloudflare(self, page: Page) -> bool:
-        """Обход Cloudflare защиты"""
+    async def bypass_cloudflare(self, page: Page, timeout_ms: int = 30000) -> bool:
+        """Обход Cloudflare защиты (вызывается, только если страница проверки обнаружена)"""
         try:
-            # Ждем появления challenge
-            challenge_frame = await page.wait_for_selector("iframe[title*='challenge']", timeout=5000)
-            if challenge_frame:
-                # Эмулируем человеческое поведение
-                await page.mouse.move(random.randint(100, 700), random.randint(100, 700))
-                await page.wait_for_timeout(random.randint(2000, 4000))
-                
-                # Ждем исчезновения challenge
-                try:
-                    await page.wait_for_selector("iframe[title*='challenge']", state="detached", timeout=30000)
+            # Эмулируем человеческое поведение
+            await page.mouse.move(random.randint(100, 700), random.randint(100, 700))
+            await page.wait_for_timeout(random.randint(2000, 4000))
+            
+            # Ждем ухода со страницы проверки; встроенный виджет Turnstile
+            # может оставаться на странице и не считается блокирующим
+            deadline = time.monotonic() + timeout_ms / 1000
+            while True:
+                report = await self.classifier.classify(page)
+                if not report.blocks(ProtectionType.CLOUDFLARE):
                     return True
-                except:
+                if time.monotonic() >= deadline:
                     return False
-            return True
+                await page.wait_for_timeout(1000)
         except Exception as e:
             self.logger.error(f"Error bypassing Cloudflare: {str(e)}")
             return False
             
     async def bypass_recaptcha(self, page: Page) -> bool:
-        """Обход reCAPTCHA"""
+        """Обход reCAPTCHA (вызывается, только если капча обнаружена)"""
         try:
-            recaptcha_frame = await page.wait_for_selector("iframe[src*='recaptcha']", timeout=5000)
-            if recaptcha_frame:
-                # Здесь можно добавить логику обхода reCAPTCHA
-                # Например, использование сервиса решения капчи
-                await page.wait_for_timeout(10000)
-                return True
+            # Здесь можно добавить логику обхода reCAPTCHA
+            # Например, использование сервиса решения капчи
+            await page.wait_for_timeout(10000)
             return True
         except Exception as e:
             self.logger.error(f"Error bypassing reCAPTCHA: {str(e)}")
@@ -150,18 +133,46 @@ class EnhancedAntiBotBypass:
 class EnhancedSiteAnalyzer:
     """Улучшенный анализатор сайтов"""
     
-    def __init__(self, verbose: bool = False):
-        """Инициализация анализатора сайтов"""
+    def __init__(self, verbose: bool = False, pool: Optional[BrowserPool] = None, http_first: bool = True,
+                 cache: Optional[PageCache] = None, use_cache: bool = True, har: Optional[HarArchive] = None):
+        """Инициализация анализатора сайтов
+        
+        Args:
+            verbose: Подробный вывод логов
+            pool: Общий пул браузеров; если задан, каждый вызов analyze_site
+                получает из пула собственный изолированный контекст
+            http_first: Для сайтов без requires_js сначала пробовать статический HTML
+            cache: Кэш страниц и результатов; по умолчанию создается в cache_dir
+            use_cache: Использовать ли кэш
+            har: Запись или воспроизведение сетевого обмена страниц; в этом режиме
+                сайт всегда анализируется в браузере, без кэша результатов и выгрузки API
+        """
         self.verbose = verbose
+        self.pool = pool
+        self.http_first = http_first
+        self.har = har
+        self.cache_dir = "cache"
+        self.cache = cache or (PageCache(self.cache_dir) if use_cache else None)
+        # URL, последний анализ которых в этом прогоне шел через браузер (их DOM в кэше актуален)
+        self.rendered: Set[str] = set()
+        self.static_analyzer = StaticSiteAnalyzer(cache=self.cache)
+        self.api_harvester = ApiHarvester()
+        self.json_extractor = JsonExtractor()
+        self.context_options = {
+            'viewport': {'width': 1920, 'height': 1080},
+            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        }
         self.browser: Optional[Browser] = None
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
         self.playwright: Optional[Playwright] = None
-        self.request_log: List[Dict] = []
         self.anti_bot = EnhancedAntiBotBypass()
         self.site_configs: Dict[str, SiteConfig] = {}
-        self.cache_dir = "cache"
-        os.makedirs(self.cache_dir, exist_ok=True)
+        self.readiness = ReadinessDetector()
+        self.scroll_harvester = ScrollHarvester(self.readiness)
+        self.rules_registry = SiteRulesRegistry()
+        # Планы извлечения строятся из правил сайта один раз на домен
+        self.extractor = PageExtractor(rules_registry=self.rules_registry)
         
         # Настройка логирования
         log_level = logging.DEBUG if verbose else logging.INFO
@@ -174,6 +185,10 @@ class EnhancedSiteAnalyzer:
     async def init_browser(self):
         """Инициализация браузера"""
         try:
+            if self.pool:
+                # Пул запускает браузеры сам при выдаче первого контекста
+                return
+                
             if not self.playwright:
                 self.logger.debug("Starting playwright")
                 self.playwright = await async_playwright().start()
@@ -185,10 +200,7 @@ class EnhancedSiteAnalyzer:
                 )
                 
                 self.logger.debug("Creating browser context")
-                self.context = await self.browser.new_context(
-                    viewport={'width': 1920, 'height': 1080},
-                    user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                )
+                self.context = await self.browser.new_context(**self.context_options)
                 self.logger.debug("Browser initialization completed")
         except Exception as e:
             self.logger.error(f"Error initializing browser: {str(e)}")
@@ -200,16 +212,24 @@ class EnhancedSiteAnalyzer:
                 await self.playwright.stop()
             raise
 
-    async def create_page(self, url: str) -> Optional[Page]:
-        """Создание страницы с настройками"""
+    async def create_page(self, url: str, context: Optional[BrowserContext] = None,
+                          capture: Optional[ResponseCapture] = None) -> Optional[Page]:
+        """Создание страницы с настройками
+        
+        Args:
+            url: URL сайта
+            context: Контекст браузера (по умолчанию общий контекст анализатора)
+            capture: Буфер JSON ответов XHR/fetch, подключаемый до навигации
+        """
         try:
             self.logger.debug(f"Creating page for {url}")
             await self.init_browser()
             
-            if not self.context:
+            context = context or self.context
+            if not context:
                 raise Exception("Browser context not initialized")
             
-            page = await self.context.new_page()
+            page = await context.new_page()
             if not page:
                 raise Exception("Failed to create page")
                 
@@ -220,16 +240,12 @@ class EnhancedSiteAnalyzer:
             page.set_default_navigation_timeout(60000)  # Увеличиваем таймаут навигации до 60 секунд
             page.set_default_timeout(60000)  # Увеличиваем общий таймаут до 60 секунд
             
-            # Обработка запросов
-            self.logger.debug("Setting up request handling")
-            async def handle_request(request):
-                self.request_log.append({
-                    'url': request.url,
-                    'method': request.method,
-                    'timestamp': datetime.now().isoformat()
-                })
+            # Отслеживание мутаций DOM и активных XHR/fetch для ожидания готовности
+            await self.readiness.install(page)
             
-            page.on('request', handle_request)
+            # Перехват JSON ответов, из которых страница строит каталог
+            if capture:
+                capture.attach(page)
             
             # Настройка перехватчиков JavaScript
             self.logger.debug("Adding JavaScript interceptors")
@@ -259,8 +275,18 @@ class EnhancedSiteAnalyzer:
             self.logger.error(f"Error creating page: {str(e)}")
             return None
 
-    async def bypass_antibot(self, page: Page) -> bool:
-        """Обход защиты от ботов"""
+    async def bypass_antibot(self, page: Page, readiness_waits: Optional[List[Dict]] = None,
+                             protection_reports: Optional[List[Dict]] = None) -> bool:
+        """Обход защиты от ботов
+
+        Виды защиты определяются одной проверкой страницы, обход выполняется
+        только для обнаруженных.
+
+        Args:
+            page: Страница после навигации
+            readiness_waits: Список, в который добавляются результаты ожиданий готовности
+            protection_reports: Список, в который добавляются результаты проверок защиты
+        """
         try:
             self.logger.debug("Attempting to bypass antibot protection")
             
@@ -283,18 +309,25 @@ class EnhancedSiteAnalyzer:
             await page.mouse.wheel(delta_x=0, delta_y=-30)
             
             # Ожидание загрузки контента
-            await page.wait_for_timeout(2000)
-            
-            # Проверка на наличие защиты
-            has_antibot = await page.evaluate("""() => {
-                return !!(
-                    document.querySelector('[class*="antibot"]') ||
-                    document.querySelector('[id*="antibot"]') ||
-                    document.querySelector('script[src*="antibot"]')
-                );
-            }""")
+            wait = await self.readiness.wait(page)
+            if readiness_waits is not None:
+                readiness_waits.append(wait)
+            
+            # Все признаки защиты за одну проверку
+            report = await self.anti_bot.classifier.classify(page)
+            if protection_reports is not None:
+                protection_reports.append(report.to_dict())
+            
+            # Ожидание только для защиты, закрывающей страницу; встроенные
+            # виджеты и невидимая капча анализу не мешают
+            if report.blocks(ProtectionType.CLOUDFLARE) and not await self.anti_bot.bypass_cloudflare(page):
+                self.logger.error("Failed to pass Cloudflare challenge")
+                return False
+            
+            if report.blocks(ProtectionType.RECAPTCHA) and not await self.anti_bot.bypass_recaptcha(page):
+                return False
             
-            if has_antibot:
+            if report.has(ProtectionType.JAVASCRIPT):
                 self.logger.warning("Antibot protection detected")
                 
                 # Дополнительные действия для обхода защиты
@@ -316,18 +349,16 @@ class EnhancedSiteAnalyzer:
                 
                 # Перезагрузка страницы
                 await page.reload(wait_until="networkidle")
-                await page.wait_for_timeout(3000)
+                wait = await self.readiness.wait(page)
+                if readiness_waits is not None:
+                    readiness_waits.append(wait)
                 
                 # Повторная проверка
-                has_antibot = await page.evaluate("""() => {
-                    return !!(
-                        document.querySelector('[class*="antibot"]') ||
-                        document.querySelector('[id*="antibot"]') ||
-                        document.querySelector('script[src*="antibot"]')
-                    );
-                }""")
+                report = await self.anti_bot.classifier.classify(page)
+                if protection_reports is not None:
+                    protection_reports.append(report.to_dict())
                 
-                if has_antibot:
+                if report.has(ProtectionType.JAVASCRIPT):
                     self.logger.error("Failed to bypass antibot protection")
                     return False
                     
@@ -338,77 +369,261 @@ class EnhancedSiteAnalyzer:
             self.logger.error(f"Error bypassing antibot protection: {str(e)}")
             return False
 
-    async def analyze_site(self, url: str) -> Dict:
-        """Анализ сайта"""
+    async def analyze_site(self, url: str, refresh: bool = False) -> Dict:
+        """Анализ сайта с повторным использованием результатов из кэша
+        
+        Args:
+            url: URL сайта
+            refresh: Не использовать сохраненный результат (страница заведомо изменилась)
+        
+        Длительность этапов этого вызова сохраняется в поле spans результата.
+        """
+        timer = StageTimer()
+        # Записанный или воспроизводимый прогон должен пройти через браузер
+        refresh = refresh or bool(self.har)
+        if self.cache and not refresh:
+            with timer.span('cache_lookup'):
+                cached = self.cache.get('result', url)
+                if cached and not cached.fresh:
+                    # Устаревший результат годен, если страница не изменилась (304 Not Modified)
+                    if await self.static_analyzer.revalidate(url, cached.etag, cached.last_modified):
+                        self.cache.touch('result', url)
+                        cached.fresh = True
+            if cached and cached.fresh:
+                self.logger.info(f"Using cached analysis for {url}")
+                return dict(cached.json(), spans=timer.spans())
+        
+        results = await self.analyze_site_uncached(url, timer)
+        validators = results.pop('validators', None) or {}
+        # Этапы относятся к этому вызову, в сохраненный результат они не попадают
+        results.pop('spans', None)
+        if self.cache and not self.har:
+            with timer.span('cache_store'):
+                self.cache.put_json('result', url, results,
+                                    etag=validators.get('etag'),
+                                    last_modified=validators.get('last_modified'))
+        results['spans'] = timer.spans()
+        return results
+
+    async def analyze_site_uncached(self, url: str, timer: Optional[StageTimer] = None) -> Dict:
+        """Анализ сайта с выгрузкой каталога через JSON API, если оно описано в правилах сайта"""
+        timer = timer or StageTimer()
+        rules = self.rules_registry.get_rules(url)
+        harvest = None
+        if rules.ajax_pagination and rules.api_endpoints and not self.har:
+            # Каталог из API выгружается параллельно с анализом страницы
+            harvest = asyncio.create_task(self.api_harvester.harvest(url, rules))
+        
+        try:
+            results = await self.analyze_page(url, rules, timer=timer)
+        except Exception:
+            if harvest:
+                harvest.cancel()
+            raise
+        
+        if harvest:
+            try:
+                with timer.span('api_harvest_wait'):
+                    api = await harvest
+            except Exception as e:
+                self.logger.warning(f"API harvest of {url} failed: {str(e)}")
+                api = None
+            if api:
+                results['products'] = self.merge_products(api['products'], results['products'])
+                results['api'] = {key: api[key] for key in ('endpoint', 'pages', 'records')}
+            results['spans'] = timer.spans()
+        return results
+
+    @staticmethod
+    def merge_products(primary: List[Dict], extra: List[Dict]) -> List[Dict]:
+        """Товары из API, дополненные найденными на странице, без повторов"""
+        seen = {product_key(product) for product in primary}
+        return primary + [product for product in extra if product_key(product) not in seen]
+
+    async def analyze_page(self, url: str, rules: SiteRules, context: Optional[BrowserContext] = None,
+                           timer: Optional[StageTimer] = None) -> Dict:
+        """Анализ страницы: сначала по статическому HTML, браузер - только при необходимости"""
+        timer = timer or StageTimer()
+        if self.http_first and not rules.requires_js and not self.har:
+            try:
+                with timer.span('static_analysis'):
+                    results = await self.static_analyzer.analyze_site(url, self.extractor.plan_for(url))
+                reason = results.pop('escalate')
+                if not reason:
+                    self.logger.info(f"Analyzed {url} without browser")
+                    self.rendered.discard(url)
+                    results['spans'] = timer.spans()
+                    return results
+                self.logger.info(f"Escalating {url} to browser: {reason}")
+            except Exception as e:
+                self.logger.info(f"HTTP fetch of {url} failed, escalating to browser: {str(e)}")
+        
+        return await self.analyze_site_browser(url, context, timer)
+
+    async def get_page_content(self, url: str) -> Dict[str, str]:
+        """Исходный HTML и видимый текст страницы после анализа
+
+        Текст берется из отрендеренного DOM, сохраненного браузерным анализом
+        этого прогона, а если страница разбиралась без браузера (или DOM остался
+        от прошлого прогона) - из только что загруженного HTML.
+        """
+        html = ''
+        try:
+            _, html, _, _ = await self.static_analyzer.fetch(url)
+        except Exception as e:
+            self.logger.debug(f"Failed to fetch HTML of {url}: {str(e)}")
+        dom = self.cache.get('dom', url) if self.cache and url in self.rendered else None
+        rendered = dom.text() if dom and dom.fresh else html
+        return {'html': html, 'text': html_text(rendered) if rendered else ''}
+
+    async def analyze_site_browser(self, url: str, context: Optional[BrowserContext] = None,
+                                   timer: Optional[StageTimer] = None) -> Dict:
+        """Анализ сайта в браузере
+        
+        Args:
+            url: URL страницы
+            context: Контекст, в котором открыть страницу (например, общий для страниц
+                одного сайта); по умолчанию - контекст из пула или общий контекст анализатора
+            timer: Замер этапов, начатый вызывающим (например, после попытки без браузера)
+        """
+        timer = timer or StageTimer()
         page = None
+        lease: Optional[BrowserLease] = None
+        readiness_waits = []
+        protection_reports = []
         try:
             self.logger.info(f"Starting analysis of {url}")
+            rules = self.rules_registry.get_rules(url)
+            
+            capture = ResponseCapture.for_rules(rules)
             
-            # Создание страницы
-            page = await self.create_page(url)
+            # Создание страницы (в собственном контексте из пула, если он задан)
+            with timer.span('page_setup'):
+                if context:
+                    page = await self.create_page(url, context, capture)
+                elif self.pool:
+                    lease = await self.pool.acquire(**self.context_options)
+                    page = await self.create_page(url, lease.context, capture)
+                else:
+                    page = await self.create_page(url, capture=capture)
             
             if not page:
                 raise Exception("Failed to create page")
             
+            # Запись ответов в HAR или их воспроизведение вместо сети
+            har = await self.har.attach(page, url) if self.har else None
+            
+            # Блокировка картинок, шрифтов и счетчиков по профилю сайта
+            blocker = ResourceBlocker(rules.resource_profile)
+            await blocker.attach(page)
+            
+            # Журнал запросов только этой страницы
+            recorder = NetworkRecorder()
+            recorder.attach(page, url)
+            
             # Переход на страницу с дополнительным ожиданием
             self.logger.debug(f"Navigating to {url}")
-            response = await page.goto(url, wait_until="networkidle", timeout=60000)
+            with timer.span('navigation'):
+                response = await page.goto(url, wait_until="networkidle", timeout=60000)
             
             if not response:
                 raise Exception("Failed to load page")
                 
             if response.status != 200:
-                raise Exception(f"Page returned status code {response.status}")
+                raise PageStatusError(response.status)
             
             # Обход защиты от ботов
-            if not await self.bypass_antibot(page):
-                raise Exception("Failed to bypass antibot protection")
+            with timer.span('protection_bypass'):
+                bypassed = await self.bypass_antibot(page, readiness_waits, protection_reports)
+            if not bypassed:
+                raise ProtectionBypassError("Failed to bypass antibot protection")
             
             # Эмуляция действий пользователя
             self.logger.debug("Emulating user actions")
             await page.mouse.move(100, 100)
             await page.mouse.wheel(delta_x=0, delta_y=100)
             
-            # Ожидание появления основного контента
-            try:
-                self.logger.debug("Waiting for main content")
-                await page.wait_for_selector('body', timeout=10000)
-                
-                # Проверяем наличие основного контента
-                content_selectors = ['.main-content', '#content', 'main', '.content', '#main']
-                for selector in content_selectors:
-                    try:
-                        await page.wait_for_selector(selector, timeout=5000)
-                        self.logger.debug(f"Found content selector: {selector}")
-                        break
-                    except:
-                        continue
-                        
-            except Exception as e:
-                self.logger.warning(f"Content selectors not found: {str(e)}")
+            # Ожидание появления основного контента и стабилизации DOM
+            self.logger.debug("Waiting for main content")
+            content_selectors = ['.main-content', '#content', 'main', '.content', '#main']
+            with timer.span('dynamic_content'):
+                wait = await self.readiness.wait(page, rules.selectors.wait_for + content_selectors)
+            readiness_waits.append(wait)
+            if wait['matched_selector']:
+                self.logger.debug(f"Found content selector: {wait['matched_selector']}")
             
             # Анализ страницы
             self.logger.debug("Analyzing page structure")
-            structure = await self.analyze_site_structure(page)
-            
-            self.logger.debug("Extracting categories")
-            categories = await self.extract_categories(page)
-            
-            self.logger.debug("Extracting products")
-            products = await self.extract_products(page)
-            
-            self.logger.debug("Extracting links")
-            links = await self.extract_links(page)
+            with timer.span('structure'):
+                structure = await self.analyze_site_structure(page)
+            
+            # Лента с подгрузкой: прокрутка и "показать еще" до исчерпания
+            scroll = None
+            if rules.js_scroll:
+                self.logger.debug("Harvesting lazy-loaded products")
+                plan = self.extractor.plan_for(url) or self.extractor.plan
+                with timer.span('scroll_harvest'):
+                    scroll = await self.scroll_harvester.harvest(
+                        page, plan, self.scroll_harvester.load_more_selectors(rules)
+                    )
+            
+            json_data = None
+            if capture:
+                with timer.span('extract_json'):
+                    await capture.drain()
+                    json_data = self.json_extractor.extract(capture.responses, page.url, rules.json_extraction)
+            
+            if json_data and json_data['products'] and rules.json_extraction and rules.json_extraction.skip_dom:
+                # SPA каталог: данные уже получены страницей через XHR
+                self.logger.debug(f"Using {len(json_data['products'])} products from captured JSON")
+                extracted = {'categories': json_data['categories'], 'products': json_data['products'],
+                             'links': [], 'pagination': [], 'dedup': {}}
+            else:
+                self.logger.debug("Extracting categories, products and links")
+                with timer.span('extract_dom'):
+                    extracted = await self.extract_page_data(page)
+                if json_data:
+                    extracted['products'] = self.merge_products(json_data['products'], extracted['products'])
+                    known = {category['url'] for category in json_data['categories']}
+                    extracted['categories'] = json_data['categories'] + [
+                        category for category in extracted['categories'] if category['url'] not in known
+                    ]
+            
+            if scroll:
+                # Товары, выгруженные из DOM при прокрутке (в виртуализированных списках их уже нет на странице)
+                extracted['products'] = self.merge_products(extracted['products'], scroll['products'])
+            
+            title = await page.title()
+            if self.cache:
+                # Отрендеренный DOM для повторного разбора без браузера
+                with timer.span('dom_cache'):
+                    self.cache.put('dom', url, (await page.content()).encode('utf-8'))
+                self.rendered.add(url)
             
             results = {
                 'url': url,
-                'title': await page.title(),
+                'title': title,
                 'structure': structure,
-                'categories': categories,
-                'products': products,
-                'links': links,
-                'request_log': self.request_log,
-                'timestamp': datetime.now().isoformat()
+                'categories': extracted['categories'],
+                'products': extracted['products'],
+                'links': extracted['links'],
+                'pagination': extracted['pagination'],
+                'dedup': extracted['dedup'],
+                'request_log': recorder.log(),
+                'network': recorder.summary(),
+                'readiness': self.readiness.summarize(readiness_waits),
+                'protection': protection_reports[-1] if protection_reports else None,
+                'resource_blocking': blocker.summary(),
+                'xhr_capture': capture.summary() if capture else None,
+                'scroll': scroll['stats'] if scroll else None,
+                'har': har,
+                'engine': 'browser',
+                'validators': {
+                    'etag': response.headers.get('etag'),
+                    'last_modified': response.headers.get('last-modified')
+                },
+                'timestamp': datetime.now().isoformat(),
+                'spans': timer.spans()
             }
             
             self.logger.debug("Analysis completed successfully")
@@ -421,7 +636,12 @@ class EnhancedSiteAnalyzer:
         finally:
             if page:
                 self.logger.debug("Closing page")
-                await page.close()
+                try:
+                    await page.close()
+                except Exception as e:
+                    self.logger.debug(f"Error closing page: {str(e)}")
+            if lease:
+                await self.pool.release(lease)
 
     async def analyze_site_structure(self, page: Page) -> Dict:
         """Анализ структуры сайта для определения основных элементов"""
@@ -533,11 +753,14 @@ class EnhancedSiteAnalyzer:
 
     async def __aenter__(self):
         self.logger.debug("Entering context manager")
-        await self.init_browser()
+        # Браузер запускается лениво в create_page: сайты, обработанные
+        # по HTTP или из кэша, его не требуют
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         self.logger.debug("Exiting context manager")
+        await self.static_analyzer.close()
+        await self.api_harvester.close()
         if self.context:
             await self.context.close()
         if self.browser:
@@ -545,204 +768,21 @@ class EnhancedSiteAnalyzer:
         if self.playwright:
             await self.playwright.stop()
 
+    async def extract_page_data(self, page: Page) -> Dict[str, List]:
+        """Извлечение категорий, товаров и ссылок одним вызовом page.evaluate
+
+        Для сайтов с правилами используются их селекторы, для остальных - общие эвристики.
+        """
+        return await self.extractor.extract(page, self.extractor.plan_for(page.url))
+
     async def extract_categories(self, page: Page) -> List[Dict[str, str]]:
         """Извлечение категорий со страницы"""
-        categories = []
-        
-        # Ждем загрузки элементов меню
-        await page.wait_for_timeout(5000)  # Увеличенный таймаут для динамического контента
-        
-        # Список селекторов для извлечения категорий
-        selectors = [
-            ".menu-menu1 a",  # Основные пункты меню
-            ".menu-menu2 a",  # Подпункты меню
-            ".cats-wrap .item a",  # Карточки категорий товаров
-            ".big-menu a",  # Большое меню
-            "nav[id^='nav'] a",  # Элементы навигации
-            ".catalog-menu a",  # Меню каталога
-            "#menu a",  # Элементы меню
-            ".categories a",  # Общие категории
-            ".product-categories a",  # Категории товаров
-            ".sidebar a",  # Сайдбар
-            ".category-list a",  # Список категорий
-            ".catalog a",  # Каталог
-            ".menu a",  # Меню
-            ".nav a",  # Навигация
-            "[class*='category'] a",  # Любые элементы с 'category' в классе
-            "[class*='catalog'] a"  # Любые элементы с 'catalog' в классе
-        ]
-        
-        # Пробуем каждый селектор
-        for selector in selectors:
-            try:
-                elements = await page.query_selector_all(selector)
-                for element in elements:
-                    try:
-                        href = await element.get_attribute('href')
-                        if href and not href.startswith('#') and not href.startswith('javascript:'):
-                            name = await element.text_content()
-                            name = name.strip() if name else ''
-                            if name and href:
-                                # Преобразуем относительные URL в абсолютные
-                                if not href.startswith('http'):
-                                    base_url = page.url
-                                    href = urljoin(base_url, href)
-                                
-                                # Добавляем в категории, если еще нет
-                                category = {'name': name, 'url': href}
-                                if category not in categories:
-                                    categories.append(category)
-                    except Exception as e:
-                        self.logger.debug(f"Error extracting category details: {str(e)}")
-            except Exception as e:
-                self.logger.debug(f"Error with selector {selector}: {str(e)}")
-                continue
-        
-        # Удаляем дубликаты, сохраняя порядок
-        seen = set()
-        unique_categories = []
-        for cat in categories:
-            cat_tuple = (cat['name'], cat['url'])
-            if cat_tuple not in seen:
-                seen.add(cat_tuple)
-                unique_categories.append(cat)
-        
-        # Фильтруем не-категории
-        filtered_categories = []
-        exclude_patterns = [
-            '/about/', '/contacts/', '/feedback/', '/user/',
-            'javascript:', '#', 'tel:', 'mailto:',
-            '/docs/', '/transportation/', '/service/',
-            '/news/', '/blog/', '/articles/',
-            '/delivery/', '/payment/', '/warranty/'
-        ]
-        
-        for cat in unique_categories:
-            if not any(pattern in cat['url'].lower() for pattern in exclude_patterns):
-                if cat['name'].strip() and len(cat['name'].strip()) > 1:  # Проверяем, что имя не пустое и не слишком короткое
-                    filtered_categories.append(cat)
-        
-        return filtered_categories
+        return (await self.extract_page_data(page))['categories']
 
     async def extract_products(self, page: Page) -> List[Dict]:
         """Извлечение информации о товарах со страницы"""
-        products = []
-        
-        # Ждем загрузки элементов товаров
-        await page.wait_for_timeout(5000)
-        
-        # Список селекторов для извлечения товаров
-        selectors = [
-            ".product-item",  # Стандартный элемент товара
-            ".catalog-item",  # Элемент каталога
-            ".item-product",  # Элемент продукта
-            "[class*='product']",  # Любые элементы с 'product' в классе
-            "[class*='item']"  # Любые элементы с 'item' в классе
-        ]
-        
-        # Пробуем каждый селектор
-        for selector in selectors:
-            try:
-                elements = await page.query_selector_all(selector)
-                for element in elements:
-                    try:
-                        # Извлекаем информацию о товаре
-                        product = {}
-                        
-                        # Название товара
-                        name_elem = await element.query_selector('h1, h2, h3, .title, .name, [class*="title"], [class*="name"]')
-                        if name_elem:
-                            product['name'] = await name_elem.text_content()
-                            product['name'] = product['name'].strip() if product['name'] else ''
-                        
-                        # Цена
-                        price_elem = await element.query_selector('.price, .cost, [class*="price"], [class*="cost"]')
-                        if price_elem:
-                            price_text = await price_elem.text_content()
-                            price_text = price_text.strip() if price_text else ''
-                            # Извлекаем только цифры из строки цены
-                            price = re.findall(r'\d+[\s.,]?\d*', price_text)
-                            if price:
-                                product['price'] = price[0].replace(' ', '').replace(',', '.')
-                        
-                        # URL товара
-                        link_elem = await element.query_selector('a')
-                        if link_elem:
-                            href = await link_elem.get_attribute('href')
-                            if href:
-                                if not href.startswith('http'):
-                                    base_url = page.url
-                                    href = urljoin(base_url, href)
-                                product['url'] = href
-                        
-                        # Описание
-                        desc_elem = await element.query_selector('.description, .desc, [class*="description"], [class*="desc"]')
-                        if desc_elem:
-                            product['description'] = await desc_elem.text_content()
-                            product['description'] = product['description'].strip() if product['description'] else ''
-                        
-                        # Добавляем товар, если есть хотя бы название или URL
-                        if product.get('name') or product.get('url'):
-                            products.append(product)
-                            
-                    except Exception as e:
-                        self.logger.debug(f"Error extracting product details: {str(e)}")
-            except Exception as e:
-                self.logger.debug(f"Error with selector {selector}: {str(e)}")
-                continue
-        
-        return products
+        return (await self.extract_page_data(page))['products']
 
     async def extract_links(self, page: Page) -> List[str]:
         """Извлечение всех ссылок со страницы"""
-        links = []
-        
-        # Ждем загрузки всех ссылок
-        await page.wait_for_timeout(5000)
-        
-        # Список селекторов для извлечения ссылок
-        selectors = [
-            "a",  # Все элементы <a>
-            "link[href]",  # Все элементы <link> с атрибутом href
-            "img[src]",  # Все элементы <img> с атрибутом src
-            "script[src]",  # Все элементы <script> с атрибутом src
-            "iframe[src]",  # Все элементы <iframe> с атрибутом src
-            "video[src]",  # Все элементы <video> с атрибутом src
-            "audio[src]",  # Все элементы <audio> с атрибутом src
-            "object[data]",  # Все элементы <object> с атрибутом data
-            "embed[src]",  # Все элементы <embed> с атрибутом src
-            "area[href]",  # Все элементы <area> с атрибутом href
-            "form[action]",  # Все элементы <form> с атрибутом action
-            "input[src]"  # Все элементы <input> с атрибутом src
-        ]
-        
-        # Пробуем каждый селектор
-        for selector in selectors:
-            try:
-                elements = await page.query_selector_all(selector)
-                for element in elements:
-                    try:
-                        # Получаем атрибут href или src в зависимости от типа элемента
-                        if selector == "form[action]":
-                            href = await element.get_attribute('action')
-                        elif selector == "input[src]":
-                            href = await element.get_attribute('src')
-                        else:
-                            href = await element.get_attribute('href') or await element.get_attribute('src')
-                        
-                        if href and not href.startswith('#') and not href.startswith('javascript:'):
-                            # Преобразуем относительные URL в абсолютные
-                            if not href.startswith('http'):
-                                base_url = page.url
-                                href = urljoin(base_url, href)
-                            
-                            # Добавляем в список, если еще нет
-                            if href not in links:
-                                links.append(href)
-                    except Exception as e:
-                        self.logger.debug(f"Error extracting link details: {str(e)}")
-            except Exception as e:
-                self.logger.debug(f"Error with selector {selector}: {str(e)}")
-                continue
-        
-        return links 
\ No newline at end of file
+        return (await self.extract_page_data(page))['links']
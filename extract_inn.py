@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
+import argparse
 import asyncio
+import errno
 import logging
 import os
-import json
-import re
+import socket
+import ssl
 from datetime import datetime
-from typing import List, Tuple, Optional
-from enhanced_site_analyzer import EnhancedSiteAnalyzer
+from typing import Dict, List, Tuple, Optional
+from enhanced_site_analyzer import EnhancedSiteAnalyzer, PageStatusError, ProtectionBypassError
+from inn_scanner import InnScanner, is_valid_inn
+from requisites_finder import RequisitesFinder
+from site_prober import SiteProber
+from browser_pool import BrowserPool
+from result_sink import Checkpoint, NDJSONSink
+from playwright.async_api import Error as PlaywrightError
 import aiohttp
 import backoff
 import signal
@@ -24,6 +32,58 @@ logging.basicConfig(
 
 # Глобальные переменные для управления состоянием
 shutdown_event = asyncio.Event()
+scanner = InnScanner()
+
+# Ошибки браузера, которые не исправятся повторной попыткой
+PERMANENT_NET_ERRORS = (
+    'ERR_NAME_NOT_RESOLVED',
+    'ERR_NAME_RESOLUTION_FAILED',
+    'ERR_CERT_',
+    'ERR_SSL_',
+    'ERR_CONNECTION_REFUSED',
+    'ERR_ADDRESS_UNREACHABLE',
+    'ERR_INVALID_URL',
+    'ERR_TOO_MANY_REDIRECTS'
+)
+
+# Ошибки сокета, соответствующие ERR_CONNECTION_REFUSED и ERR_ADDRESS_UNREACHABLE браузера
+PERMANENT_ERRNOS = (errno.ECONNREFUSED, errno.ENETUNREACH, errno.EHOSTUNREACH)
+
+RETRYABLE = 'retryable'
+PERMANENT = 'permanent'
+
+def is_permanent_os_error(error: Optional[BaseException]) -> bool:
+    """Хост не найден, отказал в соединении или недоступен"""
+    return (isinstance(error, (socket.gaierror, ConnectionRefusedError)) or
+            (isinstance(error, OSError) and error.errno in PERMANENT_ERRNOS))
+
+def retryable_status(status: int) -> bool:
+    """Код ответа, после которого запрос стоит повторить (408, 429, 5xx)"""
+    return status in (408, 429) or status >= 500
+
+def classify_error(error: BaseException) -> str:
+    """Повторяемая ошибка (таймаут, обрыв соединения, 429/5xx, непройденная защита) или постоянная (DNS, отказ в соединении, TLS, 4xx, ошибка разбора)"""
+    if isinstance(error, asyncio.TimeoutError):
+        return RETRYABLE
+    if isinstance(error, aiohttp.ClientResponseError):
+        return RETRYABLE if retryable_status(error.status) else PERMANENT
+    if isinstance(error, PageStatusError):
+        # Тот же код, полученный браузером, классифицируется так же, как ответ aiohttp
+        return RETRYABLE if retryable_status(error.status) else PERMANENT
+    if isinstance(error, ProtectionBypassError):
+        return RETRYABLE
+    if isinstance(error, (aiohttp.ClientConnectorCertificateError, aiohttp.ClientConnectorSSLError, ssl.SSLError)):
+        return PERMANENT
+    if isinstance(error, aiohttp.ClientConnectorError):
+        return PERMANENT if is_permanent_os_error(error.os_error) else RETRYABLE
+    if is_permanent_os_error(error):
+        return PERMANENT
+    if isinstance(error, (aiohttp.ClientError, ConnectionError)):
+        return RETRYABLE
+    if isinstance(error, PlaywrightError):
+        message = str(error)
+        return PERMANENT if any(code in message for code in PERMANENT_NET_ERRORS) else RETRYABLE
+    return PERMANENT
 
 def signal_handler():
     """Обработчик сигнала для корректного завершения"""
@@ -31,11 +91,11 @@ def signal_handler():
     shutdown_event.set()
 
 @asynccontextmanager
-async def get_analyzer():
+async def get_analyzer(pool: Optional[BrowserPool] = None):
     """Контекстный менеджер для работы с анализатором"""
     analyzer = None
     try:
-        analyzer = EnhancedSiteAnalyzer(verbose=True)
+        analyzer = EnhancedSiteAnalyzer(verbose=True, pool=pool)
         await analyzer.__aenter__()
         yield analyzer
     finally:
@@ -45,136 +105,180 @@ async def get_analyzer():
             except Exception as e:
                 logging.error(f"Error closing analyzer: {str(e)}")
 
-async def check_site_availability(url: str) -> bool:
-    """Проверяет доступность сайта"""
-    try:
-        timeout = aiohttp.ClientTimeout(total=10)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(url) as response:
-                return response.status == 200
-    except Exception as e:
-        logging.warning(f"Site {url} is not available: {str(e)}")
-        return False
-
 @backoff.on_exception(backoff.expo, 
                      (Exception,),
                      max_tries=3,
-                     giveup=lambda e: isinstance(e, (KeyboardInterrupt, SystemExit)))
-async def extract_inn(url: str, analyzer: EnhancedSiteAnalyzer) -> Tuple[str, Optional[str], bool]:
+                     giveup=lambda e: classify_error(e) == PERMANENT)
+async def extract_inn(url: str, analyzer: EnhancedSiteAnalyzer, finder: Optional[RequisitesFinder] = None,
+                      prober: Optional[SiteProber] = None) -> Tuple[str, Optional[str], List[Dict]]:
     """
     Извлекает ИНН из указанного URL.
-    Возвращает: (url, inn, success)
+    Сначала по HTTP проверяются главная и страницы реквизитов, браузер - только если там ничего нет.
+    Возвращает: (url, наиболее вероятный inn, все найденные ИНН с позициями и оценками)
     """
     if shutdown_event.is_set():
         raise asyncio.CancelledError("Shutdown requested")
 
+    own_prober = prober is None
+    prober = prober or SiteProber(analyzer.cache)
     try:
-        # Проверяем доступность сайта
-        if not await check_site_availability(url):
-            return url, None, False
+        # Проверяем доступность сайта; страница, отданная при проверке, попадает в кэш
+        probe = await prober.probe(url)
+        if probe.error:
+            raise probe.error
+        if not probe.available:
+            logging.info(f"Site {url} is not available: HTTP {probe.status}")
+            return url, None, []
+        # Дальше работаем с адресом после редиректов, чтобы не проходить их заново
+        target = probe.final_url
 
-        results = await analyzer.analyze_site(url)
-        content = results.get('content', '')
-        
-        # Поиск ИНН в тексте
-        inn_pattern = r'\b\d{10}\b|\b\d{12}\b'
-        inns = re.findall(inn_pattern, content)
-        
-        for inn in inns:
-            if len(inn) == 10 and check_inn_organization(inn):
-                return url, inn, True
-            elif len(inn) == 12 and check_inn_individual(inn):
-                return url, inn, True
+        finder = finder or RequisitesFinder(analyzer.static_analyzer, scanner, analyzer.rules_registry)
+        http_matches: List[Dict] = []
+        try:
+            found = await finder.find(target)
+            if found['inn']:
+                logging.debug(f"INN for {url} found over HTTP, pages: {found['fetched']}")
+                return url, found['inn'], found['matches']
+            # Номера без подписи не подтверждают ИНН: решает браузер
+            http_matches = found['matches']
+        except Exception as e:
+            logging.info(f"HTTP lookup of requisites for {url} failed: {str(e)}")
+
+        await analyzer.analyze_site(target)
+        content = await analyzer.get_page_content(target)
         
-        return url, None, False
+        # Поиск ИНН в отрендеренном тексте и исходном HTML (реквизиты бывают в разметке и JSON-LD)
+        matches = scanner.scan_documents(content['text'], content['html'])
+        inn = matches[0]['inn'] if matches else None
+        # Номера без подписи, найденные по HTTP, остаются только в списке найденных
+        known = {match['inn'] for match in matches}
+        matches += [match for match in http_matches if match['inn'] not in known]
+        return url, inn, matches
     except Exception as e:
         logging.error(f"Error extracting INN from {url}: {str(e)}")
         raise
+    finally:
+        if own_prober:
+            await prober.close()
 
 def check_inn_organization(inn: str) -> bool:
     """Проверка контрольной суммы ИНН организации"""
-    if len(inn) != 10:
-        return False
-    
-    weights = [2, 4, 10, 3, 5, 9, 4, 6, 8]
-    checksum = sum(int(inn[i]) * weights[i] for i in range(9)) % 11
-    if checksum == 10:
-        checksum = 0
-    return checksum == int(inn[9])
+    return len(inn) == 10 and is_valid_inn(inn)
 
 def check_inn_individual(inn: str) -> bool:
     """Проверка контрольных сумм ИНН ИП"""
-    if len(inn) != 12:
-        return False
-    
-    # Первая контрольная сумма
-    weights1 = [7, 2, 4, 10, 3, 5, 9, 4, 6, 8]
-    checksum1 = sum(int(inn[i]) * weights1[i] for i in range(10)) % 11
-    if checksum1 == 10:
-        checksum1 = 0
-    if checksum1 != int(inn[10]):
-        return False
-    
-    # Вторая контрольная сумма
-    weights2 = [3, 7, 2, 4, 10, 3, 5, 9, 4, 6, 8]
-    checksum2 = sum(int(inn[i]) * weights2[i] for i in range(11)) % 11
-    if checksum2 == 10:
-        checksum2 = 0
-    return checksum2 == int(inn[11])
-
-async def process_sites(urls: List[str], output_dir: str = "data"):
-    """Обрабатывает список сайтов и сохраняет результаты"""
+    return len(inn) == 12 and is_valid_inn(inn)
+
+async def process_sites(urls: List[str], output_dir: str = "data", concurrency: int = 4,
+                        site_timeout: float = 120.0, resume: bool = True):
+    """Обрабатывает список сайтов и сохраняет результаты
+
+    Args:
+        urls: Сайты для обработки
+        output_dir: Директория результатов и журнала обработанных URL
+        concurrency: Число одновременно обрабатываемых сайтов
+        site_timeout: Общий лимит времени на сайт, включая повторные попытки
+        resume: Пропускать сайты, обработанные в предыдущих прогонах
+    """
     os.makedirs(output_dir, exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
-    found_inn = []
-    not_found_inn = []
+    # Результаты дописываются по мере обработки и переживают падение процесса
+    found_inn = NDJSONSink(os.path.join(output_dir, f"found_inn_{timestamp}.ndjson"))
+    not_found_inn = NDJSONSink(os.path.join(output_dir, f"not_found_inn_{timestamp}.ndjson"))
+    checkpoint_path = os.path.join(output_dir, "inn_checkpoint.ndjson")
+    if not resume and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    checkpoint = Checkpoint(checkpoint_path)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for url in dict.fromkeys(urls):
+        if url not in checkpoint:
+            queue.put_nowait(url)
+    if len(checkpoint):
+        logging.info(f"Resuming: {len(urls) - queue.qsize()} sites already processed, {queue.qsize()} left")
+    
+    def save(sink: NDJSONSink, url: str, result: Dict, status: str):
+        sink.write(result)
+        # Результат должен оказаться на диске раньше отметки в журнале
+        sink.flush()
+        checkpoint.mark(url, status)
+
+    async def process_url(analyzer: EnhancedSiteAnalyzer, finder: RequisitesFinder, prober: SiteProber, url: str):
+        try:
+            # Лимит на сайт целиком: повторные попытки не выходят за него
+            url, inn, matches = await asyncio.wait_for(extract_inn(url, analyzer, finder, prober), site_timeout)
+            result = {
+                "url": url,
+                "timestamp": datetime.now().isoformat(),
+                "inn": inn,
+                "matches": matches
+            }
+            
+            if inn:
+                save(found_inn, url, result, 'found')
+                logging.info(f"Found INN {inn} for {url}")
+            else:
+                save(not_found_inn, url, result, 'not_found')
+                logging.info(f"No INN found for {url}")
+                
+        except Exception as e:
+            kind = classify_error(e)
+            message = str(e) or type(e).__name__
+            logging.error(f"Failed to process {url} ({kind}): {message}")
+            result = {
+                "url": url,
+                "timestamp": datetime.now().isoformat(),
+                "error": message,
+                "error_kind": kind
+            }
+            if kind == PERMANENT:
+                save(not_found_inn, url, result, 'failed')
+            else:
+                # Без отметки в журнале: сайт будет обработан заново при следующем запуске
+                not_found_inn.write(result)
+
+    async def worker(analyzer: EnhancedSiteAnalyzer, finder: RequisitesFinder, prober: SiteProber):
+        while not shutdown_event.is_set():
+            try:
+                url = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await process_url(analyzer, finder, prober, url)
     
     try:
-        async with get_analyzer() as analyzer:
-            for url in urls:
-                if shutdown_event.is_set():
-                    break
-
-                try:
-                    url, inn, success = await extract_inn(url, analyzer)
-                    result = {
-                        "url": url,
-                        "timestamp": datetime.now().isoformat(),
-                        "inn": inn
-                    }
-                    
-                    if success:
-                        found_inn.append(result)
-                        logging.info(f"Found INN {inn} for {url}")
-                    else:
-                        not_found_inn.append(result)
-                        logging.info(f"No INN found for {url}")
-                        
-                except Exception as e:
-                    logging.error(f"Failed to process {url}: {str(e)}")
-                    not_found_inn.append({
-                        "url": url,
-                        "timestamp": datetime.now().isoformat(),
-                        "error": str(e)
-                    })
+        # Общий браузер для всех сайтов, не более concurrency страниц одновременно
+        async with BrowserPool(max_pages=concurrency) as pool:
+            async with get_analyzer(pool) as analyzer:
+                finder = RequisitesFinder(analyzer.static_analyzer, scanner, analyzer.rules_registry)
+                # Один пул соединений и кэш DNS на все проверки доступности
+                async with SiteProber(analyzer.cache, limit_per_host=concurrency) as prober:
+                    await asyncio.gather(*(worker(analyzer, finder, prober) for _ in range(concurrency)))
     except Exception as e:
         logging.error(f"Error in process_sites: {str(e)}")
     finally:
-        # Сохранение результатов
+        # Закрытие потоков результатов
         try:
-            with open(os.path.join(output_dir, f"found_inn_{timestamp}.json"), 'w', encoding='utf-8') as f:
-                json.dump(found_inn, f, ensure_ascii=False, indent=2)
+            found_inn.close()
+            not_found_inn.close()
+            checkpoint.close()
             
-            with open(os.path.join(output_dir, f"not_found_inn_{timestamp}.json"), 'w', encoding='utf-8') as f:
-                json.dump(not_found_inn, f, ensure_ascii=False, indent=2)
-            
-            logging.info(f"Found INN for {len(found_inn)} sites")
-            logging.info(f"No INN found for {len(not_found_inn)} sites")
+            logging.info(f"Found INN for {found_inn.records} sites")
+            logging.info(f"No INN found for {not_found_inn.records} sites")
+            if queue.qsize():
+                logging.info(f"{queue.qsize()} sites left for the next run")
         except Exception as e:
             logging.error(f"Error saving results: {str(e)}")
 
 def main():
+    parser = argparse.ArgumentParser(description='Поиск ИНН на сайтах из списка')
+    parser.add_argument('input', nargs='?', default='brick_sites.txt', help='Файл со списком сайтов')
+    parser.add_argument('-o', '--output', default='data', help='Директория для сохранения результатов')
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help='Число одновременно обрабатываемых сайтов')
+    parser.add_argument('-t', '--timeout', type=float, default=120.0, help='Лимит времени на сайт, с')
+    parser.add_argument('--restart', action='store_true', help='Начать заново, не продолжая прерванный прогон')
+    args = parser.parse_args()
+
     # Настройка обработчика сигналов
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
@@ -184,14 +288,15 @@ def main():
     
     try:
         # Чтение списка сайтов из файла
-        with open('brick_sites.txt', 'r', encoding='utf-8') as f:
+        with open(args.input, 'r', encoding='utf-8') as f:
             urls = [line.strip() for line in f if line.strip()]
         
-        loop.run_until_complete(process_sites(urls))
+        loop.run_until_complete(process_sites(urls, args.output, args.concurrency, args.timeout,
+                                              resume=not args.restart))
     except KeyboardInterrupt:
         logging.info("Received keyboard interrupt, shutting down...")
     finally:
         loop.close()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,63 @@
+import hashlib
+import logging
+import os
+from typing import Dict
+from urllib.parse import urlparse
+from playwright.async_api import Page
+
+HAR_MODES = ('record', 'replay')
+
+class HarArchive:
+    """Запись сетевого обмена страницы в HAR архив и воспроизведение его без сети
+
+    В режиме record все ответы страницы сохраняются в архив (один файл на URL),
+    в режиме replay страница получает их из архива через маршрутизацию
+    запросов; запросы, которых нет в архиве, отклоняются. Повторный прогон
+    идет на тех же данных и без сетевых задержек, что удобно при отладке
+    селекторов в site_rules.
+    """
+
+    def __init__(self, directory: str = 'har', mode: str = 'record'):
+        """
+        Args:
+            directory: Каталог архивов
+            mode: 'record' - запись, 'replay' - воспроизведение
+        """
+        if mode not in HAR_MODES:
+            raise ValueError(f"Unknown HAR mode: {mode}")
+        self.directory = directory
+        self.mode = mode
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def replay(self) -> bool:
+        return self.mode == 'replay'
+
+    def path_for(self, url: str) -> str:
+        """Файл архива URL: хост и хэш полного адреса"""
+        host = (urlparse(url).hostname or 'site').replace('www.', '', 1)
+        digest = hashlib.blake2b(url.encode('utf-8'), digest_size=6).hexdigest()
+        return os.path.join(self.directory, f"{host}-{digest}.zip")
+
+    def exists(self, url: str) -> bool:
+        return os.path.exists(self.path_for(url))
+
+    async def attach(self, page: Page, url: str) -> Dict:
+        """Подключение к странице (до навигации и до блокировки ресурсов)
+
+        Архив записывается при закрытии контекста страницы.
+        """
+        path = self.path_for(url)
+        if self.replay:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"No HAR archive for {url}: {path}")
+            await page.route_from_har(path, not_found='abort')
+            self.logger.info(f"Replaying {url} from {path}")
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            await page.route_from_har(path, update=True, update_content='attach', update_mode='full')
+            self.logger.info(f"Recording {url} to {path}")
+        return self.summary(url)
+
+    def summary(self, url: str) -> Dict:
+        return {'mode': self.mode, 'path': self.path_for(url)}
@@ -0,0 +1,169 @@
+import asyncio
+import errno
+import logging
+import socket
+import ssl
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# Ошибки, после которых хост точно недоступен; таймаут и прочие сбои
+# говорят лишь о медленном или перегруженном хостинге
+DEFINITE_ERRNOS = (errno.ECONNREFUSED, errno.ENETUNREACH, errno.EHOSTUNREACH)
+
+def definite_failure(error: BaseException) -> bool:
+    """Имя не разрешается, соединение отклонено или сеть/хост недоступны"""
+    if isinstance(error, (socket.gaierror, ConnectionRefusedError)):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, ssl.SSLError) and error.errno in DEFINITE_ERRNOS
+
+@dataclass
+class HostCheck:
+    """Результат предварительной проверки хоста"""
+    host: str
+    port: int
+    scheme: str
+    address: Optional[str] = None
+    dns_ms: Optional[int] = None
+    connect_ms: Optional[int] = None  # TCP и, для https, TLS handshake
+    error: Optional[str] = None
+    transient: bool = False  # Хотя бы одна ошибка - таймаут или временный сбой
+
+    @property
+    def reachable(self) -> bool:
+        return self.error is None
+
+    @property
+    def dead(self) -> bool:
+        """Хост точно недоступен: ни одна попытка не завершилась таймаутом"""
+        return self.error is not None and not self.transient
+
+    @property
+    def latency_ms(self) -> float:
+        if not self.reachable:
+            return float('inf')
+        return (self.dns_ms or 0) + (self.connect_ms or 0)
+
+    def to_dict(self) -> Dict:
+        return {
+            'host': self.host,
+            'port': self.port,
+            'address': self.address,
+            'dns_ms': self.dns_ms,
+            'connect_ms': self.connect_ms,
+            'error': self.error,
+            'transient': self.transient
+        }
+
+def host_key(url: str) -> Tuple[str, str, int]:
+    """(scheme, host, port) URL"""
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower() or 'http'
+    return scheme, (parsed.hostname or '').lower(), parsed.port or (443 if scheme == 'https' else 80)
+
+class HostPrewarmer:
+    """Параллельное разрешение DNS и установка соединений со всеми хостами перед проходом браузером
+
+    Хосты, которые не разрешаются или отклоняют соединение, отбрасываются
+    сразу, а не после таймаута навигации; остальные URL упорядочиваются по
+    измеренной задержке, чтобы быстрые сайты не ждали медленных. Хосты, не
+    ответившие за timeout, не отбрасываются, а ставятся в конец очереди.
+    """
+
+    def __init__(self, concurrency: int = 50, timeout: float = 5.0, max_addresses: int = 2):
+        """
+        Args:
+            concurrency: Число одновременно проверяемых хостов
+            timeout: Таймаут разрешения имени и таймаут соединения в секундах
+            max_addresses: Сколько адресов хоста пробовать, если первый не отвечает
+        """
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.timeout = timeout
+        self.max_addresses = max_addresses
+        # Сертификаты не проверяются, как и при загрузке страниц (ssl=False)
+        self.ssl_context = ssl.create_default_context()
+        self.ssl_context.check_hostname = False
+        self.ssl_context.verify_mode = ssl.CERT_NONE
+        self.logger = logging.getLogger(__name__)
+
+    async def check(self, scheme: str, host: str, port: int) -> HostCheck:
+        result = HostCheck(host=host, port=port, scheme=scheme)
+        loop = asyncio.get_running_loop()
+        async with self.semaphore:
+            started = time.monotonic()
+            try:
+                infos = await asyncio.wait_for(
+                    loop.getaddrinfo(host, port, type=socket.SOCK_STREAM), self.timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                result.error = f"dns: {str(e) or type(e).__name__}"
+                result.transient = not definite_failure(e)
+                return result
+            result.dns_ms = int((time.monotonic() - started) * 1000)
+
+            addresses = list(dict.fromkeys(info[4][0] for info in infos))[:self.max_addresses]
+            for address in addresses:
+                started = time.monotonic()
+                try:
+                    _, writer = await asyncio.wait_for(asyncio.open_connection(
+                        address, port,
+                        ssl=self.ssl_context if scheme == 'https' else None,
+                        server_hostname=host if scheme == 'https' else None
+                    ), self.timeout)
+                except (OSError, ssl.SSLError, asyncio.TimeoutError) as e:
+                    result.error = f"connect {address}: {str(e) or type(e).__name__}"
+                    result.transient = result.transient or not definite_failure(e)
+                    continue
+                result.connect_ms = int((time.monotonic() - started) * 1000)
+                result.address = address
+                result.error = None
+                result.transient = False
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except (OSError, ssl.SSLError):
+                    pass
+                break
+        return result
+
+    async def run(self, urls: List[str]) -> Dict[Tuple[str, str, int], HostCheck]:
+        """Проверка всех хостов списка (каждый хост - один раз)"""
+        keys = list(dict.fromkeys(host_key(url) for url in urls))
+        checks = await asyncio.gather(*(self.check(*key) for key in keys))
+        return dict(zip(keys, checks))
+
+    async def plan(self, urls: List[str]) -> Tuple[List[str], List[Dict], Dict[Tuple[str, str, int], HostCheck]]:
+        """Очередь URL по возрастанию задержки и список отброшенных
+
+        Не ответившие вовремя хосты остаются в очереди с latency_ms=inf, после всех остальных.
+
+        Returns:
+            (упорядоченные URL, [{'url', 'error'}] для недоступных, результаты по хостам)
+        """
+        started = time.monotonic()
+        checks = await self.run(urls)
+        queued = [url for url in urls if not checks[host_key(url)].dead]
+        queued.sort(key=lambda url: checks[host_key(url)].latency_ms)
+        dropped = [{'url': url, 'error': checks[host_key(url)].error}
+                   for url in urls if checks[host_key(url)].dead]
+        slow = sum(1 for url in queued if not checks[host_key(url)].reachable)
+        self.logger.info(f"Pre-warmed {len(checks)} hosts in {time.monotonic() - started:.1f}s: "
+                         f"{len(queued) - slow} URLs reachable, {slow} timed out (queued last), "
+                         f"{len(dropped)} dropped")
+        for item in dropped:
+            self.logger.info(f"Dropping {item['url']}: {item['error']}")
+        return queued, dropped, checks
+
+def host_resolver_rules(checks: Dict[Tuple[str, str, int], HostCheck]) -> Optional[str]:
+    """Правила --host-resolver-rules для Chromium с уже разрешенными адресами (только IPv4)
+
+    Браузер не повторяет поиск DNS, который уже сделан при проверке хостов.
+    """
+    mapping = {}
+    for check in checks.values():
+        if not check.address or check.host == check.address or ':' in check.address:
+            continue
+        mapping.setdefault(check.host, check.address)
+    if not mapping:
+        return None
+    return ', '.join(f"MAP {host} {address}" for host, address in mapping.items())
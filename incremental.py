@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from page_cache import normalize_url
+
+SCRIPT_STYLE = re.compile(r'<(script|style|noscript)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+TAG = re.compile(r'<[^>]+>')
+WHITESPACE = re.compile(r'\s+')
+
+def content_fingerprint(html: str) -> str:
+    """Отпечаток видимого текста страницы
+
+    Скрипты, стили, комментарии и разметка отбрасываются, чтобы токены,
+    счетчики и случайные атрибуты не давали ложных изменений.
+    """
+    text = SCRIPT_STYLE.sub(' ', html)
+    text = COMMENT.sub(' ', text)
+    text = TAG.sub(' ', text)
+    text = WHITESPACE.sub(' ', text).strip()
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def product_key(product: Dict) -> Optional[str]:
+    """Ключ товара для сравнения снимков"""
+    return product.get('url') or product.get('name')
+
+def diff_results(previous: Optional[Dict], results: Dict) -> Dict:
+    """Изменения товаров и категорий относительно предыдущего снимка"""
+    old_products = {product_key(p): p for p in (previous or {}).get('products', []) if product_key(p)}
+    new_products = {product_key(p): p for p in results.get('products', []) if product_key(p)}
+    old_categories = {c['url'] for c in (previous or {}).get('categories', [])}
+    new_categories = {c['url']: c for c in results.get('categories', [])}
+
+    price_changes = []
+    for key, product in new_products.items():
+        old = old_products.get(key)
+        if old and old.get('price') != product.get('price'):
+            price_changes.append({
+                'key': key,
+                'name': product.get('name'),
+                'old_price': old.get('price'),
+                'new_price': product.get('price')
+            })
+
+    return {
+        'new_products': [p for key, p in new_products.items() if key not in old_products],
+        'removed_products': [p for key, p in old_products.items() if key not in new_products],
+        'price_changes': price_changes,
+        'new_categories': [c for url, c in new_categories.items() if url not in old_categories],
+        'removed_categories': sorted(old_categories - set(new_categories))
+    }
+
+@dataclass
+class Snapshot:
+    """Сохраненное состояние сайта с прошлого прогона"""
+    url: str
+    page_fingerprint: Optional[str]
+    data_fingerprint: str
+    products: List[Dict]
+    categories: List[Dict]
+    updated_at: float
+
+class IncrementalState:
+    """Хранилище отпечатков и последних результатов по URL"""
+
+    def __init__(self, path: str = "incremental_state.sqlite"):
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                url TEXT PRIMARY KEY,
+                page_fingerprint TEXT,
+                data_fingerprint TEXT NOT NULL,
+                products TEXT NOT NULL,
+                categories TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                checked_at REAL NOT NULL
+            )
+        """)
+        self.db.commit()
+
+    def get(self, url: str) -> Optional[Snapshot]:
+        row = self.db.execute(
+            "SELECT url, page_fingerprint, data_fingerprint, products, categories, updated_at "
+            "FROM snapshots WHERE url = ?", (normalize_url(url),)
+        ).fetchone()
+        if not row:
+            return None
+        return Snapshot(
+            url=row[0],
+            page_fingerprint=row[1],
+            data_fingerprint=row[2],
+            products=json.loads(row[3]),
+            categories=json.loads(row[4]),
+            updated_at=row[5]
+        )
+
+    def save(self, url: str, page_fingerprint: Optional[str], results: Dict):
+        products = results.get('products', [])
+        categories = results.get('categories', [])
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (normalize_url(url), page_fingerprint, self.data_fingerprint(results),
+             json.dumps(products, ensure_ascii=False), json.dumps(categories, ensure_ascii=False), now, now)
+        )
+        self.db.commit()
+
+    def mark_checked(self, url: str):
+        self.db.execute("UPDATE snapshots SET checked_at = ? WHERE url = ?", (time.time(), normalize_url(url)))
+        self.db.commit()
+
+    @staticmethod
+    def data_fingerprint(results: Dict) -> str:
+        payload = json.dumps(
+            [results.get('products', []), results.get('categories', [])],
+            ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def close(self):
+        self.db.close()
+
+class IncrementalCrawler:
+    """Повторный обход: извлечение только для изменившихся страниц и выдача изменений"""
+
+    def __init__(self, analyzer, state: IncrementalState):
+        """
+        Args:
+            analyzer: EnhancedSiteAnalyzer для полного анализа изменившихся страниц
+            state: Хранилище снимков прошлых прогонов
+        """
+        self.analyzer = analyzer
+        self.state = state
+        self.logger = logging.getLogger(__name__)
+
+    async def page_fingerprint(self, url: str) -> Optional[str]:
+        """Отпечаток страницы по статическому HTML (только для сайтов без requires_js)"""
+        if self.analyzer.rules_registry.get_rules(url).requires_js:
+            return None
+        try:
+            status, html, _, _ = await self.analyzer.static_analyzer.fetch(url, revalidate=True)
+        except Exception as e:
+            self.logger.debug(f"Fingerprint fetch of {url} failed: {str(e)}")
+            return None
+        return content_fingerprint(html) if status == 200 else None
+
+    async def process(self, url: str) -> Dict:
+        """Обработка URL; возвращает запись об изменениях"""
+        previous = self.state.get(url)
+        fingerprint = await self.page_fingerprint(url)
+
+        if previous and fingerprint and fingerprint == previous.page_fingerprint:
+            self.logger.info(f"{url} not changed since last run, skipping extraction")
+            self.state.mark_checked(url)
+            return {
+                'url': url,
+                'status': 'unchanged',
+                'products_total': len(previous.products),
+                'categories_total': len(previous.categories)
+            }
+
+        results = await self.analyzer.analyze_site(url, refresh=True)
+        self.state.save(url, fingerprint, results)
+
+        if previous and previous.data_fingerprint == self.state.data_fingerprint(results):
+            status = 'unchanged'
+        else:
+            status = 'changed' if previous else 'new'
+
+        change = {
+            'url': url,
+            'status': status,
+            'products_total': len(results.get('products', [])),
+            'categories_total': len(results.get('categories', [])),
+            'spans': results.get('spans', [])
+        }
+        if status != 'unchanged':
+            change.update(diff_results(
+                {'products': previous.products, 'categories': previous.categories} if previous else None,
+                results
+            ))
+        return change
@@ -0,0 +1,165 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+# 10 или 12 цифр, не являющиеся частью более длинного числа; \b не подходит:
+# в "ИНН7701234567" между буквой и цифрой нет границы слова. Только ASCII цифры:
+# \d в Unicode режиме совпадает и с полноширинными, которых нет в digit_matrix
+INN_CANDIDATE = re.compile(r'(?<![0-9])([0-9]{12}|[0-9]{10})(?![0-9])')
+
+WEIGHTS_10 = np.array([2, 4, 10, 3, 5, 9, 4, 6, 8], dtype=np.int64)
+WEIGHTS_12_FIRST = np.array([7, 2, 4, 10, 3, 5, 9, 4, 6, 8], dtype=np.int64)
+WEIGHTS_12_SECOND = np.array([3, 7, 2, 4, 10, 3, 5, 9, 4, 6, 8], dtype=np.int64)
+
+# Слова рядом с номером и их вес при ранжировании
+CONTEXT_TOKENS = {
+    'инн': 5,
+    'кпп': 2,
+    'огрн': 2,
+    'огрнип': 2,
+    'реквизит': 1,
+    'ооо': 1,
+    'ао': 1,
+    'ип': 1
+}
+
+# Номера, которые часто совпадают по длине с ИНН
+NEGATIVE_TOKENS = {
+    'тел': -3,
+    'телефон': -3,
+    'факс': -3,
+    'бик': -3,
+    'окпо': -3,
+    'октмо': -3,
+    'оквэд': -2,
+    'счет': -2,
+    'р/с': -3,
+    'к/с': -3,
+    'артикул': -3,
+    'код': -1
+}
+
+TOKEN = re.compile(r'[рк]/с|[а-яёa-z]+', re.IGNORECASE)
+DIGITS = re.compile(r'\d+')
+
+def digit_matrix(numbers: Sequence[str], length: int) -> np.ndarray:
+    """Матрица цифр (n x length) из строк одинаковой длины"""
+    if not numbers:
+        return np.zeros((0, length), dtype=np.int64)
+    buffer = ''.join(numbers).encode('ascii')
+    return (np.frombuffer(buffer, dtype=np.uint8).reshape(-1, length) - ord('0')).astype(np.int64)
+
+def control_digit(digits: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Контрольная цифра: взвешенная сумма по модулю 11, 10 заменяется на 0"""
+    return (digits[:, :len(weights)] @ weights) % 11 % 10
+
+def validate_batch(numbers: Sequence[str]) -> np.ndarray:
+    """Проверка контрольных сумм пачки ИНН (10 и 12 цифр) за несколько матричных операций"""
+    valid = np.zeros(len(numbers), dtype=bool)
+    lengths = np.fromiter((len(number) for number in numbers), dtype=np.int64, count=len(numbers))
+
+    index_10 = np.flatnonzero(lengths == 10)
+    if len(index_10):
+        digits = digit_matrix([numbers[i] for i in index_10], 10)
+        valid[index_10] = control_digit(digits, WEIGHTS_10) == digits[:, 9]
+
+    index_12 = np.flatnonzero(lengths == 12)
+    if len(index_12):
+        digits = digit_matrix([numbers[i] for i in index_12], 12)
+        valid[index_12] = ((control_digit(digits, WEIGHTS_12_FIRST) == digits[:, 10]) &
+                           (control_digit(digits, WEIGHTS_12_SECOND) == digits[:, 11]))
+    return valid
+
+def is_valid_inn(inn: str) -> bool:
+    """Проверка одного ИНН"""
+    return inn.isascii() and inn.isdigit() and len(inn) in (10, 12) and bool(validate_batch([inn])[0])
+
+@dataclass
+class InnMatch:
+    """Найденный ИНН с позициями и оценкой контекста"""
+    inn: str
+    kind: str  # 'organization' или 'individual'
+    score: int
+    context: str
+    positions: List[Dict] = field(default_factory=list)  # {'source': 'text' | 'html', 'position': int}
+
+    def to_dict(self) -> Dict:
+        return {
+            'inn': self.inn,
+            'kind': self.kind,
+            'score': self.score,
+            'context': self.context,
+            'positions': self.positions
+        }
+
+class InnScanner:
+    """Поиск ИНН в тексте и HTML страницы с проверкой контрольных сумм и ранжированием по контексту"""
+
+    def __init__(self, window: int = 40):
+        """
+        Args:
+            window: Число символов до номера, в которых ищутся слова "ИНН", "КПП", "ОГРН" и т.п.
+        """
+        self.window = window
+
+    def context_score(self, text: str, start: int, end: int) -> int:
+        """Оценка контекста: слова перед номером и сразу после него
+
+        Окно обрезается на соседних числах, чтобы подпись чужого номера
+        ("Тел. 4951234567 ИНН ...") не влияла на оценку.
+        """
+        before = text[max(0, start - self.window):start].lower()
+        before = DIGITS.split(before)[-1]
+        after = text[end:end + self.window // 2].lower()
+        after = DIGITS.split(after)[0]
+        score = 0
+        for token in TOKEN.findall(before):
+            score += CONTEXT_TOKENS.get(token, 0) + NEGATIVE_TOKENS.get(token, 0)
+        for token in TOKEN.findall(after):
+            # КПП/ОГРН после номера: "ИНН 7701234567, КПП 770101001"
+            score += CONTEXT_TOKENS.get(token, 0) // 2
+        return score
+
+    def scan(self, text: str, source: str = 'text') -> List[InnMatch]:
+        """Все валидные ИНН в тексте (каждое вхождение отдельно)"""
+        found = [(match.group(1), match.start(1), match.end(1)) for match in INN_CANDIDATE.finditer(text)]
+        if not found:
+            return []
+        valid = validate_batch([number for number, _, _ in found])
+
+        matches = []
+        for (number, start, end), ok in zip(found, valid):
+            if not ok:
+                continue
+            matches.append(InnMatch(
+                inn=number,
+                kind='organization' if len(number) == 10 else 'individual',
+                score=self.context_score(text, start, end),
+                context=' '.join(text[max(0, start - self.window):end + self.window // 2].split()),
+                positions=[{'source': source, 'position': start}]
+            ))
+        return matches
+
+    def scan_documents(self, text: str = '', html: str = '') -> List[Dict]:
+        """ИНН из отрендеренного текста и исходного HTML, по одному на номер, лучшие первыми"""
+        best: Dict[str, InnMatch] = {}
+        for source, content in (('text', text), ('html', html)):
+            if not content:
+                continue
+            for match in self.scan(content, source):
+                known = best.get(match.inn)
+                if known is None:
+                    best[match.inn] = match
+                    continue
+                known.positions.extend(match.positions)
+                if match.score > known.score:
+                    known.score, known.context = match.score, match.context
+
+        ranked = sorted(best.values(), key=lambda m: (-m.score, -len(m.positions), m.positions[0]['position']))
+        return [match.to_dict() for match in ranked]
+
+    def best(self, text: str = '', html: str = '') -> Optional[str]:
+        """Наиболее вероятный ИНН владельца сайта"""
+        matches = self.scan_documents(text, html)
+        return matches[0]['inn'] if matches else None
@@ -0,0 +1,151 @@
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Optional
+from urllib.parse import urlparse
+from playwright.async_api import Page, Request
+
+def site_host(url: str) -> str:
+    """Хост сайта без www для определения сторонних запросов"""
+    return (urlparse(url).hostname or '').lower().replace('www.', '', 1)
+
+def timing_phases(timing: Dict) -> Dict[str, Optional[float]]:
+    """Фазы запроса в миллисекундах из request.timing
+
+    Playwright отдает отметки относительно startTime, -1 означает, что фаза
+    не выполнялась (соединение переиспользовано, ответ из кэша).
+    """
+    def span(start: str, end: str) -> Optional[float]:
+        if timing.get(start, -1) < 0 or timing.get(end, -1) < 0:
+            return None
+        return round(timing[end] - timing[start], 1)
+
+    return {
+        'dns': span('domainLookupStart', 'domainLookupEnd'),
+        'connect': span('connectStart', 'connectEnd'),
+        'tls': span('secureConnectionStart', 'connectEnd'),
+        'ttfb': span('requestStart', 'responseStart'),
+        'download': span('responseStart', 'responseEnd'),
+        'total': round(timing['responseEnd'], 1) if timing.get('responseEnd', -1) >= 0 else None
+    }
+
+class NetworkRecorder:
+    """Журнал сетевых запросов одной страницы
+
+    Последние max_entries запросов хранятся в кольцевом буфере, агрегаты
+    (объем по типам ресурсов, время по хостам, доля сторонних запросов)
+    считаются по всем запросам страницы.
+    """
+
+    def __init__(self, max_entries: int = 200, slowest_hosts: int = 5):
+        """
+        Args:
+            max_entries: Размер кольцевого буфера запросов
+            slowest_hosts: Сколько самых медленных хостов включать в сводку
+        """
+        self.entries: Deque[Dict] = deque(maxlen=max_entries)
+        self.slowest_hosts = slowest_hosts
+        self.site = ''
+        self.requests = 0
+        self.failed = 0
+        self.blocked = 0
+        self.bytes_total = 0
+        self.bytes_by_type: Dict[str, int] = {}
+        self.hosts: Dict[str, Dict] = {}
+        self.third_party_requests = 0
+        self.third_party_bytes = 0
+        self.logger = logging.getLogger(__name__)
+
+    def attach(self, page: Page, url: str):
+        """Подписка на события страницы (до навигации)"""
+        self.site = site_host(url)
+        page.on('requestfinished', self.handle_finished)
+        page.on('requestfailed', self.handle_failed)
+
+    def is_third_party(self, host: str) -> bool:
+        return bool(self.site) and host != self.site and not host.endswith('.' + self.site)
+
+    async def handle_finished(self, request: Request):
+        try:
+            response = await request.response()
+            sizes = await request.sizes()
+        except Exception as e:
+            # Страница закрыта раньше, чем получены размеры ответа
+            self.logger.debug(f"Error recording {request.url}: {str(e)}")
+            return
+        size = sizes['responseBodySize'] + sizes['responseHeadersSize']
+        self.record(request, response.status if response else None, size, None)
+
+    def handle_failed(self, request: Request):
+        failure = request.failure or ''
+        if 'BLOCKED_BY_CLIENT' in failure:
+            # Отклонено ResourceBlocker, учитывается в его сводке
+            self.blocked += 1
+            return
+        self.record(request, None, 0, failure)
+
+    def record(self, request: Request, status: Optional[int], size: int, error: Optional[str]):
+        host = (urlparse(request.url).hostname or '').lower()
+        resource_type = request.resource_type
+        timing = timing_phases(request.timing)
+        third_party = self.is_third_party(host)
+
+        self.requests += 1
+        if error:
+            self.failed += 1
+        self.bytes_total += size
+        self.bytes_by_type[resource_type] = self.bytes_by_type.get(resource_type, 0) + size
+        if third_party:
+            self.third_party_requests += 1
+            self.third_party_bytes += size
+
+        host_stats = self.hosts.setdefault(host, {'requests': 0, 'bytes': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        host_stats['requests'] += 1
+        host_stats['bytes'] += size
+        if timing['total'] is not None:
+            host_stats['total_ms'] += timing['total']
+            host_stats['max_ms'] = max(host_stats['max_ms'], timing['total'])
+
+        self.entries.append({
+            'url': request.url,
+            'method': request.method,
+            'resource_type': resource_type,
+            'status': status,
+            'bytes': size,
+            'third_party': third_party,
+            'timing': timing,
+            'error': error
+        })
+
+    def log(self) -> List[Dict]:
+        """Последние запросы страницы"""
+        return list(self.entries)
+
+    def summary(self) -> Dict:
+        """Сводка по сети: объем по типам, самые медленные хосты, доля сторонних запросов"""
+        slowest = sorted(self.hosts.items(), key=lambda item: item[1]['total_ms'], reverse=True)
+        return {
+            'requests': self.requests,
+            'failed': self.failed,
+            'blocked': self.blocked,
+            'recorded': len(self.entries),
+            'dropped': max(0, self.requests - len(self.entries)),
+            'bytes_total': self.bytes_total,
+            'bytes_by_type': dict(sorted(self.bytes_by_type.items(), key=lambda item: item[1], reverse=True)),
+            'slowest_hosts': [
+                {
+                    'host': host,
+                    'requests': stats['requests'],
+                    'bytes': stats['bytes'],
+                    'total_ms': round(stats['total_ms'], 1),
+                    'avg_ms': round(stats['total_ms'] / stats['requests'], 1),
+                    'max_ms': round(stats['max_ms'], 1)
+                }
+                for host, stats in slowest[:self.slowest_hosts]
+            ],
+            'third_party': {
+                'requests': self.third_party_requests,
+                'bytes': self.third_party_bytes,
+                'request_share': round(self.third_party_requests / self.requests, 3) if self.requests else 0.0,
+                'byte_share': round(self.third_party_bytes / self.bytes_total, 3) if self.bytes_total else 0.0
+            }
+        }
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+def normalize_url(url: str) -> str:
+    """Нормализация URL для ключа кэша"""
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower() or 'http'
+    host = (parsed.hostname or '').lower()
+    port = parsed.port
+    if port and not ((scheme == 'http' and port == 80) or (scheme == 'https' and port == 443)):
+        host = f"{host}:{port}"
+    path = parsed.path or '/'
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunparse((scheme, host, path, '', query, ''))
+
+@dataclass
+class CacheEntry:
+    """Запись кэша"""
+    data: bytes
+    fresh: bool  # Запись моложе TTL
+    stored_at: float
+    etag: Optional[str]
+    last_modified: Optional[str]
+    meta: Dict[str, Any]
+
+    def text(self) -> str:
+        return self.data.decode('utf-8')
+
+    def json(self) -> Any:
+        return json.loads(self.data)
+
+class PageCache:
+    """Content-addressed кэш страниц и результатов на диске
+
+    Содержимое хранится в cache_dir/objects по sha256, индекс (kind, URL) -> хеш
+    в SQLite, поэтому кэш безопасно разделяется между процессами.
+    Виды записей: 'html' (ответ HTTP), 'dom' (отрендеренный DOM), 'result'
+    (результат анализа).
+    """
+
+    def __init__(self, cache_dir: str = "cache", ttl: int = 24 * 3600,
+                 max_size_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: Директория кэша
+            ttl: Время жизни записи в секундах; устаревшие записи ревалидируются по ETag/Last-Modified
+            max_size_bytes: Максимальный размер содержимого кэша, сверх него удаляются давно не использованные записи
+        """
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.ttl = ttl
+        self.max_size_bytes = max_size_bytes
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+        self.db = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite'), timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                kind TEXT NOT NULL,
+                url TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                meta TEXT,
+                PRIMARY KEY (kind, url)
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_hash ON entries (hash)")
+        self.db.commit()
+        # Размер содержимого ведется при записи и удалении; полный подсчет по индексу -
+        # только при превышении лимита (учитывает и записи других процессов)
+        self.size = self.total_size()
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def get(self, kind: str, url: str) -> Optional[CacheEntry]:
+        """Получение записи (в том числе устаревшей) или None"""
+        key = normalize_url(url)
+        row = self.db.execute(
+            "SELECT hash, stored_at, etag, last_modified, meta FROM entries WHERE kind = ? AND url = ?",
+            (kind, key)
+        ).fetchone()
+        if not row:
+            return None
+
+        digest, stored_at, etag, last_modified, meta = row
+        try:
+            with open(self._object_path(digest), 'rb') as f:
+                data = f.read()
+        except OSError:
+            # Объект удален вручную или другим процессом
+            self.delete(kind, url)
+            return None
+
+        self.db.execute(
+            "UPDATE entries SET accessed_at = ? WHERE kind = ? AND url = ?",
+            (time.time(), kind, key)
+        )
+        self.db.commit()
+        return CacheEntry(
+            data=data,
+            fresh=time.time() - stored_at < self.ttl,
+            stored_at=stored_at,
+            etag=etag,
+            last_modified=last_modified,
+            meta=json.loads(meta) if meta else {}
+        )
+
+    def put(self, kind: str, url: str, data: bytes, etag: Optional[str] = None,
+            last_modified: Optional[str] = None, meta: Optional[Dict[str, Any]] = None):
+        """Сохранение записи"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        now = time.time()
+        previous = self.db.execute(
+            "SELECT hash, size FROM entries WHERE kind = ? AND url = ?", (kind, normalize_url(url))
+        ).fetchone()
+        if not self.db.execute("SELECT 1 FROM entries WHERE hash = ? LIMIT 1", (digest,)).fetchone():
+            self.size += len(data)
+        self.db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (kind, normalize_url(url), digest, len(data), now, now, etag, last_modified,
+             json.dumps(meta, ensure_ascii=False) if meta else None)
+        )
+        self.db.commit()
+
+        if previous and previous[0] != digest:
+            self._remove_orphan(previous[0], previous[1])
+        self.evict()
+
+    def put_json(self, kind: str, url: str, value: Any, etag: Optional[str] = None,
+                 last_modified: Optional[str] = None, meta: Optional[Dict[str, Any]] = None):
+        """Сохранение значения, сериализуемого в JSON"""
+        self.put(kind, url, json.dumps(value, ensure_ascii=False).encode('utf-8'), etag, last_modified, meta)
+
+    def touch(self, kind: str, url: str):
+        """Продление записи после успешной ревалидации (304 Not Modified)"""
+        now = time.time()
+        self.db.execute(
+            "UPDATE entries SET stored_at = ?, accessed_at = ? WHERE kind = ? AND url = ?",
+            (now, now, kind, normalize_url(url))
+        )
+        self.db.commit()
+
+    def delete(self, kind: str, url: str):
+        """Удаление записи"""
+        key = normalize_url(url)
+        row = self.db.execute("SELECT hash, size FROM entries WHERE kind = ? AND url = ?", (kind, key)).fetchone()
+        self.db.execute("DELETE FROM entries WHERE kind = ? AND url = ?", (kind, key))
+        self.db.commit()
+        if row:
+            self._remove_orphan(row[0], row[1])
+
+    def _remove_orphan(self, digest: str, size: int):
+        """Удаление объекта, на который больше не ссылается ни одна запись"""
+        if self.db.execute("SELECT 1 FROM entries WHERE hash = ? LIMIT 1", (digest,)).fetchone():
+            return
+        self.size = max(0, self.size - size)
+        try:
+            os.remove(self._object_path(digest))
+        except OSError:
+            pass
+
+    def total_size(self) -> int:
+        """Суммарный размер уникальных объектов"""
+        row = self.db.execute("SELECT SUM(size) FROM (SELECT DISTINCT hash, size FROM entries)").fetchone()
+        return row[0] or 0
+
+    def evict(self, batch: int = 256):
+        """LRU-вытеснение записей сверх max_size_bytes"""
+        if self.size <= self.max_size_bytes:
+            return
+        # Точный размер с учетом записей других процессов
+        total = self.total_size()
+        evicted = 0
+        while total > self.max_size_bytes:
+            # Самые давно использованные записи - по индексу accessed_at, порциями
+            rows = self.db.execute(
+                "SELECT kind, url, hash, size FROM entries ORDER BY accessed_at ASC LIMIT ?", (batch,)
+            ).fetchall()
+            if not rows:
+                break
+            for kind, url, digest, size in rows:
+                if total <= self.max_size_bytes:
+                    break
+                self.db.execute("DELETE FROM entries WHERE kind = ? AND url = ?", (kind, url))
+                if not self.db.execute("SELECT 1 FROM entries WHERE hash = ? LIMIT 1", (digest,)).fetchone():
+                    total -= size
+                    try:
+                        os.remove(self._object_path(digest))
+                    except OSError:
+                        pass
+                evicted += 1
+        self.db.commit()
+        self.size = total
+        if evicted:
+            self.logger.debug(f"Evicted {evicted} cache entries, {total} bytes remain")
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,415 @@
+import hashlib
+import logging
+import re
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+from playwright.async_api import Page
+from page_cache import normalize_url
+from site_rules import SiteRules, SiteRulesRegistry
+
+# Селекторы по умолчанию (совпадают с прежними списками EnhancedSiteAnalyzer)
+DEFAULT_CATEGORY_SELECTORS = [
+    ".menu-menu1 a",  # Основные пункты меню
+    ".menu-menu2 a",  # Подпункты меню
+    ".cats-wrap .item a",  # Карточки категорий товаров
+    ".big-menu a",  # Большое меню
+    "nav[id^='nav'] a",  # Элементы навигации
+    ".catalog-menu a",  # Меню каталога
+    "#menu a",  # Элементы меню
+    ".categories a",  # Общие категории
+    ".product-categories a",  # Категории товаров
+    ".sidebar a",  # Сайдбар
+    ".category-list a",  # Список категорий
+    ".catalog a",  # Каталог
+    ".menu a",  # Меню
+    ".nav a",  # Навигация
+    "[class*='category'] a",  # Любые элементы с 'category' в классе
+    "[class*='catalog'] a"  # Любые элементы с 'catalog' в классе
+]
+
+DEFAULT_CATEGORY_EXCLUDE = [
+    '/about/', '/contacts/', '/feedback/', '/user/',
+    'javascript:', '#', 'tel:', 'mailto:',
+    '/docs/', '/transportation/', '/service/',
+    '/news/', '/blog/', '/articles/',
+    '/delivery/', '/payment/', '/warranty/'
+]
+
+DEFAULT_PRODUCT_SELECTORS = [
+    ".product-item",  # Стандартный элемент товара
+    ".catalog-item",  # Элемент каталога
+    ".item-product",  # Элемент продукта
+    "[class*='product']",  # Любые элементы с 'product' в классе
+    "[class*='item']"  # Любые элементы с 'item' в классе
+]
+
+DEFAULT_LINK_SELECTORS = [
+    "a",  # Все элементы <a>
+    "link[href]",  # Все элементы <link> с атрибутом href
+    "img[src]",  # Все элементы <img> с атрибутом src
+    "script[src]",  # Все элементы <script> с атрибутом src
+    "iframe[src]",  # Все элементы <iframe> с атрибутом src
+    "video[src]",  # Все элементы <video> с атрибутом src
+    "audio[src]",  # Все элементы <audio> с атрибутом src
+    "object[data]",  # Все элементы <object> с атрибутом data
+    "embed[src]",  # Все элементы <embed> с атрибутом src
+    "area[href]",  # Все элементы <area> с атрибутом href
+    "form[action]",  # Все элементы <form> с атрибутом action
+    "input[src]"  # Все элементы <input> с атрибутом src
+]
+
+DEFAULT_PAGINATION_SELECTORS = [
+    "a[rel='next']",  # Ссылка на следующую страницу
+    ".pagination a",  # Пагинация
+    ".pages a",  # Номера страниц
+    ".pager a",  # Пейджер
+    ".navigation-pages a",  # Пагинация Битрикс
+    ".modern-page-navigation a"  # Пагинация Битрикс
+]
+
+# Выбор узлов по списку селекторов (общий для EXTRACTION_SCRIPT и подгрузки ленты).
+# Элемент, совпавший с несколькими селекторами, берется один раз. Для карточек
+# товаров отбрасываются контейнеры - узлы, внутри которых есть два однотипных
+# (тег и первый класс) найденных узла с разными ссылками: это список карточек
+# (.products, .products-list, body.page-product), какой бы селектор его ни нашел.
+# Узлы внутри оставшейся карточки - ее фрагменты (название, цена, вложенный блок
+# *item*). Обертка с единственной карточкой остается вместо нее: запись
+# совпадает с записью карточки.
+NODE_SELECTION_JS = """
+    const all = (root, selector) => {
+        try {
+            return Array.from(root.querySelectorAll(selector));
+        } catch (e) {
+            return [];
+        }
+    };
+    const selectNodes = (selectors, cards) => {
+        const seen = new Set();
+        let matched = 0;
+        for (const selector of selectors) {
+            for (const el of all(document, selector)) {
+                matched++;
+                seen.add(el);
+            }
+        }
+        let nodes = Array.from(seen);
+        if (cards) {
+            // Первая ссылка каждого однотипного узла внутри каждого найденного предка
+            const groups = new Map();
+            const containers = new Set();
+            for (const el of nodes) {
+                const link = el.querySelector('a[href]');
+                if (!link) continue;
+                const kind = el.tagName + '.' + (el.classList[0] || '');
+                const href = link.getAttribute('href');
+                for (let parent = el.parentElement; parent; parent = parent.parentElement) {
+                    if (!seen.has(parent) || containers.has(parent)) continue;
+                    let group = groups.get(parent);
+                    if (!group) {
+                        group = new Map();
+                        groups.set(parent, group);
+                    }
+                    if (!group.has(kind)) group.set(kind, href);
+                    else if (group.get(kind) !== href) containers.add(parent);
+                }
+            }
+            const kept = new Set(nodes.filter((el) => !containers.has(el)));
+            nodes = Array.from(kept).filter((el) => {
+                for (let parent = el.parentElement; parent; parent = parent.parentElement) {
+                    if (kept.has(parent)) return false;
+                }
+                return true;
+            });
+        }
+        return {nodes: nodes, matched: matched};
+    };
+"""
+
+# Программа извлечения: один вызов page.evaluate на страницу вместо
+# query_selector_all/get_attribute/text_content на каждый элемент
+EXTRACTION_SCRIPT = """(plan) => {""" + NODE_SELECTION_JS + """
+    const pick = (root, selectors) => {
+        if (!selectors || !selectors.length) return null;
+        try {
+            return root.querySelector(selectors.join(','));
+        } catch (e) {
+            for (const selector of selectors) {
+                try {
+                    const el = root.querySelector(selector);
+                    if (el) return el;
+                } catch (err) {}
+            }
+            return null;
+        }
+    };
+    const text = (el) => (el && el.textContent) ? el.textContent.trim() : '';
+
+    const stats = {};
+    const collect = (kind, selectors, cards) => {
+        const selected = selectNodes(selectors, cards);
+        stats[kind] = {matched: selected.matched, nodes: selected.nodes.length};
+        return selected.nodes;
+    };
+
+    const categories = [];
+    for (const el of collect('categories', plan.category_selectors, false)) {
+        const href = el.getAttribute('href');
+        if (!href || href.startsWith('#') || href.startsWith('javascript:')) continue;
+        const name = text(el);
+        if (name) categories.push({name: name, href: href});
+    }
+
+    const products = [];
+    for (const el of collect('products', plan.product_selectors, true)) {
+        const nameEl = pick(el, plan.product_name);
+        const priceEl = pick(el, plan.product_price);
+        const linkEl = el.querySelector('a');
+        const descEl = pick(el, plan.product_description);
+        products.push({
+            name: nameEl ? text(nameEl) : null,
+            price: priceEl ? text(priceEl) : null,
+            href: linkEl ? linkEl.getAttribute('href') : null,
+            description: descEl ? text(descEl) : null
+        });
+    }
+
+    const links = [];
+    for (const el of collect('links', plan.link_selectors, false)) {
+        let href;
+        if (el.tagName === 'FORM') {
+            href = el.getAttribute('action');
+        } else if (el.tagName === 'INPUT') {
+            href = el.getAttribute('src');
+        } else {
+            href = el.getAttribute('href') || el.getAttribute('src');
+        }
+        if (href) links.push(href);
+    }
+
+    const pagination = [];
+    for (const el of collect('pagination', plan.pagination_selectors, false)) {
+        const href = el.getAttribute('href');
+        if (href) pagination.push(href);
+    }
+
+    return {url: location.href, categories: categories, products: products, links: links, pagination: pagination,
+            stats: stats};
+}"""
+
+EXTRACTED_KINDS = ('categories', 'products', 'links', 'pagination')
+
+def record_key(*parts: Optional[str]) -> bytes:
+    """Хэш канонического ключа записи: фиксированный размер вместо длинных строк в множестве"""
+    return hashlib.blake2b('\x1f'.join(part or '' for part in parts).encode('utf-8'), digest_size=16).digest()
+
+def canonical_href(url: str) -> str:
+    """URL без фрагмента в нормализованном виде: разные записи одной страницы совпадают"""
+    try:
+        return normalize_url(url.split('#', 1)[0])
+    except ValueError:
+        return url
+
+def normalize_text(value: Optional[str]) -> str:
+    return ' '.join(value.split()).lower() if value else ''
+
+def dedup_summary(stats: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Сводка дедупликации по видам записей
+
+    matched - совпадения селекторов, nodes - уникальные узлы DOM,
+    kept - записи в результате, collapsed - сколько совпадений оказались повторами
+    (тот же узел или тот же канонический ключ)
+    """
+    for kind_stats in stats.values():
+        matched = kind_stats.get('matched', 0)
+        nodes = kind_stats.get('nodes', matched)
+        kind_stats['collapsed'] = matched - nodes + kind_stats.get('duplicates', 0)
+    return stats
+
+@dataclass
+class ExtractionPlan:
+    """План извлечения товаров, категорий и ссылок за один проход по DOM"""
+    product_selectors: List[str]
+    product_name: List[str]
+    product_price: List[str]
+    product_description: List[str]
+    category_selectors: List[str]
+    category_exclude: List[str]
+    link_selectors: List[str]
+    pagination_selectors: List[str]
+
+    @classmethod
+    def from_rules(cls, rules: SiteRules) -> 'ExtractionPlan':
+        """План из правил сайта: только селекторы сайта вместо общих эвристик
+
+        Категории берутся из ссылок внутри селекторов категории товара и из
+        меню каталога; широкие селекторы вида [class*='...'] не используются.
+        """
+        selectors = rules.selectors
+        category_selectors = [f"{selector} a" for selector in selectors.product_category]
+        category_selectors += [selector for selector in DEFAULT_CATEGORY_SELECTORS if '*=' not in selector]
+        return cls(
+            product_selectors=list(dict.fromkeys(selectors.product_list)),
+            product_name=list(selectors.product_name),
+            product_price=list(selectors.product_price),
+            product_description=list(selectors.product_description),
+            category_selectors=list(dict.fromkeys(category_selectors)),
+            category_exclude=list(DEFAULT_CATEGORY_EXCLUDE),
+            link_selectors=list(DEFAULT_LINK_SELECTORS),
+            pagination_selectors=list(dict.fromkeys(
+                [f"{selector} a" for selector in selectors.pagination] + ["a[rel='next']"]
+            ))
+        )
+
+    @classmethod
+    def default(cls) -> 'ExtractionPlan':
+        """План с общими эвристиками для неизвестных сайтов"""
+        return cls(
+            product_selectors=list(DEFAULT_PRODUCT_SELECTORS),
+            product_name=['h1', 'h2', 'h3', '.title', '.name', '[class*="title"]', '[class*="name"]'],
+            product_price=['.price', '.cost', '[class*="price"]', '[class*="cost"]'],
+            product_description=['.description', '.desc', '[class*="description"]', '[class*="desc"]'],
+            category_selectors=list(DEFAULT_CATEGORY_SELECTORS),
+            category_exclude=list(DEFAULT_CATEGORY_EXCLUDE),
+            link_selectors=list(DEFAULT_LINK_SELECTORS),
+            pagination_selectors=list(DEFAULT_PAGINATION_SELECTORS)
+        )
+
+class PageExtractor:
+    """Извлечение данных страницы одним вызовом page.evaluate"""
+
+    def __init__(self, plan: ExtractionPlan = None, rules_registry: Optional[SiteRulesRegistry] = None):
+        """
+        Args:
+            plan: План для сайтов без правил (по умолчанию общие эвристики)
+            rules_registry: Реестр правил, из которых строятся планы сайтов
+        """
+        self.plan = plan or ExtractionPlan.default()
+        self.rules_registry = rules_registry
+        self._plans: Dict[str, Optional[ExtractionPlan]] = {}
+        self.logger = logging.getLogger(__name__)
+
+    def plan_for(self, url: str) -> Optional[ExtractionPlan]:
+        """План сайта, построенный из его правил один раз на домен; None, если правил нет"""
+        if not self.rules_registry:
+            return None
+        domain = self.rules_registry.domain(url)
+        if domain not in self._plans:
+            rules = self.rules_registry.find_rules(url)
+            self._plans[domain] = ExtractionPlan.from_rules(rules) if rules else None
+            if rules:
+                self.logger.debug(f"Compiled extraction plan for {domain}")
+        return self._plans[domain]
+
+    async def extract(self, page: Page, plan: ExtractionPlan = None) -> Dict[str, List]:
+        """Извлечение товаров, категорий, ссылок и ссылок пагинации за один round trip"""
+        plan = plan or self.plan
+        try:
+            raw = await page.evaluate(EXTRACTION_SCRIPT, asdict(plan))
+        except Exception as e:
+            self.logger.error(f"Error evaluating extraction script: {str(e)}")
+            return {'categories': [], 'products': [], 'links': [], 'pagination': [], 'dedup': {}}
+
+        base_url = raw.get('url') or page.url
+        return self.build(raw, base_url, plan)
+
+    def build(self, raw: Dict, base_url: str, plan: ExtractionPlan) -> Dict:
+        """Результат извлечения из сырых данных программы извлечения (или StaticExtractor)"""
+        stats = {kind: dict(raw.get('stats', {}).get(kind, {})) for kind in EXTRACTED_KINDS}
+        extracted = {
+            'categories': self.build_categories(raw.get('categories', []), base_url, plan.category_exclude,
+                                                stats['categories']),
+            'products': self.build_products(raw.get('products', []), base_url, stats['products']),
+            'links': self.build_links(raw.get('links', []), base_url, stats['links']),
+            'pagination': self.build_links(raw.get('pagination', []), base_url, stats['pagination'])
+        }
+        extracted['dedup'] = dedup_summary(stats)
+        collapsed = sum(kind_stats['collapsed'] for kind_stats in stats.values())
+        if collapsed:
+            self.logger.debug(f"Collapsed {collapsed} duplicate matches on {base_url}")
+        return extracted
+
+    @staticmethod
+    def absolute_url(href: str, base_url: str) -> str:
+        """Преобразование относительного URL в абсолютный"""
+        if not href.startswith('http'):
+            return urljoin(base_url, href)
+        return href
+
+    def build_categories(self, raw: List[Dict], base_url: str, exclude_patterns: List[str],
+                         stats: Optional[Dict] = None) -> List[Dict[str, str]]:
+        """Дедупликация и фильтрация сырых категорий"""
+        seen = set()
+        categories = []
+        duplicates = 0
+        for item in raw:
+            category = {'name': item['name'], 'url': self.absolute_url(item['href'], base_url)}
+            key = record_key(normalize_text(category['name']), canonical_href(category['url']))
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+
+            # Фильтруем не-категории
+            if any(pattern in category['url'].lower() for pattern in exclude_patterns):
+                continue
+            if len(category['name'].strip()) > 1:  # Проверяем, что имя не слишком короткое
+                categories.append(category)
+        if stats is not None:
+            stats.update(duplicates=duplicates, kept=len(categories))
+        return categories
+
+    def build_products(self, raw: List[Dict], base_url: str, stats: Optional[Dict] = None) -> List[Dict]:
+        """Нормализация сырых записей о товарах и удаление повторов (тот же URL, название и цена)"""
+        seen = set()
+        products = []
+        duplicates = 0
+        for item in raw:
+            product = {}
+            if item.get('name') is not None:
+                product['name'] = item['name']
+
+            if item.get('price'):
+                # Извлекаем только цифры из строки цены
+                price = re.findall(r'\d+[\s.,]?\d*', item['price'])
+                if price:
+                    product['price'] = price[0].replace(' ', '').replace(',', '.')
+
+            if item.get('href'):
+                product['url'] = self.absolute_url(item['href'], base_url)
+
+            if item.get('description') is not None:
+                product['description'] = item['description']
+
+            # Добавляем товар, если есть хотя бы название или URL
+            if not (product.get('name') or product.get('url')):
+                continue
+            key = record_key(canonical_href(product['url']) if product.get('url') else None,
+                             normalize_text(product.get('name')), product.get('price'))
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            products.append(product)
+        if stats is not None:
+            stats.update(duplicates=duplicates, kept=len(products))
+        return products
+
+    def build_links(self, raw: List[str], base_url: str, stats: Optional[Dict] = None) -> List[str]:
+        """Дедупликация ссылок с сохранением порядка (ссылки на одну страницу с разными якорями - одна)"""
+        seen = set()
+        links = []
+        duplicates = 0
+        for href in raw:
+            if href.startswith('#') or href.startswith('javascript:'):
+                continue
+            href = self.absolute_url(href, base_url)
+            key = record_key(canonical_href(href))
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            links.append(href)
+        if stats is not None:
+            stats.update(duplicates=duplicates, kept=len(links))
+        return links
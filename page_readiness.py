@@ -0,0 +1,154 @@
+import logging
+import time
+from typing import Dict, List, Optional, Union
+from playwright.async_api import Page, BrowserContext
+
+# Скрипт инициализации: счетчик незавершенных XHR/fetch и время последней мутации DOM.
+# Устанавливается до загрузки страницы через add_init_script.
+READINESS_INIT_SCRIPT = """(() => {
+    if (window.__readiness) return;
+    const state = {pending: 0, mutations: 0, lastChange: Date.now(), observing: false};
+    window.__readiness = state;
+
+    const touch = () => { state.lastChange = Date.now(); };
+
+    if (window.fetch) {
+        const originalFetch = window.fetch;
+        window.fetch = function() {
+            state.pending++;
+            touch();
+            return originalFetch.apply(this, arguments).finally(() => {
+                state.pending--;
+                touch();
+            });
+        };
+    }
+
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        state.pending++;
+        touch();
+        this.addEventListener('loadend', () => {
+            state.pending--;
+            touch();
+        }, {once: true});
+        return originalSend.apply(this, arguments);
+    };
+
+    const observe = () => {
+        if (state.observing || !document.documentElement) return;
+        new MutationObserver((records) => {
+            state.mutations += records.length;
+            touch();
+        }).observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+        state.observing = true;
+    };
+    observe();
+    document.addEventListener('DOMContentLoaded', observe);
+})();"""
+
+# Ожидание готовности: резолвится, когда DOM не меняется quietMs, нет активных
+# XHR/fetch и найден хотя бы один из селекторов (или истек жесткий лимит)
+READINESS_WAIT_SCRIPT = """({selectors, quietMs, selectorQuietMs, maxMs, pollMs}) => new Promise((resolve) => {
+    let state = window.__readiness;
+    if (!state) {
+        // Страница создана без скрипта инициализации: отслеживаем только мутации
+        state = {pending: 0, mutations: 0, lastChange: Date.now(), observing: true};
+        window.__readiness = state;
+        new MutationObserver((records) => {
+            state.mutations += records.length;
+            state.lastChange = Date.now();
+        }).observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+    }
+
+    const started = Date.now();
+    const startMutations = state.mutations;
+    const findSelector = () => {
+        for (const selector of selectors) {
+            try {
+                if (document.querySelector(selector)) return selector;
+            } catch (e) {}
+        }
+        return null;
+    };
+
+    const check = () => {
+        const now = Date.now();
+        const quietFor = now - state.lastChange;
+        const matched = selectors.length ? findSelector() : null;
+        const idle = state.pending <= 0 && document.readyState !== 'loading';
+
+        let reason = null;
+        if (idle && quietFor >= quietMs && (!selectors.length || matched)) {
+            reason = 'stable';
+        } else if (idle && quietFor >= selectorQuietMs) {
+            reason = 'stable_without_selectors';
+        } else if (now - started >= maxMs) {
+            reason = 'timeout';
+        }
+
+        if (reason) {
+            resolve({
+                reason: reason,
+                waited_ms: now - started,
+                mutations: state.mutations - startMutations,
+                pending_requests: Math.max(state.pending, 0),
+                matched_selector: matched
+            });
+        } else {
+            setTimeout(check, pollMs);
+        }
+    };
+    check();
+})"""
+
+class ReadinessDetector:
+    """Адаптивное ожидание готовности страницы вместо фиксированных пауз"""
+
+    def __init__(self, quiet_ms: int = 500, selector_quiet_ms: int = 2000,
+                 max_wait_ms: int = 15000, poll_ms: int = 100):
+        self.quiet_ms = quiet_ms
+        self.selector_quiet_ms = selector_quiet_ms
+        self.max_wait_ms = max_wait_ms
+        self.poll_ms = poll_ms
+        self.logger = logging.getLogger(__name__)
+
+    async def install(self, target: Union[Page, BrowserContext]):
+        """Установка скрипта отслеживания на страницу или контекст"""
+        await target.add_init_script(READINESS_INIT_SCRIPT)
+
+    async def wait(self, page: Page, selectors: Optional[List[str]] = None,
+                   max_wait_ms: Optional[int] = None) -> Dict:
+        """Ожидание стабилизации DOM; возвращает статистику ожидания"""
+        max_wait_ms = max_wait_ms or self.max_wait_ms
+        started = time.monotonic()
+        try:
+            stats = await page.evaluate(READINESS_WAIT_SCRIPT, {
+                'selectors': selectors or [],
+                'quietMs': self.quiet_ms,
+                'selectorQuietMs': max(self.selector_quiet_ms, self.quiet_ms),
+                'maxMs': max_wait_ms,
+                'pollMs': self.poll_ms
+            })
+        except Exception as e:
+            # Навигация или закрытие страницы во время ожидания
+            self.logger.warning(f"Error waiting for page readiness: {str(e)}")
+            stats = {
+                'reason': 'error',
+                'waited_ms': int((time.monotonic() - started) * 1000),
+                'mutations': 0,
+                'pending_requests': 0,
+                'matched_selector': None
+            }
+
+        self.logger.debug(f"Page ready ({stats['reason']}) after {stats['waited_ms']} ms")
+        return stats
+
+    @staticmethod
+    def summarize(waits: List[Dict]) -> Dict:
+        """Сводная статистика ожиданий для одного сайта"""
+        return {
+            'total_ms': sum(wait['waited_ms'] for wait in waits),
+            'timeouts': sum(1 for wait in waits if wait['reason'] == 'timeout'),
+            'waits': waits
+        }
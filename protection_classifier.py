@@ -0,0 +1,160 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, List
+from playwright.async_api import Page
+
+class ProtectionType(Enum):
+    CLOUDFLARE = "cloudflare"
+    RECAPTCHA = "recaptcha"
+    HCAPTCHA = "hcaptcha"
+    CAPTCHA = "captcha"  # Прочие капчи и страницы проверки
+    JAVASCRIPT = "javascript"
+    COOKIE = "cookie"
+    IP_BASED = "ip_based"
+    USER_AGENT = "user_agent"
+    UNKNOWN = "unknown"
+
+# (тип, селектор, только видимые элементы, блокирует страницу); видимость требуется
+# для общих селекторов, которые иначе срабатывают на скрытые шаблоны и классы
+# вроде "security-badge". Блокирующими считаются только промежуточная страница
+# проверки и видимая капча: виджет Turnstile в форме или невидимая reCAPTCHA v3
+# отмечаются, но не мешают анализу и не требуют ожидания
+PROTECTION_SELECTORS = [
+    (ProtectionType.CLOUDFLARE, "iframe[title*='challenge']", False, False),
+    (ProtectionType.CLOUDFLARE, "iframe[src*='challenges.cloudflare.com']", False, False),
+    (ProtectionType.CLOUDFLARE, "#challenge-form, #cf-challenge-running, #challenge-running", False, True),
+    (ProtectionType.RECAPTCHA, "iframe[src*='recaptcha']", False, False),
+    (ProtectionType.RECAPTCHA, "iframe[src*='recaptcha']:not([src*='size=invisible'])", True, True),
+    (ProtectionType.HCAPTCHA, "iframe[src*='hcaptcha']", False, False),
+    (ProtectionType.HCAPTCHA, "iframe[src*='hcaptcha']:not([src*='invisible'])", True, True),
+    (ProtectionType.CAPTCHA, "iframe[src*='captcha']:not([src*='recaptcha']):not([src*='hcaptcha'])", True, True),
+    (ProtectionType.CAPTCHA, "iframe[src*='challenge']:not([src*='challenges.cloudflare.com'])", True, True),
+    (ProtectionType.CAPTCHA, "div[class*='captcha']", True, True),
+    (ProtectionType.CAPTCHA, "div[class*='challenge']", True, True),
+    (ProtectionType.CAPTCHA, "div[class*='robot']", True, True),
+    (ProtectionType.CAPTCHA, "div[class*='security']", True, True),
+    (ProtectionType.JAVASCRIPT, "[class*='antibot'], [id*='antibot'], script[src*='antibot']", False, False)
+]
+
+# Глобальные переменные скриптов защиты
+PROTECTION_GLOBALS = [
+    (ProtectionType.JAVASCRIPT, '_botDetection'),
+    (ProtectionType.JAVASCRIPT, '_antiBot'),
+    (ProtectionType.JAVASCRIPT, '_protection')
+]
+
+# Заголовки промежуточных страниц проверки (всегда блокирующие)
+PROTECTION_TITLES = [
+    (ProtectionType.CLOUDFLARE, 'just a moment'),
+    (ProtectionType.CLOUDFLARE, 'attention required'),
+    (ProtectionType.CLOUDFLARE, 'checking your browser'),
+    (ProtectionType.CAPTCHA, 'проверка браузера'),
+    (ProtectionType.CAPTCHA, 'вы не робот')
+]
+
+# Один проход по странице: все признаки за один вызов evaluate
+CLASSIFY_SCRIPT = """(rules) => {
+    const visible = (el) => {
+        const rect = el.getBoundingClientRect();
+        if (rect.width <= 0 || rect.height <= 0) return false;
+        const style = window.getComputedStyle(el);
+        return style.visibility !== 'hidden' && style.display !== 'none';
+    };
+    const found = [];
+    for (const [type, selector, onlyVisible, blocking] of rules.selectors) {
+        let elements;
+        try {
+            elements = Array.from(document.querySelectorAll(selector));
+        } catch (e) {
+            continue;
+        }
+        if (onlyVisible) elements = elements.filter(visible);
+        if (elements.length) found.push({type, evidence: selector, count: elements.length, blocking});
+    }
+    for (const [type, name] of rules.globals) {
+        if (window[name]) found.push({type, evidence: 'window.' + name, count: 1, blocking: false});
+    }
+    const title = (document.title || '').toLowerCase();
+    for (const [type, marker] of rules.titles) {
+        if (title.includes(marker)) found.push({type, evidence: 'title: ' + marker, count: 1, blocking: true});
+    }
+    return found;
+}"""
+
+@dataclass
+class ProtectionReport:
+    """Обнаруженные виды защиты и признаки, по которым они определены
+
+    blocking - виды защиты, которые закрывают содержимое страницы (видимая
+    капча, промежуточная страница проверки) и требуют ожидания или обхода.
+    """
+    types: List[ProtectionType] = field(default_factory=list)
+    evidence: Dict[str, List[str]] = field(default_factory=dict)
+    blocking: List[ProtectionType] = field(default_factory=list)
+
+    @property
+    def protected(self) -> bool:
+        return bool(self.types)
+
+    def has(self, *types: ProtectionType) -> bool:
+        return any(protection in self.types for protection in types)
+
+    def blocks(self, *types: ProtectionType) -> bool:
+        return any(protection in self.blocking for protection in types)
+
+    def add(self, protection: ProtectionType, evidence: str, blocking: bool = False):
+        if protection not in self.types:
+            self.types.append(protection)
+        if blocking and protection not in self.blocking:
+            self.blocking.append(protection)
+        self.evidence.setdefault(protection.value, []).append(evidence)
+
+    def to_dict(self) -> Dict:
+        return {
+            'types': [protection.value for protection in self.types],
+            'blocking': [protection.value for protection in self.blocking],
+            'evidence': self.evidence
+        }
+
+class ProtectionClassifier:
+    """Определение всех видов анти-бот защиты страницы за один вызов в браузере
+
+    Заменяет последовательные query_selector и wait_for_selector по каждому
+    признаку: на странице без защиты проверка занимает один round trip, а не
+    таймаут ожидания на каждый селектор. Куки защиты запрашиваются у контекста
+    параллельно с проверкой страницы.
+    """
+
+    def __init__(self):
+        self.rules = {
+            'selectors': [[protection.value, selector, only_visible, blocking]
+                          for protection, selector, only_visible, blocking in PROTECTION_SELECTORS],
+            'globals': [[protection.value, name] for protection, name in PROTECTION_GLOBALS],
+            'titles': [[protection.value, marker] for protection, marker in PROTECTION_TITLES]
+        }
+        self.logger = logging.getLogger(__name__)
+
+    async def classify(self, page: Page) -> ProtectionReport:
+        report = ProtectionReport()
+        found, cookies = await asyncio.gather(
+            page.evaluate(CLASSIFY_SCRIPT, self.rules),
+            page.context.cookies(page.url),
+            return_exceptions=True
+        )
+        if isinstance(found, Exception):
+            # Страница перешла на другой адрес во время проверки
+            self.logger.debug(f"Protection check failed: {str(found)}")
+            found = []
+        for item in found:
+            report.add(ProtectionType(item['type']), f"{item['evidence']} ({item['count']})", item['blocking'])
+
+        if not isinstance(cookies, Exception):
+            for cookie in cookies:
+                if 'cf_' in cookie.get('name', ''):
+                    report.add(ProtectionType.COOKIE, f"cookie: {cookie['name']}")
+
+        if report.protected:
+            self.logger.info(f"Detected protection on {page.url}: {', '.join(report.evidence)}")
+        return report
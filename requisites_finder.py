@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+from bs4 import BeautifulSoup
+from inn_scanner import InnScanner
+from page_cache import normalize_url
+from site_rules import SiteRulesRegistry
+from static_analyzer import StaticSiteAnalyzer, html_text
+
+# Текст ссылки на страницу, где обычно публикуют реквизиты
+ANCHOR_WEIGHTS = [
+    ('реквизит', 10),
+    ('requisites', 10),
+    ('карточка предприятия', 8),
+    ('карточка компании', 8),
+    ('контакт', 5),
+    ('contacts', 5),
+    ('о компании', 5),
+    ('о нас', 4),
+    ('about', 3),
+    ('оферт', 3),
+    ('юридическ', 3),
+    ('компания', 2),
+    ('политика', 1)
+]
+
+# Вид URL таких страниц
+URL_WEIGHTS = [
+    (re.compile(r'rekvizit|requisit|details|karto?chka', re.IGNORECASE), 8),
+    (re.compile(r'contact|kontakt', re.IGNORECASE), 4),
+    (re.compile(r'about|o-kompanii|o_kompanii|company|o-nas', re.IGNORECASE), 3),
+    (re.compile(r'oferta|offer|legal|policy|privacy', re.IGNORECASE), 2)
+]
+
+# Ссылки из подвала сайта: там обычно "Реквизиты" и "Контакты"
+FOOTER_BONUS = 2
+FOOTER_MARKER = re.compile(r'footer|bottom', re.IGNORECASE)
+
+def in_footer(link) -> bool:
+    """Ссылка находится в <footer> или в блоке с классом/id подвала"""
+    for parent in link.parents:
+        if parent.name == 'footer':
+            return True
+        marker = ' '.join(parent.get('class') or []) + ' ' + (parent.get('id') or '')
+        if FOOTER_MARKER.search(marker):
+            return True
+    return False
+
+def page_key(url: str) -> str:
+    """URL страницы без фрагмента для сравнения ссылок"""
+    return normalize_url(url.split('#', 1)[0])
+
+class RequisitesFinder:
+    """Поиск ИНН на главной и на страницах реквизитов по HTTP, без рендеринга
+
+    Ссылки главной страницы ранжируются по вероятности наличия реквизитов
+    (текст ссылки, вид URL, положение в подвале), top_k лучших загружаются
+    параллельно, поиск останавливается на первом ИНН с подписью "ИНН" рядом.
+    """
+
+    def __init__(self, fetcher: StaticSiteAnalyzer, scanner: Optional[InnScanner] = None,
+                 rules_registry: Optional[SiteRulesRegistry] = None, top_k: int = 3, min_link_score: int = 3):
+        """
+        Args:
+            fetcher: Статический анализатор, через который (и через его кэш) загружаются страницы
+            scanner: Поиск ИНН в тексте страницы
+            rules_registry: Правила сайтов с известными страницами реквизитов
+            top_k: Число страниц-кандидатов, загружаемых после главной
+            min_link_score: Минимальная оценка ссылки, чтобы считать ее кандидатом
+        """
+        self.fetcher = fetcher
+        self.scanner = scanner or InnScanner()
+        self.rules_registry = rules_registry or SiteRulesRegistry()
+        self.top_k = top_k
+        self.min_link_score = min_link_score
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def link_score(text: str, href: str, footer: bool = False) -> int:
+        """Оценка ссылки по тексту, URL и положению на странице"""
+        text = ' '.join(text.lower().split())
+        path = urlparse(href).path
+        score = max((weight for token, weight in ANCHOR_WEIGHTS if token in text), default=0)
+        score += max((weight for pattern, weight in URL_WEIGHTS if pattern.search(path)), default=0)
+        if score and footer:
+            score += FOOTER_BONUS
+        return score
+
+    def candidate_links(self, html: str, base_url: str) -> List[Tuple[str, int]]:
+        """Ссылки на страницы того же сайта, отсортированные по оценке: [(url, score)]"""
+        soup = BeautifulSoup(html, 'html.parser')
+        host = urlparse(base_url).netloc.replace('www.', '')
+        landing = page_key(base_url)
+        scores: Dict[str, Tuple[str, int]] = {}
+
+        for link in soup.find_all('a', href=True):
+            href = link['href'].strip()
+            if href.startswith(('#', 'javascript:', 'mailto:', 'tel:')):
+                continue
+            url = urljoin(base_url, href)
+            parsed = urlparse(url)
+            if parsed.scheme not in ('http', 'https') or parsed.netloc.replace('www.', '') != host:
+                continue
+            score = self.link_score(link.get_text(' ') or link.get('title', ''), url, in_footer(link))
+            key = page_key(url)
+            if score < self.min_link_score or key == landing:
+                continue
+            if key not in scores or scores[key][1] < score:
+                scores[key] = (url, score)
+
+        return sorted(scores.values(), key=lambda item: -item[1])
+
+    def candidates(self, url: str, html: str) -> List[str]:
+        """Страницы для проверки: известные из правил сайта, затем лучшие по оценке ссылки"""
+        rules = self.rules_registry.find_rules(url)
+        known = [urljoin(url, path) for path in rules.requisites_paths] if rules else []
+        ranked = [link for link, _ in self.candidate_links(html, url)] if html else []
+        pages = list(dict.fromkeys(page_key(link) for link in known + ranked))
+        return pages[:max(self.top_k, len(known))]
+
+    async def scan_page(self, url: str, html: Optional[str] = None) -> Tuple[str, List[Dict]]:
+        """Загрузка страницы и поиск ИНН в ее тексте и HTML: (html, найденные ИНН)"""
+        if html is None:
+            status, html, _, _ = await self.fetcher.fetch(url)
+            if status != 200:
+                return '', []
+        matches = self.scanner.scan_documents(html_text(html), html)
+        for match in matches:
+            match['page'] = url
+        return html, matches
+
+    async def find(self, url: str) -> Dict:
+        """Поиск ИНН сайта
+
+        Returns:
+            inn - наиболее вероятный ИНН, если у него есть подпись или контекст
+            реквизитов (оценка > 0), иначе None; matches - все найденные номера
+            с указанием страницы, fetched - загруженные страницы
+        """
+        html, matches = await self.scan_page(url)
+        fetched = [url]
+        if matches and matches[0]['score'] > 0:
+            return self.result(matches, fetched)
+
+        pages = self.candidates(url, html)
+        if pages:
+            self.logger.debug(f"Requisites candidates for {url}: {pages}")
+        pending = {asyncio.create_task(self.scan_page(page)): page for page in pages}
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                found = False
+                for task in done:
+                    page = pending.pop(task)
+                    fetched.append(page)
+                    try:
+                        _, page_matches = task.result()
+                    except Exception as e:
+                        self.logger.debug(f"Failed to fetch {page}: {str(e)}")
+                        continue
+                    matches.extend(page_matches)
+                    found = found or bool(page_matches and page_matches[0]['score'] > 0)
+                if found:
+                    break
+        finally:
+            # Остальные кандидаты не нужны, если ИНН уже найден
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        return self.result(matches, fetched)
+
+    @staticmethod
+    def result(matches: List[Dict], fetched: List[str]) -> Dict:
+        # Один номер на нескольких страницах - лучшая оценка и все позиции
+        merged: Dict[str, Dict] = {}
+        for match in matches:
+            known = merged.get(match['inn'])
+            if known is None:
+                merged[match['inn']] = dict(match, positions=[dict(p, page=match['page']) for p in match['positions']])
+                continue
+            known['positions'].extend(dict(p, page=match['page']) for p in match['positions'])
+            if match['score'] > known['score']:
+                known.update(score=match['score'], context=match['context'], page=match['page'])
+        ranked = sorted(merged.values(), key=lambda m: (-m['score'], -len(m['positions'])))
+        # Номер с верной контрольной суммой без подписи "ИНН" (метка времени, артикул,
+        # телефон) совпадает случайно примерно в каждом 11-м случае: это не ИНН сайта
+        return {
+            'inn': ranked[0]['inn'] if ranked and ranked[0]['score'] > 0 else None,
+            'matches': ranked,
+            'fetched': fetched
+        }
@@ -0,0 +1,104 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Set
+from playwright.async_api import Page, Route
+
+# Домены счетчиков, рекламы и виджетов, которые не нужны для извлечения данных
+TRACKER_PATTERNS = [
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'googlesyndication.com',
+    'mc.yandex.ru',
+    'an.yandex.ru',
+    'yandex.ru/ads',
+    'top-fwz1.mail.ru',
+    'counter.yadro.ru',
+    'facebook.net',
+    'connect.facebook.com',
+    'vk.com/rtrg',
+    'code.jivosite.com',
+    'code.jivo.ru',
+    'cdn-ru.bitrix24.ru',
+    'hotjar.com',
+    'clarity.ms'
+]
+
+# Типичные размеры ресурсов (медианы HTTP Archive, байты) для оценки сэкономленного трафика:
+# заблокированные запросы не выполняются, поэтому их реальный размер неизвестен
+TYPICAL_SIZES = {
+    'image': 30 * 1024,
+    'media': 500 * 1024,
+    'font': 30 * 1024,
+    'stylesheet': 15 * 1024,
+    'script': 25 * 1024,
+    'other': 5 * 1024
+}
+
+@dataclass
+class ResourceProfile:
+    """Профиль блокировки ресурсов"""
+    name: str
+    block_types: Set[str] = field(default_factory=set)  # resource_type запросов Playwright
+    block_trackers: bool = False
+
+RESOURCE_PROFILES: Dict[str, ResourceProfile] = {
+    'full': ResourceProfile('full'),
+    'no-media': ResourceProfile('no-media', {'image', 'media', 'font'}, block_trackers=True),
+    'text-only': ResourceProfile('text-only', {'image', 'media', 'font', 'stylesheet', 'texttrack', 'eventsource'},
+                                 block_trackers=True)
+}
+
+class ResourceBlocker:
+    """Блокировка ненужных ресурсов страницы через page.route"""
+
+    def __init__(self, profile: str = 'no-media', extra_patterns: List[str] = None):
+        if profile not in RESOURCE_PROFILES:
+            raise ValueError(f"Unknown resource profile: {profile}")
+        self.profile = RESOURCE_PROFILES[profile]
+        self.patterns = TRACKER_PATTERNS + (extra_patterns or [])
+        self.blocked_by_type: Dict[str, int] = {}
+        self.allowed_requests = 0
+        self.logger = logging.getLogger(__name__)
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        if resource_type == 'document':
+            return False
+        if resource_type in self.profile.block_types:
+            return True
+        return self.profile.block_trackers and any(pattern in url for pattern in self.patterns)
+
+    async def attach(self, page: Page):
+        """Подключение к странице (до навигации)"""
+        if self.profile.name == 'full':
+            # Без перехвата: маршрутизация отключает HTTP-кэш браузера
+            return
+        await page.route('**/*', self.handle_route)
+
+    async def handle_route(self, route: Route):
+        request = route.request
+        try:
+            if self.should_block(request.url, request.resource_type):
+                self.blocked_by_type[request.resource_type] = self.blocked_by_type.get(request.resource_type, 0) + 1
+                await route.abort('blockedbyclient')
+            else:
+                self.allowed_requests += 1
+                # Следующему обработчику (например, воспроизведению из HAR), а если его нет - в сеть
+                await route.fallback()
+        except Exception as e:
+            # Страница закрыта во время обработки запроса
+            self.logger.debug(f"Error routing {request.url}: {str(e)}")
+
+    def summary(self) -> Dict:
+        """Сколько запросов и трафика сэкономлено на странице"""
+        blocked = sum(self.blocked_by_type.values())
+        return {
+            'profile': self.profile.name,
+            'blocked_requests': blocked,
+            'allowed_requests': self.allowed_requests,
+            'blocked_by_type': dict(self.blocked_by_type),
+            'estimated_bytes_saved': sum(
+                TYPICAL_SIZES.get(resource_type, TYPICAL_SIZES['other']) * count
+                for resource_type, count in self.blocked_by_type.items()
+            )
+        }
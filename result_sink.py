@@ -0,0 +1,179 @@
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Поля с полным HTML и текстом страницы: в потоке результатов они занимают
+# большую часть объема, а отрендеренный DOM и так сохраняется в кэше
+BULKY_FIELDS = ('html', 'text')
+
+COMPRESSION_SUFFIXES = {
+    None: '',
+    'gzip': '.gz',
+    'zstd': '.zst'
+}
+
+def sink_path(output_dir: str, name: str, compression: Optional[str] = None) -> str:
+    """Путь к файлу потока с расширением по типу сжатия"""
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Unknown compression: {compression}")
+    return os.path.join(output_dir, name + COMPRESSION_SUFFIXES[compression])
+
+class ResultSink:
+    """Приемник результатов: записи пишутся по мере готовности, а не в конце прогона"""
+
+    def write(self, record: Dict):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+class NDJSONSink(ResultSink):
+    """Append-only NDJSON файл с периодическим fsync и необязательным сжатием
+
+    Каждая запись - одна строка JSON. При сжатии поток сбрасывается полным
+    блоком на каждом fsync, поэтому после падения процесса читаются все
+    записи до последней синхронизации. Повторное открытие дописывает новый
+    gzip member / zstd frame, что остается корректным файлом.
+    """
+
+    def __init__(self, path: str, compression: Optional[str] = None, fsync_every: int = 50,
+                 fsync_interval: float = 5.0, exclude_fields: Iterable[str] = ()):
+        """
+        Args:
+            path: Путь к файлу
+            compression: None, 'gzip' или 'zstd'
+            fsync_every: Синхронизация с диском после указанного числа записей
+            fsync_interval: Синхронизация с диском не реже, чем раз в указанное число секунд
+            exclude_fields: Поля верхнего уровня, которые не пишутся в поток
+        """
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError("zstd compression requires the zstandard package")
+
+        self.path = path
+        self.compression = compression
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.exclude_fields = set(exclude_fields)
+        self.records = 0
+        self.logger = logging.getLogger(__name__)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.raw = open(path, 'ab')
+        if compression == 'gzip':
+            self.stream = gzip.GzipFile(fileobj=self.raw, mode='ab')
+        elif compression == 'zstd':
+            self.stream = zstandard.ZstdCompressor().stream_writer(self.raw, closefd=False)
+        else:
+            self.stream = self.raw
+
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def write(self, record: Dict):
+        if self.exclude_fields:
+            record = {key: value for key, value in record.items() if key not in self.exclude_fields}
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        self.stream.write(line.encode('utf-8'))
+        self.records += 1
+        self.pending += 1
+        if self.pending >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.flush()
+
+    def flush(self):
+        """Сброс сжатого блока и fsync файла"""
+        if self.compression == 'zstd':
+            self.stream.flush(zstandard.FLUSH_BLOCK)
+        elif self.compression == 'gzip':
+            self.stream.flush()
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if self.raw.closed:
+            return
+        try:
+            if self.stream is not self.raw:
+                # Завершение gzip member / zstd frame
+                self.stream.close()
+            self.raw.flush()
+            os.fsync(self.raw.fileno())
+        finally:
+            self.raw.close()
+        self.logger.debug(f"Wrote {self.records} records to {self.path}")
+
+def read_ndjson(path: str) -> Iterable[Dict]:
+    """Чтение потока NDJSON (в том числе сжатого) по одной записи"""
+    if path.endswith('.gz'):
+        f = gzip.open(path, 'rt', encoding='utf-8')
+    elif path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("zstd compression requires the zstandard package")
+        f = zstandard.open(path, 'rt', encoding='utf-8')
+    else:
+        f = open(path, 'r', encoding='utf-8')
+    with f:
+        try:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        except (EOFError, json.JSONDecodeError):
+            # Хвост файла, недописанный при падении процесса
+            logging.getLogger(__name__).warning(f"Truncated record at the end of {path}")
+
+class Checkpoint:
+    """Журнал обработанных URL для продолжения прерванного прогона
+
+    Запись о URL делается после сохранения его результата, поэтому при
+    перезапуске пропускаются только сайты, результат которых уже на диске.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, str] = {}
+        if os.path.exists(path):
+            for record in read_ndjson(path):
+                self.done[record['url']] = record.get('status')
+        # Каждая отметка сразу синхронизируется: записей немного, а потеря дает повторную обработку
+        self.sink = NDJSONSink(path, fsync_every=1)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.done
+
+    def __len__(self) -> int:
+        return len(self.done)
+
+    def mark(self, url: str, status: str):
+        self.done[url] = status
+        self.sink.write({'url': url, 'status': status, 'timestamp': time.time()})
+
+    def close(self):
+        self.sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,198 @@
+import logging
+import time
+from dataclasses import asdict
+from typing import Callable, Dict, List, Optional
+from playwright.async_api import Page
+from incremental import product_key
+from page_extractor import NODE_SELECTION_JS, ExtractionPlan, PageExtractor
+from page_readiness import ReadinessDetector
+from site_rules import SiteRules
+
+# Кнопки подгрузки следующей порции товаров
+DEFAULT_LOAD_MORE_SELECTORS = [
+    '.load-more',
+    '.show-more',
+    '.btn-more',
+    'button.more',
+    '[data-role="load-more"]',
+    '[data-action="load-more"]',
+    '.ajax-pager-link',
+    '.catalog-more'
+]
+
+# Шаг подгрузки: извлечение еще не обработанных товаров (они помечаются
+# атрибутом, поэтому совпадения нескольких селекторов не дублируются),
+# затем клик по "показать еще" или прокрутка к концу списка. Карточки
+# выбираются заново на каждом шаге тем же правилом, что и в EXTRACTION_SCRIPT:
+# обертка списка не становится карточкой и не скрывает подгруженные в нее товары
+HARVEST_STEP_SCRIPT = """({plan, loadMore}) => {""" + NODE_SELECTION_JS + """
+    const pick = (root, selectors) => {
+        if (!selectors || !selectors.length) return null;
+        try {
+            return root.querySelector(selectors.join(','));
+        } catch (e) {
+            for (const selector of selectors) {
+                try {
+                    const el = root.querySelector(selector);
+                    if (el) return el;
+                } catch (err) {}
+            }
+            return null;
+        }
+    };
+    const text = (el) => (el && el.textContent) ? el.textContent.trim() : '';
+
+    const records = [];
+    let total = 0;
+    let collapsed = 0;
+    let last = null;
+    const selected = selectNodes(plan.product_selectors, true);
+    const cards = new Set(selected.nodes);
+    // Контейнеры и фрагменты карточек учитываются в collapsed один раз
+    for (const selector of plan.product_selectors) {
+        for (const el of all(document, selector)) {
+            if (cards.has(el) || el.hasAttribute('data-harvested')) continue;
+            el.setAttribute('data-harvested', 'nested');
+            collapsed++;
+        }
+    }
+    for (const el of selected.nodes) {
+        last = el;
+        if (el.getAttribute('data-harvested') === '1') continue;
+        el.setAttribute('data-harvested', '1');
+        total++;
+        const nameEl = pick(el, plan.product_name);
+        const priceEl = pick(el, plan.product_price);
+        const linkEl = el.querySelector('a');
+        const descEl = pick(el, plan.product_description);
+        records.push({
+            name: nameEl ? text(nameEl) : null,
+            price: priceEl ? text(priceEl) : null,
+            href: linkEl ? linkEl.getAttribute('href') : null,
+            description: descEl ? text(descEl) : null
+        });
+    }
+
+    let action = 'scroll';
+    for (const selector of loadMore) {
+        let button = null;
+        try {
+            button = document.querySelector(selector);
+        } catch (e) {}
+        if (!button || button.disabled || button.offsetParent === null) continue;
+        const href = button.tagName === 'A' ? button.getAttribute('href') : null;
+        // Обычная ссылка увела бы со страницы: это пагинация, а не подгрузка
+        if (href && !href.startsWith('#') && !href.startsWith('javascript:')) continue;
+        button.scrollIntoView({block: 'center'});
+        button.click();
+        action = 'click';
+        break;
+    }
+    if (action === 'scroll') {
+        if (last) last.scrollIntoView({block: 'end'});
+        window.scrollTo(0, document.documentElement.scrollHeight);
+    }
+
+    // Отсчет тишины DOM начинается после действия, а не с последней мутации
+    if (window.__readiness) window.__readiness.lastChange = Date.now();
+    return {records: records, added: total, collapsed: collapsed, action: action,
+            height: document.documentElement.scrollHeight};
+}"""
+
+class ScrollHarvester:
+    """Подгрузка бесконечной ленты и кнопок "показать еще" с извлечением товаров по мере появления"""
+
+    def __init__(self, readiness: Optional[ReadinessDetector] = None, max_items: int = 2000,
+                 max_time_ms: int = 60000, max_rounds: int = 100, idle_rounds: int = 2,
+                 step_wait_ms: int = 5000):
+        """
+        Args:
+            readiness: Детектор готовности, которым ожидается подгрузка после каждого шага
+            max_items: Остановка после указанного числа товаров
+            max_time_ms: Общий лимит времени на подгрузку
+            max_rounds: Максимальное число шагов прокрутки/клика
+            idle_rounds: Остановка после стольких шагов подряд без новых товаров
+            step_wait_ms: Максимальное ожидание подгрузки после одного шага
+        """
+        self.readiness = readiness or ReadinessDetector()
+        self.max_items = max_items
+        self.max_time_ms = max_time_ms
+        self.max_rounds = max_rounds
+        self.idle_rounds = idle_rounds
+        self.step_wait_ms = step_wait_ms
+        self.extractor = PageExtractor()
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def load_more_selectors(rules: SiteRules) -> List[str]:
+        """Кнопки подгрузки: из селекторов пагинации сайта и общие"""
+        site_selectors = [selector for selector in rules.selectors.pagination if 'more' in selector.lower()]
+        return list(dict.fromkeys(site_selectors + DEFAULT_LOAD_MORE_SELECTORS))
+
+    async def harvest(self, page: Page, plan: ExtractionPlan, load_more: Optional[List[str]] = None,
+                      on_items: Optional[Callable[[List[Dict]], None]] = None) -> Dict:
+        """Прокрутка/клики до исчерпания ленты или бюджета
+
+        Returns:
+            Товары, собранные по мере подгрузки, и статистика: число шагов,
+            причина остановки, затраченное время
+        """
+        started = time.monotonic()
+        plan_args = asdict(plan)
+        products: Dict[str, Dict] = {}
+        rounds = 0
+        idle = 0
+        actions = {'scroll': 0, 'click': 0}
+        collapsed = 0
+        reason = 'max_rounds'
+
+        while rounds < self.max_rounds:
+            elapsed_ms = (time.monotonic() - started) * 1000
+            if elapsed_ms >= self.max_time_ms:
+                reason = 'time_budget'
+                break
+            try:
+                step = await page.evaluate(HARVEST_STEP_SCRIPT, {
+                    'plan': plan_args,
+                    'loadMore': load_more or DEFAULT_LOAD_MORE_SELECTORS
+                })
+            except Exception as e:
+                self.logger.warning(f"Scroll step failed: {str(e)}")
+                reason = 'error'
+                break
+            rounds += 1
+            actions[step['action']] += 1
+            collapsed += step['collapsed']
+
+            new_items = []
+            for product in self.extractor.build_products(step['records'], page.url):
+                key = product_key(product)
+                if key not in products:
+                    products[key] = product
+                    new_items.append(product)
+                else:
+                    collapsed += 1
+            if new_items and on_items:
+                on_items(new_items)
+
+            if len(products) >= self.max_items:
+                reason = 'item_budget'
+                break
+            idle = idle + 1 if not new_items else 0
+            if idle >= self.idle_rounds:
+                reason = 'exhausted'
+                break
+
+            remaining_ms = self.max_time_ms - (time.monotonic() - started) * 1000
+            await self.readiness.wait(page, max_wait_ms=int(max(100, min(self.step_wait_ms, remaining_ms))))
+
+        stats = {
+            'items': len(products),
+            'rounds': rounds,
+            'actions': actions,
+            'collapsed': collapsed,
+            'reason': reason,
+            'elapsed_ms': int((time.monotonic() - started) * 1000)
+        }
+        self.logger.debug(f"Scroll harvest stopped ({reason}): {stats['items']} items in {rounds} rounds")
+        return {'products': list(products.values()), 'stats': stats}
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional
+from analyze_brick_sites import setup_logging, read_urls, run_batch, save_stats
+from stage_metrics import StageMetrics
+from result_sink import NDJSONSink, sink_path
+
+def shard_urls(urls: List[str], workers: int) -> List[List[str]]:
+    """Разбиение списка URL на шарды по кругу"""
+    if not urls:
+        return []
+    workers = max(1, min(workers, len(urls)))
+    return [urls[i::workers] for i in range(workers)]
+
+def run_shard(worker_id: int, urls: List[str], output_dir: str, verbose: bool, concurrency: int,
+              incremental: bool = False, compression: Optional[str] = None, prewarm: bool = True) -> Dict:
+    """Обработка шарда в отдельном процессе со своим пулом браузеров"""
+    setup_logging(output_dir, verbose, log_name=f'analysis_worker{worker_id}.log')
+    stream_path = os.path.join(output_dir, f'results_worker{worker_id}.ndjson')
+
+    with NDJSONSink(stream_path) as stream:
+        stats = asyncio.run(run_batch(urls, output_dir, verbose, concurrency, stream.write, incremental,
+                                      changes_name=f'changes_worker{worker_id}.ndjson',
+                                      results_name=f'analysis_worker{worker_id}.ndjson',
+                                      compression=compression, prewarm=prewarm))
+
+    stats['worker_id'] = worker_id
+    stats['stream'] = stream_path
+    return stats
+
+def merge_stats(worker_stats: List[Dict], total_sites: int) -> Dict:
+    """Объединение статистики воркеров в формат analysis_stats.json"""
+    stats = {
+        'total_sites': total_sites,
+        'successful': sum(s['successful'] for s in worker_stats),
+        'failed': sum(s['failed'] for s in worker_stats),
+        'products_found': sum(s['products_found'] for s in worker_stats),
+        'categories_found': sum(s['categories_found'] for s in worker_stats),
+        'start_time': min((s['start_time'] for s in worker_stats), default=datetime.now().isoformat())
+    }
+    stats['end_time'] = max((s['end_time'] for s in worker_stats), default=datetime.now().isoformat())
+    if any('unchanged' in s for s in worker_stats):
+        stats['unchanged'] = sum(s.get('unchanged', 0) for s in worker_stats)
+    if any('unreachable' in s for s in worker_stats):
+        stats['unreachable'] = sum(s.get('unreachable', 0) for s in worker_stats)
+    stages = StageMetrics()
+    for s in worker_stats:
+        if s.get('stages'):
+            stages.merge(StageMetrics.from_dict(s['stages']))
+    stats['stages'] = stages.to_dict()
+    return stats
+
+def merge_streams(stream_paths: List[str], output_path: str):
+    """Склейка потоков результатов воркеров в один NDJSON файл
+
+    Склеиваются байты как есть: последовательность gzip members или zstd
+    frames остается корректным сжатым файлом.
+    """
+    with open(output_path, 'wb') as out:
+        for path in stream_paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, out)
+            os.remove(path)
+
+def run_sharded(urls: List[str], output_dir: str = "brick_data", workers: int = None,
+                concurrency: int = 4, verbose: bool = False, incremental: bool = False,
+                compression: Optional[str] = None, prewarm: bool = True) -> Dict:
+    """Анализ большого списка URL в нескольких процессах
+
+    Args:
+        urls: Список URL для анализа
+        output_dir: Директория для сохранения результатов
+        workers: Число процессов (по умолчанию число ядер)
+        concurrency: Число одновременно открытых страниц в каждом процессе
+        verbose: Подробный вывод логов
+        incremental: Обрабатывать только изменившиеся сайты (общее состояние в output_dir)
+        compression: Сжатие файлов результатов: None, 'gzip' или 'zstd'
+        prewarm: Каждый процесс перед анализом проверяет хосты своего шарда
+
+    Returns:
+        Объединенная статистика анализа
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    setup_logging(output_dir, verbose)
+
+    shards = shard_urls(urls, workers or os.cpu_count() or 1)
+    logging.info(f"Analyzing {len(urls)} sites in {len(shards)} worker processes")
+
+    worker_stats = []
+    # spawn: каждый процесс стартует с чистым состоянием без унаследованного event loop
+    mp_context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max(1, len(shards)), mp_context=mp_context) as executor:
+        futures = {
+            executor.submit(run_shard, worker_id, shard, output_dir, verbose, concurrency, incremental,
+                            compression, prewarm): worker_id
+            for worker_id, shard in enumerate(shards)
+        }
+        for future in as_completed(futures):
+            worker_id = futures[future]
+            try:
+                worker_stats.append(future.result())
+                logging.info(f"Worker {worker_id} finished")
+            except Exception as e:
+                # Процесс упал целиком: все сайты его шарда считаются неудачными
+                logging.error(f"Worker {worker_id} failed: {str(e)}")
+                worker_stats.append({
+                    'successful': 0,
+                    'failed': len(shards[worker_id]),
+                    'products_found': 0,
+                    'categories_found': 0,
+                    'start_time': datetime.now().isoformat(),
+                    'end_time': datetime.now().isoformat()
+                })
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    streams = [os.path.join(output_dir, f'results_worker{i}.ndjson') for i in range(len(shards))]
+    merge_streams(streams, os.path.join(output_dir, 'results.ndjson'))
+    if incremental:
+        changes = [sink_path(output_dir, f'changes_worker{i}.ndjson', compression) for i in range(len(shards))]
+        merge_streams(changes, sink_path(output_dir, f"changes_{timestamp}.ndjson", compression))
+    else:
+        analysis = [sink_path(output_dir, f'analysis_worker{i}.ndjson', compression) for i in range(len(shards))]
+        merge_streams(analysis, sink_path(output_dir, f"analysis_{timestamp}.ndjson", compression))
+
+    stats = merge_stats(worker_stats, len(urls))
+    save_stats(stats, output_dir)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='Многопроцессный анализ списка сайтов')
+    parser.add_argument('input', nargs='?', default='brick_sites.txt', help='Файл со списком URL')
+    parser.add_argument('-o', '--output', default='brick_data', help='Директория для сохранения результатов')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='Число процессов (по умолчанию число ядер)')
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help='Число одновременных страниц в процессе')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Подробный вывод')
+    parser.add_argument('--incremental', action='store_true', help='Только изменения с прошлого прогона')
+    parser.add_argument('--compress', choices=['gzip', 'zstd'], default=None, help='Сжатие файлов результатов')
+    parser.add_argument('--no-prewarm', action='store_true', help='Без предварительной проверки хостов')
+
+    args = parser.parse_args()
+    run_sharded(read_urls(args.input), args.output, args.workers, args.concurrency, args.verbose, args.incremental,
+                args.compress, prewarm=not args.no_prewarm)
+
+if __name__ == '__main__':
+    main()
@@ -1,60 +1,56 @@
 import asyncio
 import logging
-from playwright.async_api import async_playwright, Browser, Page, Request, Response, Playwright
+from playwright.async_api import async_playwright, Browser, Page, Response, Playwright
 import json
 import time
 from typing import Dict, List, Optional
 import random
 from urllib.parse import urljoin, urlparse
+from page_extractor import PageExtractor
+from page_readiness import ReadinessDetector
+from site_rules import SiteRulesRegistry
+from browser_pool import BrowserPool, BrowserLease
+from resource_blocking import ResourceBlocker
+from har_archive import HarArchive
+from stage_metrics import StageTimer
+from protection_classifier import ProtectionClassifier, ProtectionReport, ProtectionType
+from network_recorder import NetworkRecorder
+from scroll_harvester import ScrollHarvester
+from incremental import product_key
 
 class AntiBotBypassStrategy:
     """Стратегии обхода анти-бот защиты"""
     
     @staticmethod
-    async def handle_cloudflare(page: Page) -> bool:
-        """Обработка Cloudflare защиты"""
+    async def handle_cloudflare(page: Page, classifier: ProtectionClassifier) -> bool:
+        """Обработка Cloudflare защиты (вызывается, только если страница проверки обнаружена)"""
         try:
-            # Ждем появления потенциального Cloudflare challenge
-            challenge_frame = await page.query_selector("iframe[title*='challenge']")
-            if challenge_frame:
-                # Даем время на решение капчи и проверки
-                await page.wait_for_timeout(random.randint(5000, 8000))
-                
-                # Проверяем, исчез ли iframe с капчей
-                challenge_frame = await page.query_selector("iframe[title*='challenge']")
-                return challenge_frame is None
+            # Даем время на решение капчи и проверки
+            await page.wait_for_timeout(random.randint(5000, 8000))
             
-            return True
+            # Проверяем, ушла ли страница проверки (встроенный виджет может остаться)
+            report = await classifier.classify(page)
+            return not report.blocks(ProtectionType.CLOUDFLARE)
             
         except Exception as e:
             logging.error(f"Error in Cloudflare handling: {str(e)}")
             return True  # Если не нашли Cloudflare challenge, считаем что защиты нет
     
     @staticmethod
-    async def handle_general_protection(page: Page) -> bool:
-        """Общие методы обхода защиты"""
+    async def handle_general_protection(page: Page, report: ProtectionReport) -> bool:
+        """Общие методы обхода защиты
+        
+        Args:
+            page: Страница
+            report: Результат проверки страницы; ожидание капчи - только если она обнаружена
+        """
         try:
             # Эмуляция человеческого поведения
             await page.mouse.move(random.randint(100, 700), random.randint(100, 700))
             await page.wait_for_timeout(random.randint(500, 1500))
             
-            # Проверяем типичные элементы капчи
-            selectors = [
-                "iframe[src*='captcha']",
-                "iframe[src*='challenge']",
-                "div[class*='captcha']",
-                "div[class*='challenge']",
-                "div[class*='robot']",
-                "div[class*='security']"
-            ]
-            
-            for selector in selectors:
-                try:
-                    element = await page.wait_for_selector(selector, timeout=3000)
-                    if element:
-                        await page.wait_for_timeout(random.randint(4000, 7000))
-                except Exception:
-                    continue
+            if report.has(ProtectionType.CAPTCHA):
+                await page.wait_for_timeout(random.randint(4000, 7000))
             
             return True
             
@@ -63,13 +59,23 @@ class AntiBotBypassStrategy:
             return False
 
 class DeepSiteAnalyzer:
-    def __init__(self):
+    def __init__(self, pool: Optional[BrowserPool] = None, har: Optional[HarArchive] = None):
+        # Общий пул браузеров: вместо запуска собственного Chromium
+        # страница создается в контексте, выданном пулом
+        self.pool = pool
+        # Запись сетевого обмена в HAR или воспроизведение из него
+        self.har = har
+        self.lease: Optional[BrowserLease] = None
         self.browser: Optional[Browser] = None
         self.page: Optional[Page] = None
         self.playwright: Optional[Playwright] = None
-        self.request_log: List[Dict] = []
         self.logger = logging.getLogger(__name__)
         self.anti_bot = AntiBotBypassStrategy()
+        self.classifier = ProtectionClassifier()
+        self.readiness = ReadinessDetector()
+        self.rules_registry = SiteRulesRegistry()
+        self.extractor = PageExtractor(rules_registry=self.rules_registry)
+        self.scroll_harvester = ScrollHarvester(self.readiness)
         
         # Настройка эмуляции браузера
         self.browser_options = {
@@ -85,6 +91,10 @@ class DeepSiteAnalyzer:
         """Инициализация браузера"""
         try:
             self.logger.info("Initializing browser...")
+            if self.pool:
+                # Пул запускает браузеры сам при выдаче первого контекста
+                return
+                
             if not self.playwright:
                 self.playwright = await async_playwright().start()
                 self.logger.info("Playwright started")
@@ -115,6 +125,8 @@ class DeepSiteAnalyzer:
                 pass
             self.page = None
             
+        await self.release_context()
+            
         if self.browser:
             try:
                 await self.browser.close()
@@ -136,26 +148,6 @@ class DeepSiteAnalyzer:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.cleanup()
 
-    def handle_request(self, request: Request):
-        """Синхронная обработка запроса"""
-        try:
-            post_data = None
-            if request.method == 'POST':
-                try:
-                    post_data = request.post_data
-                except:
-                    post_data = None
-                    
-            self.logger.info(f"Network request: {request.method} {request.url}")
-            self.request_log.append({
-                'method': request.method,
-                'url': request.url,
-                'headers': dict(request.headers),
-                'post_data': post_data
-            })
-        except Exception as e:
-            self.logger.error(f"Error handling request: {str(e)}")
-
     async def handle_cookies(self, page: Page):
         """Управление cookies для обхода защиты"""
         try:
@@ -209,10 +201,7 @@ class DeepSiteAnalyzer:
         """Создание страницы с продвинутыми настройками против обнаружения"""
         try:
             self.logger.info("Creating new page...")
-            if not self.browser:
-                await self.init_browser()
-                
-            context = await self.browser.new_context(
+            context_options = dict(
                 viewport=self.browser_options['viewport'],
                 user_agent=self.browser_options['user_agent'],
                 locale=self.browser_options['locale'],
@@ -222,6 +211,15 @@ class DeepSiteAnalyzer:
                 ignore_https_errors=True,  # Игнорируем ошибки SSL
                 java_script_enabled=True  # Включаем JavaScript
             )
+            
+            if self.pool:
+                await self.release_context()
+                self.lease = await self.pool.acquire(**context_options)
+                context = self.lease.context
+            else:
+                if not self.browser:
+                    await self.init_browser()
+                context = await self.browser.new_context(**context_options)
             self.logger.info("Browser context created")
             
             # Добавляем случайные заголовки и скрипты
@@ -241,6 +239,7 @@ class DeepSiteAnalyzer:
                     return getParameter.apply(this, arguments);
                 };
             """)
+            await self.readiness.install(context)
             self.logger.info("Init scripts added")
             
             page = await context.new_page()
@@ -274,28 +273,37 @@ class DeepSiteAnalyzer:
             self.logger.error(f"Error creating page: {str(e)}")
             raise
 
-    async def bypass_protection(self, page: Page) -> bool:
-        """Комплексный обход защиты"""
+    async def bypass_protection(self, page: Page, protection_reports: Optional[List[Dict]] = None) -> bool:
+        """Комплексный обход защиты
+        
+        Все виды защиты определяются одной проверкой страницы, обход
+        выполняется только для обнаруженных.
+        
+        Args:
+            page: Страница
+            protection_reports: Список, в который добавляется результат проверки
+        """
         try:
-            # Проверяем наличие Cloudflare
-            if not await self.anti_bot.handle_cloudflare(page):
+            report = await self.classifier.classify(page)
+            if protection_reports is not None:
+                protection_reports.append(report.to_dict())
+            
+            # Ожидание только для защиты, закрывающей страницу
+            if (report.blocks(ProtectionType.CLOUDFLARE) and
+                    not await self.anti_bot.handle_cloudflare(page, self.classifier)):
                 # Если не удалось обойти Cloudflare, пробуем альтернативный метод
                 await self.handle_alternative_protection(page)
             
-            # Проверяем наличие reCAPTCHA
-            recaptcha_frame = await page.query_selector("iframe[src*='recaptcha']")
-            if recaptcha_frame:
+            if report.blocks(ProtectionType.RECAPTCHA):
                 self.logger.warning("Detected reCAPTCHA, waiting for timeout...")
                 await page.wait_for_timeout(random.randint(10000, 15000))
             
-            # Проверяем наличие hCaptcha
-            hcaptcha_frame = await page.query_selector("iframe[src*='hcaptcha']")
-            if hcaptcha_frame:
+            if report.blocks(ProtectionType.HCAPTCHA):
                 self.logger.warning("Detected hCaptcha, waiting for timeout...")
                 await page.wait_for_timeout(random.randint(10000, 15000))
             
             # Пробуем обойти общую защиту
-            if not await self.anti_bot.handle_general_protection(page):
+            if not await self.anti_bot.handle_general_protection(page, report):
                 return False
             
             return True
@@ -345,35 +353,10 @@ class DeepSiteAnalyzer:
         except Exception as e:
             self.logger.warning(f"Error in alternative protection handling: {str(e)}")
 
-    async def wait_for_dynamic_content(self, page: Page):
+    async def wait_for_dynamic_content(self, page: Page, selectors: Optional[List[str]] = None) -> Dict:
         """Ожидание загрузки динамического контента"""
-        try:
-            # Ждем загрузки AJAX-запросов
-            await page.wait_for_load_state("networkidle")
-            
-            # Проверяем наличие динамических элементов
-            await page.evaluate("""
-                new Promise((resolve) => {
-                    let lastHeight = document.body.scrollHeight;
-                    let retries = 0;
-                    
-                    const checkHeight = () => {
-                        const newHeight = document.body.scrollHeight;
-                        if (newHeight === lastHeight || retries > 5) {
-                            resolve();
-                        } else {
-                            lastHeight = newHeight;
-                            retries++;
-                            setTimeout(checkHeight, 1000);
-                        }
-                    };
-                    
-                    setTimeout(checkHeight, 1000);
-                });
-            """)
-            
-        except Exception as e:
-            self.logger.warning(f"Error waiting for dynamic content: {str(e)}")
+        # Резолвится при стабилизации DOM и отсутствии активных XHR/fetch
+        return await self.readiness.wait(page, selectors)
 
     async def simulate_human_behavior(self, page: Page):
         """Эмуляция человеческого поведения"""
@@ -400,24 +383,41 @@ class DeepSiteAnalyzer:
             self.logger.warning(f"Error in human behavior simulation: {str(e)}")
 
     async def analyze_site(self, url: str) -> Dict:
-        """Анализ сайта с обходом защиты"""
+        """Анализ сайта с обходом защиты
+
+        Длительность каждого этапа сохраняется в поле spans результата.
+        """
+        timer = StageTimer()
         try:
             self.logger.info("Starting site analysis...")
+            rules = self.rules_registry.get_rules(url)
+            readiness_waits = []
+            protection_reports = []
             
             # Создаем новую страницу
-            self.page = await self.create_page()
+            with timer.span('page_setup'):
+                self.page = await self.create_page()
             if not self.page:
                 raise Exception("Failed to create page")
             self.logger.info("Page created successfully")
+            
+            # Запись ответов в HAR или их воспроизведение вместо сети
+            har = await self.har.attach(self.page, url) if self.har else None
+            
+            # Блокировка картинок, шрифтов и счетчиков по профилю сайта
+            blocker = ResourceBlocker(rules.resource_profile)
+            await blocker.attach(self.page)
                 
-            # Подписываемся на события запросов
-            self.page.on("request", self.handle_request)
-            self.logger.info("Request handler attached")
+            # Журнал запросов только этой страницы
+            recorder = NetworkRecorder()
+            recorder.attach(self.page, url)
+            self.logger.info("Network recorder attached")
             
             # Переход на страницу с обработкой защиты
             self.logger.info(f"Navigating to {url}")
             try:
-                response = await self.page.goto(url, wait_until="networkidle", timeout=60000)
+                with timer.span('navigation'):
+                    response = await self.page.goto(url, wait_until="networkidle", timeout=60000)
                 self.logger.info("Navigation completed")
                 
                 if not response:
@@ -430,46 +430,94 @@ class DeepSiteAnalyzer:
                     raise Exception(f"Page returned status code {status}")
                 
                 # Даем время на загрузку страницы
-                await self.page.wait_for_timeout(5000)
+                with timer.span('initial_wait'):
+                    readiness_waits.append(await self.readiness.wait(self.page))
                 self.logger.info("Initial wait completed")
                 
                 # Обработка cookies после загрузки страницы
-                await self.handle_cookies(self.page)
+                with timer.span('cookies'):
+                    await self.handle_cookies(self.page)
                 self.logger.info("Cookies handled")
                 
                 # Пытаемся обойти защиту
                 self.logger.info("Attempting to bypass protection...")
-                if not await self.bypass_protection(self.page):
-                    # Если не удалось обойти защиту, пробуем альтернативный метод
-                    self.logger.info("Using alternative protection bypass...")
-                    await self.handle_alternative_protection(self.page)
+                with timer.span('protection_bypass'):
+                    if not await self.bypass_protection(self.page, protection_reports):
+                        # Если не удалось обойти защиту, пробуем альтернативный метод
+                        self.logger.info("Using alternative protection bypass...")
+                        await self.handle_alternative_protection(self.page)
                 
-                # Эмуляция человеческого поведения
-                self.logger.info("Simulating human behavior...")
-                await self.simulate_human_behavior(self.page)
+                # Эмуляция человеческого поведения (при воспроизведении из HAR ответы уже записаны)
+                if not (self.har and self.har.replay):
+                    self.logger.info("Simulating human behavior...")
+                    with timer.span('human_simulation'):
+                        await self.simulate_human_behavior(self.page)
                 
                 # Ждем загрузки динамического контента
                 self.logger.info("Waiting for dynamic content...")
-                await self.wait_for_dynamic_content(self.page)
+                with timer.span('dynamic_content'):
+                    readiness_waits.append(
+                        await self.wait_for_dynamic_content(self.page, rules.selectors.wait_for)
+                    )
+                
+                # Лента с подгрузкой: прокрутка и "показать еще" до исчерпания
+                scroll = None
+                if rules.js_scroll:
+                    self.logger.info("Harvesting lazy-loaded products...")
+                    with timer.span('scroll_harvest'):
+                        scroll = await self.scroll_harvester.harvest(
+                            self.page, self.extractor.plan_for(url) or self.extractor.plan,
+                            self.scroll_harvester.load_more_selectors(rules)
+                        )
                 
                 # Проверяем, что страница загружена корректно
                 self.logger.info("Checking page content...")
-                content = await self.page.content()
+                with timer.span('page_content'):
+                    content = await self.page.content()
                 if not content or len(content) < 1000:
                     raise Exception("Page content is too short, possible protection")
                 
+                # Для сайтов с правилами - план из их селекторов за один проход,
+                # для остальных - общие эвристики
+                plan = self.extractor.plan_for(url)
+                if plan:
+                    self.logger.info("Extracting with site rules...")
+                    with timer.span('extract_plan'):
+                        extracted = await self.extractor.extract(self.page, plan)
+                    products, categories = extracted['products'], extracted['categories']
+                else:
+                    with timer.span('extract_products'):
+                        products = await self.extract_products()
+                    with timer.span('extract_categories'):
+                        categories = await self.extract_categories(self.page)
+                if scroll:
+                    known = {product_key(product) for product in products}
+                    products += [product for product in scroll['products'] if product_key(product) not in known]
+                
                 # Собираем информацию
                 self.logger.info("Collecting page information...")
+                with timer.span('extract_text'):
+                    title = await self.page.title()
+                    text = await self.page.evaluate('document.body.innerText')
+                with timer.span('extract_links'):
+                    links = await self.extract_links()
                 result = {
-                    "title": await self.page.title(),
+                    "title": title,
                     "url": url,
                     "html": content,
-                    "text": await self.page.evaluate('document.body.innerText'),
-                    "links": await self.extract_links(),
-                    "products": await self.extract_products(),
-                    "categories": await self.extract_categories(self.page),
-                    "request_log": self.request_log,
-                    "status_code": status
+                    "text": text,
+                    "links": links,
+                    "products": products,
+                    "categories": categories,
+                    "request_log": recorder.log(),
+                    "network": recorder.summary(),
+                    "readiness": self.readiness.summarize(readiness_waits),
+                    "protection": protection_reports[-1] if protection_reports else None,
+                    "resource_blocking": blocker.summary(),
+                    "scroll": scroll['stats'] if scroll else None,
+                    "har": har,
+                    "status_code": status,
+                    "spans": timer.spans()
                 }
                 
                 self.logger.info("Analysis completed successfully")
@@ -483,17 +531,28 @@ class DeepSiteAnalyzer:
         except Exception as e:
             self.logger.error(f"Error during site analysis: {str(e)}")
             self.logger.error(f"Current page state: {self.page}")
-            return {"error": str(e)}
+            return {"error": str(e), "spans": timer.spans()}
             
         finally:
             # Очищаем ресурсы страницы
             if self.page:
+                context = self.page.context
                 try:
                     await self.page.close()
                     self.logger.info("Page closed")
+                    if not self.lease:
+                        # Собственный контекст закрывается сразу: при закрытии записывается HAR
+                        await context.close()
                 except Exception as e:
                     self.logger.error(f"Error closing page: {str(e)}")
                 self.page = None
+            await self.release_context()
+
+    async def release_context(self):
+        """Возврат контекста в пул браузеров"""
+        if self.lease:
+            lease, self.lease = self.lease, None
+            await self.pool.release(lease)
 
     async def extract_links(self) -> List[Dict]:
         """Извлечение ссылок со страницы"""
@@ -544,9 +603,6 @@ class DeepSiteAnalyzer:
         """Extract category links from the page."""
         categories = []
         
-        # Wait for the menu elements to load
-        await page.wait_for_timeout(5000)  # Increased timeout for dynamic content
-        
         # List of selectors to try for category extraction
         selectors = [
             ".menu-menu1 a",  # Main menu items
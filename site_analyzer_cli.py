@@ -1,13 +1,16 @@
 import asyncio
 import argparse
 from site_analyzer import DeepSiteAnalyzer
-import json
+from result_sink import NDJSONSink, BULKY_FIELDS
+from har_archive import HarArchive, HAR_MODES
 from datetime import datetime
 import os
 import logging
+from typing import Optional
 from urllib.parse import urlparse
 
-async def analyze_site(url: str, output_dir: str = "data", verbose: bool = False):
+async def analyze_site(url: str, output_dir: str = "data", verbose: bool = False,
+                       har_mode: Optional[str] = None, har_dir: str = "har"):
     """
     Анализ сайта с сохранением результатов
     
@@ -15,6 +18,8 @@ async def analyze_site(url: str, output_dir: str = "data", verbose: bool = False
         url: URL сайта для анализа
         output_dir: Директория для сохранения результатов
         verbose: Подробный вывод логов
+        har_mode: 'record' - сохранить сетевой обмен в HAR, 'replay' - анализ по сохраненному HAR без сети
+        har_dir: Директория HAR архивов
     """
     # Настройка логирования
     log_level = logging.INFO if verbose else logging.WARNING
@@ -29,7 +34,8 @@ async def analyze_site(url: str, output_dir: str = "data", verbose: bool = False
     print(f"Начинаем анализ сайта {url}...")
     
     try:
-        async with DeepSiteAnalyzer() as analyzer:
+        har = HarArchive(har_dir, har_mode) if har_mode else None
+        async with DeepSiteAnalyzer(har=har) as analyzer:
             result = await analyzer.analyze_site(url)
             
             if "error" in result:
@@ -39,11 +45,11 @@ async def analyze_site(url: str, output_dir: str = "data", verbose: bool = False
             # Получаем домен для имени файла
             domain = urlparse(url).netloc
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = os.path.join(output_dir, f"{domain}_{timestamp}.json")
+            filename = os.path.join(output_dir, f"{domain}_{timestamp}.ndjson")
             
-            # Сохраняем результаты
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+            # Сохраняем результаты (без полного HTML и текста страницы)
+            with NDJSONSink(filename, exclude_fields=BULKY_FIELDS) as sink:
+                sink.write(result)
                 
             print(f'\nАнализ завершен. Результаты сохранены в {filename}')
             
@@ -54,6 +60,11 @@ async def analyze_site(url: str, output_dir: str = "data", verbose: bool = False
             print(f'Найдено товаров: {len(products)}')
             print(f'Найдено категорий: {len(categories)}')
             
+            if verbose and result.get("spans"):
+                print('\nДлительность этапов:')
+                for span in sorted(result["spans"], key=lambda span: -span['duration_ms']):
+                    print(f"- {span['stage']}: {span['duration_ms'] / 1000:.2f} с")
+            
             if categories:
                 print('\nНайденные категории:')
                 for category in categories[:10]:
@@ -80,11 +91,13 @@ def main():
     parser.add_argument('url', help='URL сайта для анализа')
     parser.add_argument('-o', '--output', default='data', help='Директория для сохранения результатов')
     parser.add_argument('-v', '--verbose', action='store_true', help='Подробный вывод')
+    parser.add_argument('--har', choices=HAR_MODES, help='Запись сетевого обмена в HAR или воспроизведение из него')
+    parser.add_argument('--har-dir', default='har', help='Директория HAR архивов')
     
     args = parser.parse_args()
     
     try:
-        asyncio.run(analyze_site(args.url, args.output, args.verbose))
+        asyncio.run(analyze_site(args.url, args.output, args.verbose, args.har, args.har_dir))
     except KeyboardInterrupt:
         print("\nАнализ прерван пользователем")
     except Exception as e:
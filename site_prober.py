@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+import aiohttp
+from page_cache import PageCache
+from static_analyzer import DEFAULT_HEADERS, cache_page, decode_html
+
+# Ответы анти-бот защиты: сайт жив, но без браузера его не открыть
+PROTECTED_STATUSES = (401, 403, 429, 503)
+
+@dataclass
+class ProbeResult:
+    """Результат проверки доступности сайта"""
+    url: str
+    final_url: str
+    status: Optional[int] = None
+    available: bool = False
+    method: Optional[str] = None  # 'head' или 'get'
+    redirects: int = 0
+    elapsed_ms: int = 0
+    html: Optional[str] = None  # Страница целиком, если сервер отдал ее в ответ на проверку
+    error: Optional[BaseException] = None
+
+    @property
+    def protected(self) -> bool:
+        return self.status in PROTECTED_STATUSES
+
+    def to_dict(self) -> Dict:
+        return {
+            'url': self.url,
+            'final_url': self.final_url,
+            'status': self.status,
+            'available': self.available,
+            'protected': self.protected,
+            'method': self.method,
+            'redirects': self.redirects,
+            'elapsed_ms': self.elapsed_ms,
+            'error': str(self.error) if self.error else None
+        }
+
+class SiteProber:
+    """Проверка доступности сайтов через общий пул соединений с кэшем DNS
+
+    Сначала отправляется HEAD. Если сервер его не поддерживает или отвечает
+    ошибкой, делается GET с заголовком Range на первые probe_bytes байт.
+    Сервер, который игнорирует Range, отдает страницу целиком - она
+    сохраняется в кэш страниц, и статический анализ не загружает ее повторно.
+    """
+
+    def __init__(self, cache: Optional[PageCache] = None, limit: int = 100, limit_per_host: int = 4,
+                 dns_ttl: int = 600, timeout: float = 10.0, connect_timeout: float = 5.0,
+                 probe_bytes: int = 16 * 1024, max_body_size: int = 5 * 1024 * 1024):
+        """
+        Args:
+            cache: Кэш страниц, в который передаются полностью загруженные страницы
+            limit: Общее число соединений пула
+            limit_per_host: Число соединений к одному хосту
+            dns_ttl: Время хранения разрешенных адресов в секундах
+            timeout: Общий таймаут проверки в секундах
+            connect_timeout: Таймаут установки соединения в секундах
+            probe_bytes: Размер запрашиваемого фрагмента при GET
+            max_body_size: Максимальный размер страницы, которую стоит сохранить целиком
+        """
+        self.cache = cache
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.probe_bytes = probe_bytes
+        self.max_body_size = max_body_size
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.logger = logging.getLogger(__name__)
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        if not self.session or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                use_dns_cache=True,
+                ssl=False
+            )
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                                 headers=DEFAULT_HEADERS)
+        return self.session
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def probe(self, url: str) -> ProbeResult:
+        """Проверка сайта; ошибки соединения не выбрасываются, а возвращаются в поле error"""
+        started = time.monotonic()
+        result = ProbeResult(url=url, final_url=url)
+        session = await self.get_session()
+        try:
+            try:
+                async with session.head(url, allow_redirects=True) as response:
+                    self.update(result, response, 'head')
+            except aiohttp.ClientConnectorError:
+                # DNS, отказ в соединении, TLS - GET к тому же хосту не поможет
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.logger.debug(f"HEAD {url} failed: {str(e)}")
+
+            if result.status is None or result.status >= 400:
+                # HEAD не поддерживается или заблокирован: первые байты страницы по GET
+                headers = {'Range': f"bytes=0-{self.probe_bytes - 1}"}
+                try:
+                    async with session.get(url, headers=headers, allow_redirects=True) as response:
+                        self.update(result, response, 'get')
+                        if response.status == 200:
+                            await self.handoff(result, response)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if result.status is None:
+                        raise
+                    # Ответ на HEAD уже получен, его и считаем результатом
+                    self.logger.debug(f"Ranged GET {url} failed after HEAD {result.status}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            result.error = e
+            self.logger.info(f"Site {url} is not available: {str(e) or type(e).__name__}")
+        result.elapsed_ms = int((time.monotonic() - started) * 1000)
+        return result
+
+    @staticmethod
+    def update(result: ProbeResult, response: aiohttp.ClientResponse, method: str):
+        result.status = response.status
+        result.method = method
+        result.final_url = str(response.url)
+        result.redirects = len(response.history)
+        result.available = response.status < 400 or response.status in PROTECTED_STATUSES
+
+    async def handoff(self, result: ProbeResult, response: aiohttp.ClientResponse):
+        """Страница, отданная целиком вопреки Range, сохраняется для дальнейшего анализа"""
+        content_type = response.headers.get('Content-Type', '')
+        if 'html' not in content_type:
+            return
+        # read(n) отдает только то, что уже в буфере: тело читается до конца потока
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            size += len(chunk)
+            if size > self.max_body_size:
+                return
+            chunks.append(chunk)
+        body = b''.join(chunks)
+        result.html = decode_html(body, content_type)
+        if self.cache:
+            headers = {key.lower(): value for key, value in response.headers.items()}
+            for url in dict.fromkeys((result.url, result.final_url)):
+                cache_page(self.cache, url, result.html, result.final_url, headers)
+        self.logger.debug(f"Probe of {result.url} returned the full page ({len(body)} bytes)")
@@ -1,5 +1,5 @@
-from typing import Dict, Any, List
-from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, field
 from urllib.parse import urlparse
 
 @dataclass
@@ -16,6 +16,16 @@ class SiteSelectors:
     pagination: List[str]  # Селекторы для пагинации
     wait_for: List[str]  # Селекторы для ожидания загрузки контента
 
+@dataclass
+class JsonExtraction:
+    """Извлечение данных из JSON ответов XHR/fetch, которые загружает сама страница"""
+    url_patterns: List[str]  # Подстроки URL ответов; с префиксом 're:' - регулярные выражения
+    products_path: Optional[str] = None  # JSON path к списку товаров, например 'data.items[*]'
+    categories_path: Optional[str] = None  # JSON path к списку категорий
+    product_fields: Dict[str, str] = field(default_factory=dict)  # name/price/href/description -> путь внутри записи
+    category_fields: Dict[str, str] = field(default_factory=dict)  # name/href -> путь внутри записи
+    skip_dom: bool = True  # Не разбирать DOM, если товары получены из JSON
+
 @dataclass
 class SiteRules:
     """Правила парсинга для конкретного сайта"""
@@ -27,6 +37,9 @@ class SiteRules:
     requires_js: bool  # Требуется ли JavaScript для работы сайта
     wait_time: int  # Время ожидания загрузки в миллисекундах
     custom_headers: Dict[str, str]  # Дополнительные заголовки
+    resource_profile: str = 'no-media'  # Профиль блокировки ресурсов: 'full', 'no-media', 'text-only'
+    json_extraction: Optional[JsonExtraction] = None  # Извлечение из перехваченных JSON ответов
+    requisites_paths: List[str] = field(default_factory=list)  # Страницы с реквизитами компании
 
 class SiteRulesRegistry:
     """Реестр правил парсинга для разных сайтов"""
@@ -108,7 +121,8 @@ class SiteRulesRegistry:
             custom_headers={
                 'X-Requested-With': 'XMLHttpRequest',
                 'Accept': 'application/json'
-            }
+            },
+            resource_profile='text-only'
         )
         
         # Правила для medexe.ru
@@ -177,13 +191,23 @@ class SiteRulesRegistry:
             wait_time=3000,
             custom_headers={
                 'X-Requested-With': 'XMLHttpRequest'
-            }
+            },
+            resource_profile='no-media',
+            requisites_paths=['/about/details/']
         )
     
+    @staticmethod
+    def domain(url: str) -> str:
+        """Домен сайта, по которому ищутся правила"""
+        return urlparse(url).netloc.replace('www.', '')
+
+    def find_rules(self, url: str) -> Optional[SiteRules]:
+        """Правила сайта или None, если для него ничего не задано"""
+        return self.rules.get(self.domain(url))
+
     def get_rules(self, url: str) -> SiteRules:
         """Получение правил для конкретного сайта"""
-        domain = urlparse(url).netloc.replace('www.', '')
-        return self.rules.get(domain, self._get_default_rules())
+        return self.find_rules(url) or self._get_default_rules()
     
     def _get_default_rules(self) -> SiteRules:
         """Получение правил по умолчанию"""
@@ -239,7 +263,8 @@ class SiteRulesRegistry:
             ajax_pagination=False,
             requires_js=False,
             wait_time=1000,
-            custom_headers={}
+            custom_headers={},
+            resource_profile='no-media'
         )
 
     def add_rules(self, domain: str, rules: SiteRules):
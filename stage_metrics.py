@@ -0,0 +1,169 @@
+import json
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Границы корзин гистограммы в секундах: от быстрых этапов до навигации с обходом защиты
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+
+METRIC_PREFIX = 'site_analyzer_stage'
+
+class StageTimer:
+    """Замер длительности этапов анализа одного URL
+
+    Пример:
+        with timer.span('navigation'):
+            response = await page.goto(url)
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.records: List[Dict] = []
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            record = {
+                'stage': stage,
+                'start_ms': round((start - self.started) * 1000, 1),
+                'duration_ms': round((time.perf_counter() - start) * 1000, 1)
+            }
+            if error:
+                record['error'] = error
+            self.records.append(record)
+
+    def spans(self) -> List[Dict]:
+        return list(self.records)
+
+class StageMetrics:
+    """Гистограммы длительности этапов по всем URL прогона
+
+    Экспортируются в текстовом формате Prometheus или в JSON; JSON сводки
+    воркеров объединяются без потери точности (хранятся счетчики корзин).
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.stages: Dict[str, Dict] = {}
+
+    def entry(self, stage: str) -> Dict:
+        if stage not in self.stages:
+            self.stages[stage] = {
+                'count': 0,
+                'sum': 0.0,
+                'max': 0.0,
+                'errors': 0,
+                'buckets': [0] * len(self.buckets)  # Без накопления; сверх последней границы - только в count
+            }
+        return self.stages[stage]
+
+    def observe(self, stage: str, seconds: float, error: bool = False):
+        entry = self.entry(stage)
+        entry['count'] += 1
+        entry['sum'] += seconds
+        entry['max'] = max(entry['max'], seconds)
+        entry['errors'] += int(error)
+        index = bisect_left(self.buckets, seconds)
+        if index < len(self.buckets):
+            entry['buckets'][index] += 1
+
+    def add(self, spans: Optional[Iterable[Dict]]):
+        """Учет этапов одного URL (поле spans результата анализа)"""
+        for span in spans or []:
+            self.observe(span['stage'], span['duration_ms'] / 1000, 'error' in span)
+
+    def quantile(self, stage: str, q: float) -> Optional[float]:
+        """Оценка квантиля по верхней границе корзины"""
+        entry = self.stages.get(stage)
+        if not entry or not entry['count']:
+            return None
+        rank = q * entry['count']
+        seen = 0
+        for bound, count in zip(self.buckets, entry['buckets']):
+            seen += count
+            if seen >= rank:
+                return min(bound, entry['max'])
+        return entry['max']
+
+    def merge(self, other: 'StageMetrics'):
+        if other.buckets != self.buckets:
+            raise ValueError("Cannot merge histograms with different buckets")
+        for stage, source in other.stages.items():
+            entry = self.entry(stage)
+            entry['count'] += source['count']
+            entry['sum'] += source['sum']
+            entry['max'] = max(entry['max'], source['max'])
+            entry['errors'] += source['errors']
+            entry['buckets'] = [a + b for a, b in zip(entry['buckets'], source['buckets'])]
+
+    def to_dict(self) -> Dict:
+        """JSON сводка: по каждому этапу число, сумма, среднее, p50/p90, максимум и корзины"""
+        stages = {}
+        for stage, entry in sorted(self.stages.items(), key=lambda item: -item[1]['sum']):
+            stages[stage] = {
+                'count': entry['count'],
+                'errors': entry['errors'],
+                'sum_s': round(entry['sum'], 3),
+                'mean_s': round(entry['sum'] / entry['count'], 3) if entry['count'] else None,
+                'p50_s': self.quantile(stage, 0.5),
+                'p90_s': self.quantile(stage, 0.9),
+                'max_s': round(entry['max'], 3),
+                'buckets': list(entry['buckets'])
+            }
+        return {'buckets': list(self.buckets), 'stages': stages}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'StageMetrics':
+        metrics = cls(data.get('buckets', DEFAULT_BUCKETS))
+        for stage, source in data.get('stages', {}).items():
+            metrics.stages[stage] = {
+                'count': source['count'],
+                'sum': source['sum_s'],
+                'max': source['max_s'],
+                'errors': source['errors'],
+                'buckets': list(source['buckets'])
+            }
+        return metrics
+
+    def prometheus(self) -> str:
+        """Текстовый формат Prometheus (для node_exporter textfile или Pushgateway)"""
+        name = f"{METRIC_PREFIX}_duration_seconds"
+        lines = [
+            f"# HELP {name} Duration of site analysis stages.",
+            f"# TYPE {name} histogram"
+        ]
+        for stage, entry in sorted(self.stages.items()):
+            label = stage.replace('\\', '\\\\').replace('"', '\\"')
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{{stage="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{label}",le="+Inf"}} {entry["count"]}')
+            lines.append(f'{name}_sum{{stage="{label}"}} {entry["sum"]:.6f}')
+            lines.append(f'{name}_count{{stage="{label}"}} {entry["count"]}')
+
+        errors = f"{METRIC_PREFIX}_errors_total"
+        lines += [
+            f"# HELP {errors} Site analysis stages that raised an error.",
+            f"# TYPE {errors} counter"
+        ]
+        for stage, entry in sorted(self.stages.items()):
+            label = stage.replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'{errors}{{stage="{label}"}} {entry["errors"]}')
+        return '\n'.join(lines) + '\n'
+
+    def save(self, path: str):
+        """Запись в файл: .prom - формат Prometheus, иначе JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.endswith('.prom'):
+                f.write(self.prometheus())
+            else:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
@@ -0,0 +1,428 @@
+import logging
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+import aiohttp
+from bs4 import BeautifulSoup
+from page_extractor import ExtractionPlan, PageExtractor
+from page_cache import PageCache
+
+# Признаки страниц проверки анти-бот систем: такая страница - всегда заглушка
+BLOCK_MARKERS = [
+    'cf-browser-verification',
+    'challenge-platform',
+    'cf-chl-',
+    'ddos-guard',
+    'checking your browser',
+    'проверка браузера'
+]
+
+# Капча в форме обратной связи и <noscript> с просьбой включить JavaScript есть
+# на многих обычных страницах с серверным рендерингом: эти признаки учитываются,
+# только если видимого текста почти нет
+WEAK_BLOCK_MARKERS = [
+    'g-recaptcha',
+    'h-captcha',
+    'antibot',
+    'enable javascript',
+    'включите javascript'
+]
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
+    'Upgrade-Insecure-Requests': '1'
+}
+
+META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+def decode_html(body: bytes, content_type: str = '') -> str:
+    """Декодирование HTML с учетом charset из заголовка или meta"""
+    charset = None
+    match = re.search(r'charset=([\w-]+)', content_type or '', re.IGNORECASE)
+    if match:
+        charset = match.group(1)
+    else:
+        match = META_CHARSET.search(body[:4096])
+        if match:
+            charset = match.group(1).decode('ascii', 'ignore')
+    try:
+        return body.decode(charset or 'utf-8', errors='replace')
+    except LookupError:
+        return body.decode('utf-8', errors='replace')
+
+def html_text(html: str) -> str:
+    """Видимый текст страницы: без скриптов и стилей, блоки разделены переводами строк"""
+    soup = BeautifulSoup(html, 'html.parser')
+    for element in soup(['script', 'style', 'noscript', 'template']):
+        element.decompose()
+    return soup.get_text('\n', strip=True)
+
+def cache_page(cache: PageCache, url: str, html: str, final_url: str, headers: Dict[str, str]):
+    """Сохранение загруженной страницы в кэш в том виде, в каком ее отдает StaticSiteAnalyzer.fetch"""
+    cache.put(
+        'html', url, html.encode('utf-8'),
+        etag=headers.get('etag'),
+        last_modified=headers.get('last-modified'),
+        meta={
+            'final_url': final_url,
+            'headers': {key: headers[key] for key in ('content-type', 'etag', 'last-modified') if key in headers}
+        }
+    )
+
+class StaticExtractor:
+    """Извлечение данных из статического HTML по тому же плану, что и PageExtractor"""
+
+    def __init__(self, plan: ExtractionPlan = None):
+        self.plan = plan or ExtractionPlan.default()
+        self.page_extractor = PageExtractor(self.plan)
+
+    @staticmethod
+    def _select(root, selector: str) -> List:
+        try:
+            return root.select(selector)
+        except Exception:
+            return []
+
+    @staticmethod
+    def _pick(root, selectors: List[str]):
+        if not selectors:
+            return None
+        try:
+            return root.select_one(','.join(selectors))
+        except Exception:
+            for selector in selectors:
+                try:
+                    element = root.select_one(selector)
+                    if element:
+                        return element
+                except Exception:
+                    continue
+            return None
+
+    @staticmethod
+    def _text(element) -> str:
+        return element.get_text().strip() if element else ''
+
+    def _collect(self, soup: BeautifulSoup, selectors: List[str], stats: Dict, kind: str,
+                 cards: bool = False) -> List:
+        """Узлы по всем селекторам без повторов (как selectNodes в NODE_SELECTION_JS)
+
+        Для карточек отбрасываются контейнеры карточек и фрагменты внутри карточки.
+        """
+        nodes: Dict[int, object] = {}
+        matched = 0
+        for selector in selectors:
+            for element in self._select(soup, selector):
+                matched += 1
+                nodes.setdefault(id(element), element)
+        selected = list(nodes.values())
+        if cards:
+            # Первая ссылка каждого однотипного узла внутри каждого найденного предка
+            groups: Dict[int, Dict[str, str]] = {}
+            containers = set()
+            for element in selected:
+                link = element.find('a', href=True)
+                if not link:
+                    continue
+                node_kind = f"{element.name}.{(element.get('class') or [''])[0]}"
+                for parent in element.parents:
+                    if id(parent) not in nodes or id(parent) in containers:
+                        continue
+                    group = groups.setdefault(id(parent), {})
+                    if group.setdefault(node_kind, link['href']) != link['href']:
+                        containers.add(id(parent))
+            kept = {id(element) for element in selected if id(element) not in containers}
+            selected = [element for element in selected if id(element) in kept
+                        and not any(id(parent) in kept for parent in element.parents)]
+        stats[kind] = {'matched': matched, 'nodes': len(selected)}
+        return selected
+
+    def extract_raw(self, soup: BeautifulSoup, plan: ExtractionPlan = None) -> Dict[str, List]:
+        """Сырые данные в формате EXTRACTION_SCRIPT"""
+        plan = plan or self.plan
+        stats: Dict[str, Dict] = {}
+        categories = []
+        for element in self._collect(soup, plan.category_selectors, stats, 'categories'):
+            href = element.get('href')
+            if not href or href.startswith('#') or href.startswith('javascript:'):
+                continue
+            name = self._text(element)
+            if name:
+                categories.append({'name': name, 'href': href})
+
+        products = []
+        for element in self._collect(soup, plan.product_selectors, stats, 'products', cards=True):
+            name_el = self._pick(element, plan.product_name)
+            price_el = self._pick(element, plan.product_price)
+            link_el = element.find('a')
+            desc_el = self._pick(element, plan.product_description)
+            products.append({
+                'name': self._text(name_el) if name_el else None,
+                'price': self._text(price_el) if price_el else None,
+                'href': link_el.get('href') if link_el else None,
+                'description': self._text(desc_el) if desc_el else None
+            })
+
+        links = []
+        for element in self._collect(soup, plan.link_selectors, stats, 'links'):
+            if element.name == 'form':
+                href = element.get('action')
+            elif element.name == 'input':
+                href = element.get('src')
+            else:
+                href = element.get('href') or element.get('src')
+            if href:
+                links.append(href)
+
+        pagination = []
+        for element in self._collect(soup, plan.pagination_selectors, stats, 'pagination'):
+            if element.get('href'):
+                pagination.append(element.get('href'))
+
+        return {'categories': categories, 'products': products, 'links': links, 'pagination': pagination,
+                'stats': stats}
+
+    def extract(self, soup: BeautifulSoup, base_url: str, plan: ExtractionPlan = None) -> Dict[str, List]:
+        """Извлечение товаров, категорий и ссылок из статического HTML"""
+        plan = plan or self.plan
+        return self.page_extractor.build(self.extract_raw(soup, plan), base_url, plan)
+
+    @staticmethod
+    def analyze_structure(soup: BeautifulSoup, base_url: str) -> Dict:
+        """Упрощенный аналог analyze_site_structure для статического HTML"""
+        def describe(element) -> Optional[Dict]:
+            if not element:
+                return None
+            return {
+                'type': element.name,
+                'className': ' '.join(element.get('class', [])),
+                'children': [
+                    {'type': child.name, 'className': ' '.join(child.get('class', []))}
+                    for child in element.find_all(recursive=False)
+                ]
+            }
+
+        def first(selector: str):
+            try:
+                return soup.select_one(selector)
+            except Exception:
+                return None
+
+        structure = {
+            'navigation': [],
+            'mainContent': describe(first('main, [role="main"], #content, .content, [class*="content"]')),
+            'sidebar': describe(first('aside, [role="complementary"], .sidebar, [class*="sidebar"]')),
+            'footer': describe(first('footer, [role="contentinfo"], .footer, [class*="footer"]')),
+            'forms': [],
+            'scripts': [urljoin(base_url, script['src']) for script in soup.select('script[src]')],
+            'styles': [urljoin(base_url, style['href']) for style in soup.select('link[rel="stylesheet"][href]')]
+        }
+
+        for nav in soup.select('nav, [role="navigation"], [class*="nav"], [class*="menu"]'):
+            links = [{
+                'text': a.get_text().strip(),
+                'href': urljoin(base_url, a['href']) if a.get('href') else '',
+                'isActive': 'active' in a.get('class', []) or a.get('aria-current') == 'page'
+            } for a in nav.find_all('a')]
+            if links:
+                structure['navigation'].append({
+                    'type': nav.name,
+                    'className': ' '.join(nav.get('class', [])),
+                    'links': links
+                })
+
+        for form in soup.find_all('form'):
+            structure['forms'].append({
+                'action': urljoin(base_url, form.get('action') or ''),
+                'method': form.get('method', 'get'),
+                'className': ' '.join(form.get('class', [])),
+                'inputs': [{
+                    'type': field.get('type') or field.name,
+                    'name': field.get('name'),
+                    'className': ' '.join(field.get('class', []))
+                } for field in form.find_all(['input', 'select', 'textarea'])]
+            })
+
+        return structure
+
+class StaticSiteAnalyzer:
+    """Анализ сайтов без браузера: загрузка HTML через aiohttp и разбор на месте"""
+
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None, timeout: int = 20,
+                 max_body_size: int = 5 * 1024 * 1024, min_text_length: int = 200,
+                 cache: Optional[PageCache] = None):
+        """
+        Args:
+            session: Общая HTTP-сессия (если не задана, создается при первом запросе)
+            timeout: Общий таймаут запроса в секундах
+            max_body_size: Максимальный размер загружаемой страницы в байтах
+            min_text_length: Минимальная длина видимого текста, при которой страница считается непустой
+            cache: Кэш загруженного HTML с ревалидацией по ETag/Last-Modified
+        """
+        self.session = session
+        self._own_session = session is None
+        self.timeout = timeout
+        self.max_body_size = max_body_size
+        self.min_text_length = min_text_length
+        self.cache = cache
+        self.extractor = StaticExtractor()
+        self.logger = logging.getLogger(__name__)
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        if not self.session or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers=DEFAULT_HEADERS
+            )
+            self._own_session = True
+        return self.session
+
+    async def close(self):
+        """Закрытие собственной HTTP-сессии"""
+        if self._own_session and self.session and not self.session.closed:
+            await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None,
+                    revalidate: bool = False) -> Tuple[int, str, str, Dict[str, str]]:
+        """Загрузка страницы; возвращает (status, html, final_url, headers) с заголовками в нижнем регистре
+
+        При revalidate=True даже свежая запись кэша проверяется условным запросом.
+        """
+        cached = self.cache.get('html', url) if self.cache else None
+        if cached and cached.fresh and not revalidate:
+            self.logger.debug(f"Serving {url} from cache")
+            return 200, cached.text(), cached.meta.get('final_url', url), cached.meta.get('headers', {})
+
+        request_headers = dict(headers or {})
+        if cached:
+            # Условный запрос: при 304 используем сохраненную копию
+            if cached.etag:
+                request_headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                request_headers['If-Modified-Since'] = cached.last_modified
+
+        session = await self.get_session()
+        async with session.get(url, headers=request_headers, allow_redirects=True, ssl=False) as response:
+            if response.status == 304 and cached:
+                self.logger.debug(f"{url} not modified, using cached copy")
+                self.cache.touch('html', url)
+                return 200, cached.text(), cached.meta.get('final_url', url), cached.meta.get('headers', {})
+
+            body = await response.content.read(self.max_body_size)
+            content_type = response.headers.get('Content-Type', '')
+            html = decode_html(body, content_type)
+            response_headers = {key.lower(): value for key, value in response.headers.items()}
+
+            if self.cache and response.status == 200:
+                cache_page(self.cache, url, html, str(response.url), response_headers)
+            return response.status, html, str(response.url), response_headers
+
+    async def revalidate(self, url: str, etag: Optional[str], last_modified: Optional[str]) -> bool:
+        """Условный запрос к странице: True, если сервер ответил 304 Not Modified"""
+        if not etag and not last_modified:
+            return False
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        try:
+            session = await self.get_session()
+            async with session.get(url, headers=headers, allow_redirects=True, ssl=False) as response:
+                return response.status == 304
+        except Exception as e:
+            self.logger.debug(f"Revalidation of {url} failed: {str(e)}")
+            return False
+
+    def detect_escalation(self, status: int, html: str, headers: Dict[str, str], soup: Optional[BeautifulSoup],
+                          result: Optional[Dict]) -> Optional[str]:
+        """Причина, по которой нужен браузер, или None, если статического HTML достаточно"""
+        if status != 200:
+            return f"status_{status}"
+
+        content_type = headers.get('content-type', '').lower()
+        if content_type and 'html' not in content_type:
+            return "not_html"
+
+        if len(html) < 1000:
+            return "content_too_short"
+
+        lowered = html[:20000].lower()
+        for marker in BLOCK_MARKERS:
+            if marker in lowered:
+                return f"blocked:{marker}"
+
+        if soup is not None:
+            body = soup.body
+            text = body.get_text(' ', strip=True) if body else ''
+            if len(text) < self.min_text_length:
+                for marker in WEAK_BLOCK_MARKERS:
+                    if marker in lowered:
+                        return f"blocked:{marker}"
+                return "empty_body"
+
+        if result is not None and not (result['links'] or result['products'] or result['categories']):
+            return "nothing_extracted"
+
+        return None
+
+    async def analyze_site(self, url: str, plan: ExtractionPlan = None) -> Dict:
+        """Анализ сайта по статическому HTML
+
+        Возвращает тот же словарь, что и EnhancedSiteAnalyzer.analyze_site, с ключом
+        'escalate' - причиной, по которой результат ненадежен и нужен браузер (или None).
+        """
+        self.logger.debug(f"Fetching {url} over HTTP")
+        started = datetime.now()
+        status, html, final_url, headers = await self.fetch(url)
+        fetched = datetime.now()
+
+        reason = self.detect_escalation(status, html, headers, None, None)
+        if reason:
+            self.logger.info(f"Static fetch of {url} is not sufficient: {reason}")
+            return {'url': url, 'status_code': status, 'escalate': reason}
+
+        soup = BeautifulSoup(html, 'html.parser')
+        extracted = self.extractor.extract(soup, final_url, plan)
+        title = soup.title.get_text().strip() if soup.title else ''
+
+        results = {
+            'url': url,
+            'title': title,
+            'structure': self.extractor.analyze_structure(soup, final_url),
+            'categories': extracted['categories'],
+            'products': extracted['products'],
+            'links': extracted['links'],
+            'pagination': extracted['pagination'],
+            'dedup': extracted['dedup'],
+            'request_log': [{
+                'url': url,
+                'method': 'GET',
+                'resource_type': 'document',
+                'status': status,
+                'bytes': len(html.encode('utf-8')),
+                'third_party': False,
+                'timing': {'total': round((fetched - started).total_seconds() * 1000, 1)},
+                'error': None
+            }],
+            'engine': 'http',
+            'validators': {
+                'etag': headers.get('etag'),
+                'last_modified': headers.get('last-modified')
+            },
+            'timestamp': datetime.now().isoformat()
+        }
+
+        results['escalate'] = self.detect_escalation(status, html, headers, soup, results)
+        if results['escalate']:
+            self.logger.info(f"Static result for {url} looks incomplete: {results['escalate']}")
+        return results
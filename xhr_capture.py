@@ -0,0 +1,164 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional
+from playwright.async_api import Page, Response
+from api_harvester import find_records, map_record
+from page_extractor import PageExtractor, DEFAULT_CATEGORY_EXCLUDE
+from site_rules import JsonExtraction, SiteRules
+
+# Префикс шаблона URL, который является регулярным выражением, а не подстрокой
+REGEX_PREFIX = 're:'
+
+JSON_PATH_TOKEN = re.compile(r'\[\*\]|\[\d+\]|[^.\[\]]+')
+
+def json_path(payload: Any, path: str) -> List[Any]:
+    """Значения по упрощенному JSON path: 'data.items[*].name', '$.products[0]', 'catalog.*'"""
+    nodes = [payload]
+    for token in JSON_PATH_TOKEN.findall(path.lstrip('$').lstrip('.')):
+        matched = []
+        for node in nodes:
+            if token in ('[*]', '*'):
+                if isinstance(node, list):
+                    matched.extend(node)
+                elif isinstance(node, dict):
+                    matched.extend(node.values())
+            elif token.startswith('['):
+                index = int(token[1:-1])
+                if isinstance(node, list) and -len(node) <= index < len(node):
+                    matched.append(node[index])
+            elif isinstance(node, dict) and token in node:
+                matched.append(node[token])
+        nodes = matched
+    return nodes
+
+def first_value(record: Any, path: str) -> Optional[str]:
+    values = [value for value in json_path(record, path) if value not in (None, '')]
+    if not values or isinstance(values[0], (dict, list)):
+        return None
+    return str(values[0]).strip()
+
+class ResponseCapture:
+    """Буфер JSON ответов XHR/fetch страницы, URL которых совпадает с шаблонами"""
+
+    def __init__(self, url_patterns: List[str], max_body_size: int = 2 * 1024 * 1024,
+                 max_total_size: int = 20 * 1024 * 1024):
+        """
+        Args:
+            url_patterns: Подстроки URL; шаблон с префиксом 're:' - регулярное выражение
+                (эндпоинты вида '/ajax/catalog.php?action=list' совпадают как есть)
+            max_body_size: Максимальный размер одного ответа в байтах
+            max_total_size: Максимальный суммарный размер буфера страницы в байтах
+        """
+        self.patterns = [re.compile(pattern[len(REGEX_PREFIX):]) if pattern.startswith(REGEX_PREFIX) else pattern
+                         for pattern in url_patterns]
+        self.max_body_size = max_body_size
+        self.max_total_size = max_total_size
+        self.responses: List[Dict] = []
+        self.total_size = 0
+        self.skipped = 0
+        self.in_flight = 0
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def for_rules(cls, rules: SiteRules) -> Optional['ResponseCapture']:
+        """Перехват по шаблонам json_extraction или по api_endpoints сайта"""
+        if rules.json_extraction:
+            return cls(rules.json_extraction.url_patterns)
+        if rules.api_endpoints:
+            return cls(rules.api_endpoints)
+        return None
+
+    def attach(self, page: Page):
+        """Подписка на ответы страницы (до навигации)"""
+        page.on('response', self.handle_response)
+
+    def matches(self, url: str) -> bool:
+        return any(pattern.search(url) if isinstance(pattern, re.Pattern) else pattern in url
+                   for pattern in self.patterns)
+
+    async def handle_response(self, response: Response):
+        request = response.request
+        if request.resource_type not in ('xhr', 'fetch') or not self.matches(response.url):
+            return
+        if 'json' not in response.headers.get('content-type', ''):
+            return
+
+        declared = int(response.headers.get('content-length') or 0)
+        if declared > self.max_body_size or self.total_size + declared > self.max_total_size:
+            self.skipped += 1
+            return
+
+        self.in_flight += 1
+        try:
+            body = await response.body()
+            if len(body) > self.max_body_size or self.total_size + len(body) > self.max_total_size:
+                self.skipped += 1
+                return
+            payload = json.loads(body)
+            self.total_size += len(body)
+            self.responses.append({'url': response.url, 'status': response.status, 'payload': payload})
+        except Exception as e:
+            # Тело недоступно (редирект, страница закрыта) или это не JSON
+            self.logger.debug(f"Error capturing {response.url}: {str(e)}")
+        finally:
+            self.in_flight -= 1
+
+    async def drain(self, timeout: float = 5.0):
+        """Ожидание чтения тел ответов, полученных до этого момента"""
+        deadline = time.monotonic() + timeout
+        while self.in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    def summary(self) -> Dict:
+        return {
+            'responses': len(self.responses),
+            'bytes': self.total_size,
+            'skipped': self.skipped,
+            'urls': [captured['url'] for captured in self.responses]
+        }
+
+class JsonExtractor:
+    """Товары и категории из перехваченных JSON ответов"""
+
+    def __init__(self):
+        self.page_extractor = PageExtractor()
+
+    def extract(self, responses: List[Dict], base_url: str,
+                extraction: Optional[JsonExtraction] = None) -> Dict[str, List]:
+        """Без json_extraction товары ищутся эвристически, как в ответах API каталога"""
+        raw_products = []
+        raw_categories = []
+        for captured in responses:
+            payload = captured['payload']
+            if extraction and extraction.products_path:
+                for record in json_path(payload, extraction.products_path):
+                    if isinstance(record, dict):
+                        raw_products.append(self.map_fields(record, extraction.product_fields, map_record(record)))
+            else:
+                raw_products.extend(map_record(record) for record in find_records(payload) or [])
+
+            if extraction and extraction.categories_path:
+                for record in json_path(payload, extraction.categories_path):
+                    if not isinstance(record, dict):
+                        continue
+                    mapped = map_record(record)
+                    category = self.map_fields(record, extraction.category_fields,
+                                               {'name': mapped['name'], 'href': mapped['href']})
+                    if category.get('name') and category.get('href'):
+                        raw_categories.append(category)
+
+        return {
+            'products': self.page_extractor.build_products(raw_products, base_url),
+            'categories': self.page_extractor.build_categories(raw_categories, base_url, DEFAULT_CATEGORY_EXCLUDE)
+        }
+
+    @staticmethod
+    def map_fields(record: Dict, fields: Dict[str, str], defaults: Dict) -> Dict:
+        """Поля по путям из правил сайта поверх эвристического сопоставления"""
+        mapped = dict(defaults)
+        for name, path in fields.items():
+            mapped[name] = first_value(record, path)
+        return mapped